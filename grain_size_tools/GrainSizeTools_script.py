@@ -67,7 +67,7 @@ def summarize(
 
     Call functions
     --------------
-    - amean, gmean, median, and freq_peak (from averages)
+    - PreparedSample, amean, gmean, median, and freq_peak (from averages)
 
     Examples
     --------
@@ -90,26 +90,29 @@ def summarize(
         print('Negative/zero values were automatically removed')
         print('')
 
+    # compute the shared transforms (log, sort, moments, KDE) only once
+    sample = averages.PreparedSample(data)
+
     # estimate Shapiro-Wilk test to check normality and lognormality
     # In Shapiro-Wilk tests, the chances of the null hypothesis being
     # rejected becomes larger for large sample sizes. We limit the
     # sample size to a maximum of 250
     if len(data) > 250:
         W, p_value = shapiro(np.random.choice(data, size=250))
-        W2, p_value2 = shapiro(np.random.choice(np.log(data), size=250))
+        W2, p_value2 = shapiro(np.random.choice(sample.log, size=250))
     else:
         W, p_value = shapiro(data)
-        W2, p_value2 = shapiro(np.log(data))
+        W2, p_value2 = shapiro(sample.log)
 
     if 'amean' in avg:
         # choose optimal method to estimate confidence intervals
         if p_value2 < 0.05:
-            amean, __, ci, length = averages.amean(data, ci_level, method='ASTM')
+            amean, __, ci, length = averages.amean(sample, ci_level, method='ASTM')
         else:
             if len(data) > 99:
-                amean, __, (low_ci, high_ci), length2 = averages.amean(data, ci_level, method='mCox')
+                amean, __, (low_ci, high_ci), length2 = averages.amean(sample, ci_level, method='mCox')
             else:
-                amean, __, (low_ci, high_ci), length2 = averages.amean(data, ci_level, method='GCI')
+                amean, __, (low_ci, high_ci), length2 = averages.amean(sample, ci_level, method='GCI')
 
             # estimate coefficients of variation
             lower_cvar = 100 * (amean - low_ci) / amean
@@ -132,7 +135,7 @@ def summarize(
     if 'gmean' in avg:
         # choose optimal method to estimate confidence intervals
         m = 'CLT' if len(data) > 99 else 'bayes'
-        gmean, msd, (low_ci, high_ci), length = averages.gmean(data, ci_level, method=m)
+        gmean, msd, (low_ci, high_ci), length = averages.gmean(sample, ci_level, method=m)
 
         # estimate coefficients of variation
         lower_cvar = 100 * (gmean - low_ci) / gmean
@@ -144,7 +147,7 @@ def summarize(
         print(f'{m} method: {low_ci:0.2f} - {high_ci:0.2f} (-{lower_cvar:0.1f}%, +{upper_cvar:0.1f}%), length = {length:0.3f}')
 
     if 'median' in avg:
-        median, iqr, (low_ci, high_ci), length = averages.median(data, ci_level)
+        median, iqr, (low_ci, high_ci), length = averages.median(sample, ci_level)
 
         # estimate coefficients of variation
         lower_cvar = 100 * (median - low_ci) / median
@@ -156,7 +159,7 @@ def summarize(
         print(f'robust method: {low_ci:0.2f} - {high_ci:0.2f} (-{lower_cvar:0.1f}%, +{upper_cvar:0.1f}%), length = {length:0.3f}')
 
     if 'mode' in avg:
-        _, mode, _, bw = averages.freq_peak(data, bandwidth, precision)
+        _, mode, _, bw = averages.freq_peak(sample, bandwidth, precision)
 
         print('============================================================================')
         print(f'Mode (KDE-based) = {mode:0.2f} microns')
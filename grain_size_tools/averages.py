@@ -25,7 +25,9 @@
 # ============================================================================ #
 
 # Imports
-from scipy.stats import sem, bayes_mvs, gaussian_kde, iqr, t, norm
+import warnings
+from functools import lru_cache
+from scipy.stats import gaussian_kde, t, norm, chi2, qmc
 import numpy as np
 
 # ============================================================================ #
@@ -39,16 +41,17 @@ def amean(pop, ci=0.95, method='ASTM'):
 
     Parameters
     ----------
-    pop : array-like
+    pop : array-like or PreparedSample
         the population
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     method : string
         the method to estimate the confidence interval, either
         'ASTM': central limit theorem based (ASTM default)
         'GCI': generalized confidence interval method
+        'GCI_qmc': adaptive quasi-Monte Carlo GCI method
         'mCox': modified Cox method
 
     Assumptions
@@ -61,6 +64,7 @@ def amean(pop, ci=0.95, method='ASTM'):
     --------------
     - CLT_ci
     - GCI_ci
+    - GCI_qmc_ci
     - mCox_ci
 
     Returns
@@ -71,8 +75,9 @@ def amean(pop, ci=0.95, method='ASTM'):
     the confidence interval length (float),
     """
 
-    n = len(pop)
-    mean, std = np.mean(pop), np.std(pop, ddof=1)  # SD using n-1 degrees of freedom (Bessel corrected)
+    pop = prepare_sample(pop)
+    n = pop.n
+    mean, std = pop.mean, pop.std  # SD using n-1 degrees of freedom (Bessel corrected)
 
     # confidence interval
     if method == 'ASTM':
@@ -83,12 +88,16 @@ def amean(pop, ci=0.95, method='ASTM'):
         ci_limis, length = GCI_ci(pop, ci)
         return mean, std, ci_limis, length
 
+    elif method == 'GCI_qmc':
+        ci_limis, length, _ = GCI_qmc_ci(pop, ci)
+        return mean, std, ci_limis, length
+
     elif method == 'mCox':
         ci_limis, length = mCox_ci(pop, ci)
         return mean, std, ci_limis, length
 
     else:
-        raise Exception("ci methods must be 'CLT', 'GCI', or 'mCox'")
+        raise Exception("ci methods must be 'CLT', 'GCI', 'GCI_qmc', or 'mCox'")
 
 
 def gmean(pop, ci=0.95, method='CLT'):
@@ -97,11 +106,11 @@ def gmean(pop, ci=0.95, method='CLT'):
 
     Parameters
     ----------
-    pop : array-like
+    pop : array-like or PreparedSample
         the population
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     method : string
        the method to estimate the confidence interval, either
@@ -129,8 +138,9 @@ def gmean(pop, ci=0.95, method='CLT'):
     """
 
     # compute statistics of the log-transformed data
-    mean_log, n = np.mean(np.log(pop)), len(pop)
-    std_log = np.std(np.log(pop), ddof=1)  # Bessel corrected SD (n-1 degrees of freedom)
+    pop = prepare_sample(pop)
+    mean_log, n = pop.mean_log, pop.n
+    std_log = pop.std_log  # Bessel corrected SD (n-1 degrees of freedom)
 
     # compute the back-transformed values (gmean and mSD in linear scale)
     gmean = np.exp(mean_log)
@@ -156,11 +166,12 @@ def median(pop, ci=0.95):
 
     Parameters
     ----------
-    pop : array-like
-        the population
+    pop : array-like, PreparedSample or QuantileSketch
+        the population or a quantile sketch of the population (for
+        streaming/chunked data, the values are then approximate)
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     Assumptions
     -----------
@@ -177,7 +188,8 @@ def median(pop, ci=0.95):
 
     Call functions
     --------------
-    - iqr from Scipy
+    - median_ci_ranks
+    - order_statistics
 
     Returns
     -------
@@ -186,23 +198,26 @@ def median(pop, ci=0.95):
     the confidence interval (tuple),
     the confidence length (float)
     """
-    pop, n = np.sort(pop), len(pop)
-    median, iqr_range = np.median(pop), iqr(pop)
 
-    # compute confidence intervals
-    ci_limits, length = median_ci(pop, n, ci)
+    # get the quartiles and the order statistics of the confidence
+    # interval with a single partial sort (selection) of the population
+    n = len(pop)
+    id_lower, id_upper = median_ci_ranks(n, ci)
+    (q1, median, q3), (lower_ci, upper_ci) = order_statistics(pop, (0.25, 0.5, 0.75), (id_lower, id_upper))
+    iqr_range = q3 - q1
+    length = upper_ci - lower_ci
 
-    return median, iqr_range, ci_limits, length
+    return median, iqr_range, (lower_ci, upper_ci), length
 
 
-def freq_peak(pop, bandwidth='silverman', max_precision=0.05):
+def freq_peak(pop, bandwidth='silverman', max_precision=0.05, kde_method='direct', search='grid'):
     """ Returns the peak of the frequency ("mode") of a continuous
     distribution based on the Gaussian kernel density estimator. It
-    uses Scipy's gaussian kde method.
+    uses Scipy's gaussian kde method or a binned FFT-based KDE.
 
     Parameters
     ----------
-    pop : array_like
+    pop : array_like or PreparedSample
         the diameters of the grains
 
     bandwidth : string, positive scalar or callable
@@ -212,10 +227,25 @@ def freq_peak(pop, bandwidth='silverman', max_precision=0.05):
     max_precision : positive scalar, default is 0.05
         the maximum precision expected for the "peak" estimator.
 
+    kde_method : string {'direct' or 'fft'}, optional
+        'direct' evaluates the Scipy's gaussian_kde at every point of the
+        grid, O(n x grid). 'fft' uses linear binning and FFT convolution,
+        O(n + grid log grid), recommended for large populations.
+        Default 'direct'.
+
+    search : string {'grid' or 'refine'}, optional
+        'grid' evaluates the KDE over a dense grid with a spacing equal to
+        max_precision, so the cost scales with range / max_precision. 'refine'
+        evaluates the KDE over a coarse grid and then refines the peak by
+        golden-section search up to max_precision, so the cost is independent
+        of the range of the data. Default 'grid'.
+
     Call functions
     --------------
     - gen_xgrid
     - gaussian_kde from scipy
+    - fft_kde
+    - kde_peaks
 
     Returns
     -------
@@ -225,27 +255,154 @@ def freq_peak(pop, bandwidth='silverman', max_precision=0.05):
     the bandwidth
     """
 
-    # check bandwidth and estimate Gaussian kernel density function
+    # check bandwidth
+    pop = prepare_sample(pop)
     if isinstance(bandwidth, (int, float)):
-        bw = bandwidth / np.std(pop, ddof=1)
-        kde = gaussian_kde(pop, bw_method=bw)
+        bw = bandwidth / pop.std
 
     elif isinstance(bandwidth, str):
-        kde = gaussian_kde(pop, bw_method=bandwidth)
-        bw = round(kde.covariance_factor() * pop.std(ddof=1), 2)
+        bw = round(kde_bandwidth(pop, bandwidth), 2)
 
     else:
         raise ValueError("bandwidth must be integer, float, or plug-in methods 'silverman' or 'scott'")
 
+    if search == 'refine':
+        (xgrid, densities), peaks, y_peaks = kde_peaks(pop, bandwidth, max_precision, kde_method=kde_method)
+        return (xgrid, densities), peaks[0], y_peaks[0], bw
+
+    elif search != 'grid':
+        raise ValueError("search must be 'grid' or 'refine'")
+
+    # estimate the Gaussian kernel density function over the grid
+    xgrid = gen_xgrid(pop.min, pop.max, max_precision)
+
+    if kde_method == 'direct':
+        densities = pop.kde(bandwidth)(xgrid)
+
+    elif kde_method == 'fft':
+        densities = fft_kde(pop.data, xgrid, bandwidth)
+
+    else:
+        raise ValueError("kde_method must be 'direct' or 'fft'")
+
     # locate and get the frequency peak
-    xgrid = gen_xgrid(pop.min(), pop.max(), max_precision)
-    densities = kde(xgrid)
     y_max, peak_grain_size = np.max(densities), xgrid[np.argmax(densities)]
 
     return (xgrid, densities), peak_grain_size, y_max, bw
 
 
-def weighted_mean_with_error(values, variances):
+def kde_peaks(pop, bandwidth='silverman', max_precision=0.05, num=512, all_peaks=False, kde_method='direct'):
+    """ Locate the peak(s) of the Gaussian kernel density estimate using
+    a coarse-to-fine approach. The KDE is first evaluated over a coarse grid
+    and then each local maximum is refined by golden-section search over
+    the exact KDE until the bracketing interval is smaller than max_precision.
+
+    Parameters
+    ----------
+    pop : array_like or PreparedSample
+        the diameters of the grains
+
+    bandwidth : string {'silverman' or 'scott'} or positive scalar
+        the method to estimate the bandwidth or a scalar directly defining
+        the bandwidth.
+
+    max_precision : positive scalar, default is 0.05
+        the maximum precision expected for the peak(s).
+
+    num : integer, default is 512
+        the minimum number of points of the coarse grid. The grid is made
+        denser if required so that the spacing never exceeds half the
+        bandwidth, which guarantees that no peak is skipped.
+
+    all_peaks : bool, default is False
+        if True, return all the local maxima (i.e. for multimodal samples)
+        sorted by density, otherwise only the absolute maximum.
+
+    kde_method : string {'direct' or 'fft'}, optional
+        the method used to evaluate the coarse grid. Default 'direct'.
+
+    Call functions
+    --------------
+    - kde_bandwidth
+    - gaussian_kde from scipy
+    - fft_kde
+
+    Returns
+    -------
+    the x and y values of the coarse grid (tuple),
+    the location(s) of the peak(s) (array),
+    the density value(s) of the peak(s) (array)
+    """
+
+    pop = prepare_sample(pop)
+    h = kde_bandwidth(pop, bandwidth)
+    kde = pop.kde(bandwidth)
+    minimum, maximum = pop.min, pop.max
+
+    # coarse grid, its size does not depend on the requested precision
+    num = max(num, int(np.ceil(2 * (maximum - minimum) / h)) + 1)
+    xgrid = np.linspace(minimum, maximum, num=num)
+
+    if kde_method == 'direct':
+        densities = kde(xgrid)
+    elif kde_method == 'fft':
+        densities = fft_kde(pop.data, xgrid, h)
+    else:
+        raise ValueError("kde_method must be 'direct' or 'fft'")
+
+    # find the local maxima of the coarse grid (including the edges) ignoring
+    # negligible bumps in the tails (e.g. FFT round-off noise)
+    padded = np.concatenate(([-np.inf], densities, [-np.inf]))
+    is_peak = (padded[1:-1] >= padded[:-2]) & (padded[1:-1] > padded[2:])
+    candidates = np.flatnonzero(is_peak & (densities > 1e-8 * densities.max()))
+    if all_peaks is False:
+        candidates = candidates[[np.argmax(densities[candidates])]]
+
+    # refine each local maximum within its bracketing interval
+    peaks = np.empty(len(candidates))
+    for index, i in enumerate(candidates):
+        lower, upper = xgrid[max(i - 1, 0)], xgrid[min(i + 1, num - 1)]
+        peaks[index] = _golden_section_max(lambda x: kde(x)[0], lower, upper, max_precision)
+    y_peaks = kde(peaks)
+
+    order = np.argsort(y_peaks)[::-1]
+
+    return (xgrid, densities), peaks[order], y_peaks[order]
+
+
+def kde_mode(pop, bandwidth='silverman', max_precision=0.05):
+    """ Returns the peak of the Gaussian KDE ("mode") located by the
+    coarse-to-fine search of kde_peaks. Unlike freq_peak it returns only
+    the location of the peak, so that it can be used as an estimator, e.g.
+    in bootstrap_ci (it is a module-level function and thus picklable).
+
+    Parameters
+    ----------
+    pop : array_like or PreparedSample
+        the diameters of the grains
+
+    bandwidth : string {'silverman' or 'scott'} or positive scalar
+        the method to estimate the bandwidth or a scalar directly defining
+        the bandwidth.
+
+    max_precision : positive scalar, default is 0.05
+        the maximum precision expected for the peak.
+
+    Call functions
+    --------------
+    - kde_peaks
+
+    Returns
+    -------
+    the mode or peak grain size (float)
+    """
+
+    _, peaks, _ = kde_peaks(pop, bandwidth, max_precision)
+
+    return peaks[0]
+
+
+def weighted_mean_with_error(values, variances, verbose=False):
     """
     Calculate the weighted mean of a set of values considering estimation
     errors. Use cases: when you want to estimate a mean of averages taking
@@ -257,6 +414,8 @@ def weighted_mean_with_error(values, variances):
         The array of values.
     variances : array-like
         The array of variances (estimation errors) corresponding to each value.
+    verbose : bool, optional
+        If True, print the results. Default False (nothing is printed).
 
     Returns
     -------
@@ -282,8 +441,9 @@ def weighted_mean_with_error(values, variances):
     # Calculate the standard error of the weighted mean
     error = np.sqrt(1 / np.sum(weights))
 
-    print(f"Weighted Mean: {weighted_mean}")
-    print(f"Standard Error: {error}")
+    if verbose:
+        print(f"Weighted Mean: {weighted_mean}")
+        print(f"Standard Error: {error}")
 
     return weighted_mean, error
 
@@ -326,16 +486,221 @@ def weighted_mean_and_se(means, standard_errors):
 
     # Calculate the weights based on the inverse of squared standard errors
     weights = 1 / standard_errors**2
+    sum_weights = np.sum(weights)
 
     # Calculate the weighted mean
-    weighted_mean = np.sum(means * weights) / np.sum(weights)
+    weighted_mean = np.sum(means * weights) / sum_weights
 
     # Calculate the standard error of the weighted mean
-    se_weighted_mean = 1 / np.sqrt(np.sum(1 / standard_errors**2))
+    se_weighted_mean = 1 / np.sqrt(sum_weights)
 
     return weighted_mean, se_weighted_mean
 
 
+def grouped_weighted_mean(values, errors, groups, error_type='se'):
+    """
+    Calculate the inverse-variance weighted mean, its standard error and
+    the heterogeneity statistics of many groups at once (e.g. the stresses
+    or grain sizes of the sections of each outcrop). It does not print
+    anything.
+
+    Parameters
+    ----------
+    values : array-like
+        The values (e.g. averages) of all the groups.
+    errors : array-like
+        The estimation errors corresponding to each value.
+    groups : array-like
+        The group label of each value.
+    error_type : str, optional
+        Either 'se' if errors are standard errors (default) or
+        'variance' if errors are variances.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per group with the number of values (n), the weighted
+        mean, its standard error (SE), the Cochran's Q statistic (chi2),
+        the degrees of freedom (dof), the p-value of the chi2 test of
+        homogeneity and the I² statistic (percentage of the variation
+        due to heterogeneity rather than to estimation errors).
+
+    References
+    ----------
+    Higgins and Thompson (2002) https://doi.org/10.1002/sim.1186
+    """
+    from pandas import DataFrame
+
+    errors = np.asarray(errors, dtype=float).ravel()
+    values, codes, labels = group_codes(values, groups)
+    if len(errors) != len(values):
+        raise ValueError("Values and errors must have the same length.")
+
+    if error_type == 'se':
+        weights = 1 / errors**2
+    elif error_type == 'variance':
+        weights = 1 / errors
+    else:
+        raise ValueError("error_type must be 'se' or 'variance'")
+
+    num_groups = len(labels)
+    n = np.bincount(codes, minlength=num_groups)
+    sum_weights = np.bincount(codes, weights=weights, minlength=num_groups)
+    weighted_mean = np.bincount(codes, weights=weights * values, minlength=num_groups) / sum_weights
+
+    # heterogeneity statistics
+    q = np.bincount(codes, weights=weights * (values - weighted_mean[codes])**2, minlength=num_groups)
+    dof = n - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        i2 = np.where(q > 0, 100 * np.clip((q - dof) / q, 0, None), 0.0)
+
+    df = DataFrame({'n': n,
+                    'weighted_mean': weighted_mean,
+                    'SE': 1 / np.sqrt(sum_weights),
+                    'chi2': q,
+                    'dof': dof,
+                    'p_value': chi2.sf(q, dof),
+                    'I2': i2},
+                   index=labels)
+    df.index.name = 'group'
+
+    return df
+
+
+def area_weighted_mean(diameters, areas):
+    """ Returns the area-weighted mean grain size. It is vectorized
+    along the last axis, so it can be used by the bootstrap engine.
+
+    Parameters
+    ----------
+    diameters : array-like
+        the size of the grains
+    areas : array-like
+        the sectional areas of the grains
+
+    Examples
+    --------
+    >>> area_weighted_mean(data['diameters'], data['Areas'])
+    >>> bootstrap_ci((data['diameters'], data['Areas']), area_weighted_mean, vectorized=True)
+    """
+
+    diameters, areas = np.asarray(diameters), np.asarray(areas)
+
+    return np.sum(diameters * areas, axis=-1) / np.sum(areas, axis=-1)
+
+
+def grouped_averages(data, groups=None, offsets=None, ci=0.95):
+    """ Returns the arithmetic and geometric means, the median, the
+    spread measures and the confidence intervals of many samples at
+    once. All the estimates are computed with segmented (per-group)
+    NumPy reductions over a single flat array instead of calling amean,
+    gmean and median once per sample.
+
+    Parameters
+    ----------
+    data : array-like or pandas SeriesGroupBy
+        the grain sizes of all the samples as a single flat array or a
+        pandas groupby object, e.g. dataset.groupby('sample')['diameters']
+
+    groups : array-like or None, optional
+        the group (sample) label of each value in data
+
+    offsets : array-like or None, optional
+        the boundaries of the groups in data when the values of each
+        sample are stored contiguously, i.e. the values of group i are
+        data[offsets[i]:offsets[i + 1]]
+
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
+
+    Call functions
+    --------------
+    - group_codes
+    - CLT_ci, mCox_equation, CLT2_ci, bayesian_equation
+    - median_ci_ranks
+
+    Examples
+    --------
+    >>> grouped_averages(dataset['diameters'], groups=dataset['sample'])
+    >>> grouped_averages(dataset.groupby('sample')['diameters'], ci=0.99)
+    >>> grouped_averages(diameters, offsets=[0, 250, 700, 1200])
+
+    Returns
+    -------
+    a pandas DataFrame with one row per group and the following columns:
+    the sample size, the arithmetic mean, the SD, the ASTM and mCox
+    confidence intervals, the geometric mean, the MSD, the CLT and bayes
+    confidence intervals, the median, the IQR and the median confidence
+    interval. If several confidence levels are given, the confidence
+    interval columns are suffixed with the level, e.g. ASTM_lower_95
+    """
+
+    from pandas import DataFrame
+
+    values, codes, labels = group_codes(data, groups, offsets)
+    num_groups = len(labels)
+
+    # sort by group and then by value so that each group is contiguous and sorted
+    order = np.lexsort((values, codes))
+    values, codes = values[order], codes[order]
+    n = np.bincount(codes, minlength=num_groups)
+    starts = np.cumsum(n) - n
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # moments of the linear and log-transformed data (two-pass)
+        log_values = np.log(values)
+        mean = np.bincount(codes, weights=values, minlength=num_groups) / n
+        mean_log = np.bincount(codes, weights=log_values, minlength=num_groups) / n
+        ss = np.bincount(codes, weights=(values - mean[codes])**2, minlength=num_groups)
+        ss_log = np.bincount(codes, weights=(log_values - mean_log[codes])**2, minlength=num_groups)
+        std, std_log = np.sqrt(ss / (n - 1)), np.sqrt(ss_log / (n - 1))
+
+        # confidence intervals
+        (astm_low, astm_high), astm_length = CLT_ci(mean, std, n, ci)
+        (cox_low, cox_high), cox_length = mCox_equation(mean_log, std_log, n, ci)
+        (clt_low, clt_high), clt_length = CLT2_ci(mean_log, std_log, n, ci)
+        (bayes_low, bayes_high), bayes_length = bayesian_equation(mean_log, ss_log / n, n, ci)
+
+    # order statistics
+    def quantile(q):
+        position = q * (n - 1)
+        below = np.floor(position).astype(int)
+        above = np.minimum(below + 1, n - 1)
+        frac = position - below
+        return values[starts + below] + frac * (values[starts + above] - values[starts + below])
+
+    median = quantile(0.5)
+    iqr_range = quantile(0.75) - quantile(0.25)
+    id_lower, id_upper = median_ci_ranks(n, ci)
+    median_low, median_high = values[starts + id_lower], values[starts + id_upper]
+
+    # build the table, one set of CI columns per confidence level
+    columns = {}
+
+    def add_ci(name, low, high, length):
+        if np.ndim(ci) == 0:
+            columns.update({f'{name}_lower': low, f'{name}_upper': high, f'{name}_length': length})
+        else:
+            for i, level in enumerate(np.ravel(ci)):
+                columns.update({f'{name}_lower_{100 * level:g}': low[i],
+                                f'{name}_upper_{100 * level:g}': high[i],
+                                f'{name}_length_{100 * level:g}': length[i]})
+
+    columns.update({'n': n, 'amean': mean, 'SD': std})
+    add_ci('ASTM', astm_low, astm_high, astm_length)
+    add_ci('mCox', cox_low, cox_high, cox_length)
+    columns.update({'gmean': np.exp(mean_log), 'MSD': np.exp(std_log)})
+    add_ci('CLT', clt_low, clt_high, clt_length)
+    add_ci('bayes', bayes_low, bayes_high, bayes_length)
+    columns.update({'median': median, 'IQR': iqr_range})
+    add_ci('median', median_low, median_high, median_high - median_low)
+
+    df = DataFrame(columns, index=labels)
+    df.index.name = 'group'
+
+    return df
+
+
 # ============================================================================ #
 # CONFIDENCE INTERVAL METHODS                                                  #
 # ============================================================================ #
@@ -349,11 +714,11 @@ def conf_interval(data, confidence=0.95):
 
     Parameters
     ----------
-    data : array-like
+    data : array-like or PreparedSample
         the dataset
 
-    confidence : float between 0 and 1, optional
-        the confidence interval, default = 0.95
+    confidence : float between 0 and 1 (or a sequence of them), optional
+        the confidence interval(s), default = 0.95
 
     Assumptions
     -----------
@@ -369,17 +734,19 @@ def conf_interval(data, confidence=0.95):
     the arithmetic mean, the error, and the limits of the confidence interval
     """
 
-    dof = len(data) - 1
-    amean = np.mean(data)
-    std_err = sem(data)  # Standard error of the mean SD / sqrt(n)
-    low, high = t.interval(confidence, dof, amean, std_err)
-    err = high - amean
+    data = prepare_sample(data)
+    dof = data.n - 1
+    amean = data.mean
+    std_err = data.std / np.sqrt(data.n)  # Standard error of the mean SD / sqrt(n)
+    err = critical_t(confidence, dof) * std_err
+    low, high = amean - err, amean + err
 
     print(' ')
-    print(f'Mean = {amean:0.2f} ± {err:0.2f}')
-    print(f'Confidence set at {confidence * 100} %')
-    print(f'Max / min = {high:0.2f} / {low:0.2f}')
-    print(f'Coefficient of variation = ±{100 * err / amean:0.1f} %')
+    for level, level_err in zip(np.ravel(confidence), np.ravel(err)):
+        print(f'Mean = {amean:0.2f} ± {level_err:0.2f}')
+        print(f'Confidence set at {level * 100} %')
+        print(f'Max / min = {amean + level_err:0.2f} / {amean - level_err:0.2f}')
+        print(f'Coefficient of variation = ±{100 * level_err / amean:0.1f} %')
 
     return amean, err, (low, high)
 
@@ -391,17 +758,17 @@ def CLT_ci(amean, std, n, ci=0.95):
 
     Parameters
     ----------
-    amean : scalar, float
-        the arithmetic mean of the population
+    amean : scalar or array-like, float
+        the arithmetic mean of the population(s)
 
-    std : scalar, float
-        the standard deviation of the population
+    std : scalar or array-like, float
+        the standard deviation of the population(s)
 
-    n : scalar, positive int
-        the sample size
+    n : scalar or array-like, positive int
+        the sample size(s)
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     Reference
     ---------
@@ -432,17 +799,17 @@ def CLT2_ci(mean_log, std_log, n, ci=0.95):
 
     Parameters
     ----------
-    mean_log : scalar, float
+    mean_log : scalar or array-like, float
         the arithmetic mean of the log-transformed data
 
-    std_log : scalar, float
+    std_log : scalar or array-like, float
         the standard deviation of the log-transformed data
 
-    n : scalar, positive int
-        the sample size
+    n : scalar or array-like, positive int
+        the sample size(s)
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     Reference
     ---------
@@ -475,11 +842,11 @@ def mCox_ci(data, ci=0.95):
 
     Parameters
     ----------
-    data : array_like
+    data : array_like or PreparedSample
         the dataset
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     Reference
     ---------
@@ -488,7 +855,7 @@ def mCox_ci(data, ci=0.95):
 
     Call
     ----
-    calc_t
+    mCox_equation
 
     Returns
     -------
@@ -496,10 +863,34 @@ def mCox_ci(data, ci=0.95):
     the interval length (scalar)
     """
 
-    n = len(data)
+    data = prepare_sample(data)
+
+    return mCox_equation(data.mean_log, data.std_log, data.n, ci)
+
+
+def mCox_equation(mean_log, std_log, n, ci=0.95):
+    """ Modified Cox equation. It only requires the moments of the
+    log-transformed data so that it can be evaluated for many samples
+    at once.
+
+    Parameters
+    ----------
+    mean_log : scalar or array-like
+        the mean of the log-transformed population(s)
+    std_log : scalar or array-like
+        the Bessel corrected SD of the log-transformed population(s)
+    n : scalar or array-like
+        the sample size(s)
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
+
+    Returns
+    -------
+    the lower and upper confidence intervals (tuple)
+    the interval length (scalar or array-like)
+    """
+
     t = critical_t(confidence=ci, sample_size=n)
-    data = np.log(data)
-    mean_log, std_log = np.mean(data), np.std(data, ddof=1)
 
     lower = np.exp(mean_log + 0.5
                    * std_log**2 - t
@@ -514,22 +905,28 @@ def mCox_ci(data, ci=0.95):
     return (lower, upper), interval
 
 
-def GCI_ci(data, ci=0.95, runs=10000):
+def GCI_ci(data, ci=0.95, runs=10000, seed=None):
     """ Returns the confidence interval for the arithmetic mean using the
     generalized confidence interval (GCI) method of Krishnamoorthy and Mathew
     (2003). This is a Monte Carlo method optimized for lognormal populations.
 
     Parameters
     ----------
-    data : array_like
+    data : array_like, PreparedSample or StreamingStats
         the dataset
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     runs : integer, default=10000
         the number of (Monte Carlo) iterations to generate z and u**2 values
 
+    seed : int, Generator, SeedSequence or None, optional
+        the seed of the random generator. If an integer is provided the
+        result is reproducible and the Monte Carlo draws are reused between
+        samples with the same size (see GCI_draws). If None, new draws are
+        made in each call
+
     Reference
     ---------
     Krishnamoorthy and Mathew (2003) https://doi.org/10.1016/S0378-3758(02)00153-2
@@ -540,6 +937,7 @@ def GCI_ci(data, ci=0.95, runs=10000):
 
     Call
     ----
+    GCI_draws
     GCI_equation
 
     Returns
@@ -549,31 +947,157 @@ def GCI_ci(data, ci=0.95, runs=10000):
     """
 
     # estimate the log-transformed population y = ln(x) and the degrees of freedom
-    data = np.log(data)
-    mu_log, var_log, n = np.mean(data), np.var(data), len(data)
-    ddof = n - 1
-    alpha = 1 - ci
-
-    # Generate random values from the normal N(0,1) distribution
-    z_array = np.random.normal(loc=0, scale=1.0, size=runs)
+    if not isinstance(data, StreamingStats):
+        data = prepare_sample(data)
+    mu_log, var_log, n = data.mean_log, data.var_log, data.n
 
-    # Generate random values from (non-central) chi-square distribution
-    # with n-1 degrees of freedom
-    u2_array = np.random.noncentral_chisquare(df=ddof, nonc=0, size=runs)
-    u_array = np.sqrt(u2_array)
+    # get the z values from the normal N(0,1) distribution and the u values
+    # from the chi-square distribution with n-1 degrees of freedom
+    z_array, u_array = GCI_draws(n, runs, seed)
 
-    # Compute the T values and sort them
+    # Compute the T values and estimate all the confidence limits in a single pass
     T_array = GCI_equation(mu_log, var_log, z_array, u_array, n)
-    T_array = np.sort(T_array)
-
-    # Estimate confidence limits
-    lower = np.percentile(T_array, 100 * (alpha / 2))
-    upper = np.percentile(T_array, 100 * (1 - (alpha / 2)))
+    lower, upper = quantile_limits(T_array, ci)
     interval = upper - lower
 
     return (lower, upper), interval
 
 
+def GCI_qmc_ci(data, ci=0.95, tol=0.001, chunk_size=1024, max_runs=65536, seed=None):
+    """ Returns the confidence interval for the arithmetic mean using the
+    generalized confidence interval (GCI) method of Krishnamoorthy and Mathew
+    (2003) with quasi-Monte Carlo (scrambled Sobol) points drawn in chunks.
+    The iterations stop when the relative change of both confidence limits
+    between two consecutive chunks is below the tolerance, so usually much
+    fewer runs than the standard GCI_ci are required. For samples larger
+    than 100 the chi-square values are obtained from normal deviates using
+    the Wilson-Hilferty transformation (relative error < 0.05%), which is
+    much cheaper than the inverse chi-square distribution.
+
+    Parameters
+    ----------
+    data : array_like or PreparedSample
+        the dataset
+
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
+
+    tol : positive scalar, default=0.001
+        the relative tolerance of the confidence limits
+
+    chunk_size : integer (power of two), default=1024
+        the number of quasi-Monte Carlo points of the first iteration. The
+        number of points is doubled in each of the following iterations
+
+    max_runs : integer (power of two), default=65536
+        the maximum number of quasi-Monte Carlo points
+
+    seed : int or None, optional
+        the seed used to scramble the Sobol sequence
+
+    Reference
+    ---------
+    Krishnamoorthy and Mathew (2003) https://doi.org/10.1016/S0378-3758(02)00153-2
+
+    Assumptions
+    -----------
+    - The population follows a lognormal distribution
+
+    Call
+    ----
+    GCI_equation
+    Sobol from scipy.stats.qmc
+
+    Returns
+    -------
+    the lower and upper confidence intervals (tuple)
+    the interval length (scalar)
+    the number of runs used (integer)
+    """
+
+    if chunk_size < 2 or chunk_size & (chunk_size - 1) != 0:
+        raise ValueError("chunk_size must be a power of two")
+    if max_runs < 1 or max_runs & (max_runs - 1) != 0:
+        raise ValueError("max_runs must be a power of two")
+
+    data = prepare_sample(data)
+    mu_log, var_log, n = data.mean_log, data.var_log, data.n
+
+    sampler = qmc.Sobol(d=2, scramble=True, seed=seed)
+    eps = np.finfo(float).eps
+    df = n - 1
+    T_values, previous, runs = [], None, 0
+
+    while runs < max_runs:
+        # draw as many points as drawn so far (first chunk_size) to keep the
+        # balance properties of the Sobol sequence, and transform them into
+        # N(0,1) and chi-square(n-1) values
+        size = min(max(runs, chunk_size), max_runs - runs)
+        points = np.clip(sampler.random_base2(int(np.log2(size))), eps, 1 - eps)
+        z_array = norm.ppf(points[:, 0])
+        if df > 100:
+            # Wilson-Hilferty: (X / df)**(1/3) is approximately normal
+            a = 2 / (9 * df)
+            u_array = np.sqrt(df) * np.maximum(1 - a + norm.ppf(points[:, 1]) * np.sqrt(a), 0) ** 1.5
+        else:
+            u_array = np.sqrt(chi2.ppf(points[:, 1], df=df))
+        T_values.append(GCI_equation(mu_log, var_log, z_array, u_array, n))
+        runs += size
+
+        limits = np.array(quantile_limits(np.concatenate(T_values), ci))
+        if previous is not None and np.all(np.abs(limits - previous) <= tol * np.abs(limits)):
+            break
+        previous = limits
+
+    lower, upper = limits
+    interval = upper - lower
+
+    return (lower, upper), interval, runs
+
+
+def GCI_draws(n, runs=10000, seed=None):
+    """ Returns the random values required by the GCI method, i.e. runs
+    values from the normal N(0,1) distribution (z) and the square root of
+    runs values from the chi-square distribution with n-1 degrees of
+    freedom (u). The z and u values only depend on n, runs, and seed, so
+    with an integer seed they are cached and shared between samples of
+    equal size. Otherwise (None, Generator or SeedSequence) the values
+    are drawn anew in each call.
+
+    Parameters
+    ----------
+    n : integer
+        size of the dataset
+    runs : integer, default=10000
+        the number of Monte Carlo draws
+    seed : int, Generator, SeedSequence or None, optional
+        the seed of the random generator
+
+    Returns
+    -------
+    two read-only numpy arrays (z, u)
+    """
+
+    if isinstance(seed, (int, np.integer)):
+        return _cached_gci_draws(int(n), int(runs), int(seed))
+
+    return _draw_gci(int(n), int(runs), np.random.default_rng(seed))
+
+
+@lru_cache(maxsize=128)
+def _cached_gci_draws(n, runs, seed):
+    return _draw_gci(n, runs, np.random.default_rng(seed))
+
+
+def _draw_gci(n, runs, rng):
+    z_array = rng.standard_normal(size=runs)
+    u_array = np.sqrt(rng.chisquare(df=n - 1, size=runs))
+    z_array.flags.writeable = False
+    u_array.flags.writeable = False
+
+    return z_array, u_array
+
+
 def GCI_equation(mu_log, var_log, z, u, n):
     """ Generalized confidence interval (GCI) equation.
 
@@ -611,11 +1135,11 @@ def bayesian_ci(data, ci=0.95):
 
     Parameters
     ----------
-    data : array_like
+    data : array_like or PreparedSample
         the dataset
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     Reference
     ---------
@@ -627,7 +1151,115 @@ def bayesian_ci(data, ci=0.95):
 
     Call
     ----
-    bayes_mvs from scipy.stats module
+    bayesian_equation
+
+    Returns
+    -------
+    the lower and upper confidence intervals (tuple)
+    the interval length (scalar)
+    """
+
+    data = prepare_sample(data)
+
+    return bayesian_equation(data.mean_log, data.var_log, data.n, ci)
+
+
+def bayesian_equation(mean_log, var_log, n, ci=0.95):
+    """ Closed form of the posterior distribution of the mean used by
+    the scipy bayes_mvs routine (Oliphant, 2006), i.e. a t-distribution
+    with n-1 degrees of freedom or a normal distribution when n > 1000.
+    It only requires the moments of the log-transformed data so that it
+    can be evaluated for many samples at once.
+
+    Parameters
+    ----------
+    mean_log : scalar or array-like
+        the mean of the log-transformed population(s)
+    var_log : scalar or array-like
+        the variance (n degrees of freedom) of the log-transformed
+        population(s)
+    n : scalar or array-like
+        the sample size(s)
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
+
+    Returns
+    -------
+    the lower and upper confidence intervals (tuple)
+    the interval length (scalar or array-like)
+    """
+
+    n = np.asarray(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        err = np.where(n > 1000,
+                       levels_first(critical_z(ci), n) * np.sqrt(var_log / n),
+                       critical_t(ci, n - 1) * np.sqrt(var_log / (n - 1)))
+
+    lower, upper = np.exp(mean_log - err), np.exp(mean_log + err)
+    interval = upper - lower
+
+    return (lower, upper), interval
+
+
+def bootstrap_ci(data, estimator, ci=0.95, method='BCa', n_resamples=9999,
+                 vectorized=False, chunk_size=None, n_jobs=1, seed=None):
+    """ Returns the confidence interval of any estimator using the
+    (nonparametric) bootstrap. Resamples are drawn as 2D arrays of indices
+    in memory-bounded chunks. Vectorized estimators evaluate each chunk in
+    one shot, while non-vectorizable estimators (e.g. the KDE-based mode)
+    can be spread across a pool of processes with independent random
+    streams.
+
+    Parameters
+    ----------
+    data : array_like or tuple of array_like
+        the dataset. Several arrays of the same length (e.g. diameters
+        and areas) are resampled together (paired).
+
+    estimator : callable
+        a function of the array(s) returning a scalar, e.g. np.mean. If
+        vectorized, it must operate along the last axis of 2D arrays and
+        return one value per row, e.g. area_weighted_mean. Non-vectorized
+        estimators must be picklable (e.g. a module-level function) when
+        n_jobs > 1.
+
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
+
+    method : string {'BCa' or 'percentile'}, optional
+        'percentile' uses the percentiles of the bootstrap distribution,
+        'BCa' applies the bias-corrected and accelerated correction.
+        Default 'BCa'
+
+    n_resamples : integer, default=9999
+        the number of bootstrap resamples
+
+    vectorized : bool, default=False
+        whether the estimator is vectorized along the last axis
+
+    chunk_size : integer or None, optional
+        the number of resamples evaluated at once. By default, chunks are
+        limited to about 4 million values.
+
+    n_jobs : integer, default=1
+        the number of processes used for non-vectorized estimators (both
+        the resamples and the jackknife of the BCa method). The resamples
+        are drawn in blocks with independent random streams, so the
+        results do not depend on n_jobs
+
+    seed : int or None, optional
+        the seed of the random generator
+
+    Reference
+    ---------
+    Efron and Tibshirani (1993) An Introduction to the Bootstrap.
+    Chapman & Hall, New York. 436 pp.
+
+    Examples
+    --------
+    >>> bootstrap_ci(data['diameters'], np.median)
+    >>> bootstrap_ci((data['diameters'], data['Areas']), area_weighted_mean, vectorized=True)
+    >>> bootstrap_ci(data['diameters'], kde_mode, method='percentile', n_resamples=2000, n_jobs=4)
 
     Returns
     -------
@@ -635,15 +1267,113 @@ def bayesian_ci(data, ci=0.95):
     the interval length (scalar)
     """
 
-    data = np.log(data)
-    mu_log, var_log, std_log = bayes_mvs(data, alpha=ci)
-    mu, (lower_log, upper_log) = mu_log
-    lower, upper = np.exp(lower_log), np.exp(upper_log)
+    arrays = tuple(np.asarray(a) for a in data) if isinstance(data, tuple) else (np.asarray(data),)
+    n = len(arrays[0])
+    if any(len(a) != n for a in arrays):
+        raise ValueError("all the arrays must have the same length")
+    if method not in ('BCa', 'percentile'):
+        raise ValueError("method must be 'BCa' or 'percentile'")
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // n)
+
+    seed_seq = np.random.SeedSequence(seed)
+    theta_hat = estimator(*arrays)
+    jack = None
+
+    # bootstrap distribution
+    if vectorized:
+        rng = np.random.default_rng(seed_seq)
+        estimates = []
+        for size in _chunk_sizes(n_resamples, chunk_size):
+            idx = rng.integers(n, size=(size, n))
+            estimates.append(estimator(*(a[idx] for a in arrays)))
+        estimates = np.concatenate(estimates)
+
+    else:
+        # fixed blocks of resamples, each with its own random stream
+        shares = _chunk_sizes(n_resamples, 250)
+        seeds = seed_seq.spawn(len(shares))
+
+        if n_jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            starts = range(0, n, -(-n // n_jobs))
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                results = executor.map(_bootstrap_worker, [arrays] * len(shares), [estimator] * len(shares),
+                                       shares, seeds)
+                if method == 'BCa':
+                    jack = executor.map(_jackknife_worker, [arrays] * len(starts), [estimator] * len(starts),
+                                        starts, [min(start + -(-n // n_jobs), n) for start in starts])
+                    jack = np.concatenate(list(jack))
+                estimates = np.concatenate(list(results))
+        else:
+            estimates = np.concatenate([_bootstrap_worker(arrays, estimator, size, seeds[i])
+                                        for i, size in enumerate(shares)])
+
+    # confidence limits
+    alpha = 1 - np.ravel(ci)
+    quantiles = np.concatenate((alpha / 2, 1 - (alpha / 2)))
+
+    if method == 'BCa':
+        # bias correction
+        z0 = norm.ppf(np.mean(estimates < theta_hat))
+
+        # acceleration from the jackknife (leave-one-out) estimates
+        if vectorized:
+            jack = []
+            for start in range(0, n, chunk_size):
+                idx = _leave_one_out(start, min(chunk_size, n - start), n)
+                jack.append(estimator(*(a[idx] for a in arrays)))
+            jack = np.concatenate(jack)
+        elif jack is None:
+            jack = _jackknife_worker(arrays, estimator, 0, n)
+        diffs = np.mean(jack) - jack
+
+        # the correction is undefined (0/0) if all the jackknife estimates
+        # are equal or if no bootstrap estimate falls on one side
+        if np.sum(diffs**2) == 0 or not np.isfinite(z0):
+            warnings.warn("the BCa correction is undefined for this estimator/data, "
+                          "using the percentile method instead", RuntimeWarning)
+        else:
+            accel = np.sum(diffs**3) / (6 * np.sum(diffs**2)**1.5)
+            z_alpha = norm.ppf(quantiles)
+            quantiles = norm.cdf(z0 + (z0 + z_alpha) / (1 - accel * (z0 + z_alpha)))
+
+    lower, upper = np.split(np.quantile(estimates, quantiles), 2)
+    if np.ndim(ci) == 0:
+        lower, upper = lower[0], upper[0]
     interval = upper - lower
 
     return (lower, upper), interval
 
 
+def _bootstrap_worker(arrays, estimator, n_resamples, seed_seq):
+    rng = np.random.default_rng(seed_seq)
+    n = len(arrays[0])
+    estimates = np.empty(n_resamples)
+    for i in range(n_resamples):
+        idx = rng.integers(n, size=n)
+        estimates[i] = estimator(*(a[idx] for a in arrays))
+
+    return estimates
+
+
+def _jackknife_worker(arrays, estimator, start, stop):
+    return np.array([estimator(*(np.delete(a, i) for a in arrays)) for i in range(start, stop)])
+
+
+def _chunk_sizes(total, chunk_size):
+    """ Split total into a list of chunks of at most chunk_size."""
+    return [min(chunk_size, total - start) for start in range(0, total, chunk_size)]
+
+
+def _leave_one_out(start, size, n):
+    """ 2D array of indices whose row i skips the value start + i."""
+    skipped = np.arange(start, start + size)[:, np.newaxis]
+    idx = np.arange(n - 1)[np.newaxis, :]
+    return idx + (idx >= skipped)
+
+
 def median_ci(pop, n, ci=0.95):
     """ Estimate the approximate ci 95% error margins for the median
     using a rule of thumb based on Hollander and Wolfe (1999).
@@ -656,8 +1386,8 @@ def median_ci(pop, n, ci=0.95):
     n : scalar, positive int
         the sample size
 
-    ci : float, scalar between 0 and 1
-        the confidence interval, default = 0.95
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
 
     Reference
     ---------
@@ -674,18 +1404,906 @@ def median_ci(pop, n, ci=0.95):
     the interval length (scalar)
     """
 
-    z_score = norm.ppf(1 - (1 - ci) / 2)  # two-tailed z score
+    id_lower, id_upper = median_ci_ranks(n, ci)
+    upper_ci, lower_ci = pop[id_upper], pop[id_lower]
+    interval = upper_ci - lower_ci
 
-    id_upper = 1 + (n / 2) + (z_score * np.sqrt(n)) / 2
-    id_lower = (n / 2) - (z_score * np.sqrt(n)) / 2
+    return (lower_ci, upper_ci), interval
 
-    if int(np.ceil(id_upper)) >= len(pop):
-        upper_ci, lower_ci = pop[-1], pop[int(np.floor(id_lower))]
+
+def median_ci_ranks(n, ci=0.95):
+    """ Returns the (zero-based) ranks of the order statistics that
+    define the confidence interval of the median according to the rule
+    of thumb of Hollander and Wolfe (1999).
+
+    Parameters
+    ----------
+    n : scalar or array-like, positive int
+        the sample size(s)
+
+    ci : float between 0 and 1, or a sequence of them
+        the confidence interval(s), default = 0.95
+
+    Returns
+    -------
+    the ranks of the lower and upper limits (int or arrays of int, with
+    the confidence levels along the first axis)
+    """
+
+    n = np.asarray(n)
+    z_score = levels_first(critical_z(ci), n)  # two-tailed z score
+
+    id_upper = np.ceil(1 + (n / 2) + (z_score * np.sqrt(n)) / 2).astype(int)
+    id_lower = np.floor((n / 2) - (z_score * np.sqrt(n)) / 2).astype(int)
+
+    # clip the upper rank to the last value and wrap negative lower
+    # ranks as python indexing does for tiny samples
+    id_upper = np.minimum(id_upper, n - 1)
+    id_lower = np.where(id_lower < 0, id_lower + n, id_lower)
+
+    if id_lower.ndim == 0:
+        return int(id_lower), int(id_upper)
+
+    return id_lower, id_upper
+
+
+# ============================================================================ #
+# PREPARED SAMPLES                                                             #
+# ============================================================================ #
+
+
+class PreparedSample:
+    """ A grain size population that lazily computes and caches the
+    expensive transforms shared by the different estimators, i.e. the
+    log-transformed values, the sorted values, the moments of the linear
+    and log-transformed data and the Gaussian KDEs. All the averages and
+    plot functions accept it in place of the raw data, so a full
+    description of a sample does each transform only once. The values
+    are copied and stored as a read-only array, so the cached transforms
+    cannot get out of sync with the data.
+
+    Parameters
+    ----------
+    pop : array-like
+        the population
+
+    Examples
+    --------
+    >>> sample = PreparedSample(dataset['diameters'])
+    >>> amean(sample, method='GCI')
+    >>> gmean(sample)
+    >>> median(sample)
+    >>> freq_peak(sample)
+    """
+
+    __slots__ = ('data', 'n', '_log', '_sorted', '_range', '_moments', '_log_moments', '_kdes')
+
+    def __init__(self, pop):
+        self.data = np.array(pop, dtype=float, copy=True).ravel()
+        self.data.flags.writeable = False
+        self.n = len(self.data)
+        self._log = self._sorted = self._range = self._moments = self._log_moments = None
+        self._kdes = {}
+
+    def __len__(self):
+        return self.n
+
+    def __array__(self, dtype=None, copy=None):
+        return self.data if dtype is None else self.data.astype(dtype)
+
+    def __repr__(self):
+        return f'PreparedSample(n={self.n})'
+
+    @property
+    def log(self):
+        """ the log-transformed values"""
+        if self._log is None:
+            self._log = np.log(self.data)
+        return self._log
+
+    @property
+    def sorted(self):
+        """ the sorted values"""
+        if self._sorted is None:
+            self._sorted = np.sort(self.data)
+        return self._sorted
+
+    @property
+    def min(self):
+        """ the minimum value"""
+        return self._get_range()[0]
+
+    @property
+    def max(self):
+        """ the maximum value"""
+        return self._get_range()[1]
+
+    @property
+    def mean(self):
+        """ the arithmetic mean"""
+        return self._get_moments()[0]
+
+    @property
+    def std(self):
+        """ the Bessel corrected SD"""
+        return self._get_moments()[1]
+
+    @property
+    def mean_log(self):
+        """ the mean of the log-transformed values"""
+        return self._get_log_moments()[0]
+
+    @property
+    def std_log(self):
+        """ the Bessel corrected SD of the log-transformed values"""
+        return self._get_log_moments()[1]
+
+    @property
+    def var_log(self):
+        """ the variance (n degrees of freedom) of the log-transformed values"""
+        return self._get_log_moments()[2]
+
+    def _get_range(self):
+        if self._range is None:
+            if self._sorted is not None:
+                self._range = self._sorted[0], self._sorted[-1]
+            else:
+                self._range = self.data.min(), self.data.max()
+        return self._range
+
+    def _get_moments(self):
+        if self._moments is None:
+            self._moments = np.mean(self.data), np.std(self.data, ddof=1)
+        return self._moments
+
+    def _get_log_moments(self):
+        if self._log_moments is None:
+            mean_log = np.mean(self.log)
+            ss = np.sum((self.log - mean_log)**2)
+            self._log_moments = mean_log, np.sqrt(ss / (self.n - 1)), ss / self.n
+        return self._log_moments
+
+    def kde(self, bandwidth='silverman'):
+        """ Returns the (cached) Scipy's gaussian_kde of the sample.
+
+        Parameters
+        ----------
+        bandwidth : string {'silverman' or 'scott'} or positive scalar
+            the plug-in method to estimate the bandwidth or a scalar
+            directly defining the bandwidth
+        """
+
+        if bandwidth not in self._kdes:
+            if isinstance(bandwidth, (int, float)):
+                bw_method = bandwidth / self.std
+            elif isinstance(bandwidth, str):
+                bw_method = bandwidth
+            else:
+                raise ValueError("bandwidth must be integer, float, or plug-in methods 'silverman' or 'scott'")
+            self._kdes[bandwidth] = gaussian_kde(self.data, bw_method=bw_method)
+
+        return self._kdes[bandwidth]
+
+
+def prepare_sample(pop):
+    """ Returns pop as a PreparedSample (without copying it if it is
+    already prepared)."""
+
+    if isinstance(pop, PreparedSample):
+        return pop
+
+    return PreparedSample(pop)
+
+
+# ============================================================================ #
+# STREAMING (OUT-OF-CORE) ESTIMATORS                                           #
+# ============================================================================ #
+
+
+class StreamingStats:
+    """ Mergeable accumulator of the moments of the linear and the
+    log-transformed data for populations too large to be loaded as a
+    single array. The moments are updated chunk by chunk using the
+    Welford/Chan et al. algorithm so that the arithmetic and geometric
+    means, the SD, the MSD and the confidence intervals that only depend
+    on the moments (ASTM, mCox, GCI, CLT and bayes) can be estimated
+    without the full array. Partial accumulators (e.g. from different
+    files or workers) can be merged exactly.
+
+    Parameters
+    ----------
+    chunks : iterable of array-like or None, optional
+        the chunks of data to consume, e.g. a generator or a pandas
+        chunked file reader (column selected)
+
+    Reference
+    ---------
+    Chan, Golub and LeVeque (1979) Updating formulae and a pairwise
+    algorithm for computing sample variances. Technical Report STAN-CS-79-773
+
+    Examples
+    --------
+    >>> stats = StreamingStats(chunk['diameters'] for chunk in pd.read_csv(filepath, chunksize=100_000))
+    >>> stats = StreamingStats().update(chunk_1).update(chunk_2)
+    >>> stats = stats_file_1.merge(stats_file_2)
+    >>> mean, std, ci, length = stats.amean(ci=0.95, method='mCox')
+    """
+
+    __slots__ = ('n', 'mean', 'm2', 'mean_log', 'm2_log', 'minimum', 'maximum')
+
+    def __init__(self, chunks=None):
+        self.n = 0
+        self.mean, self.m2 = 0.0, 0.0
+        self.mean_log, self.m2_log = 0.0, 0.0
+        self.minimum, self.maximum = np.inf, -np.inf
+
+        if chunks is not None:
+            for chunk in chunks:
+                self.update(chunk)
+
+    def __repr__(self):
+        return f'StreamingStats(n={self.n}, amean={self.mean:0.2f}, gmean={np.exp(self.mean_log):0.2f})'
+
+    def update(self, chunk):
+        """ Consume a chunk of data (array-like) and return the
+        updated accumulator."""
+
+        chunk = np.asarray(chunk, dtype=float).ravel()
+        if chunk.size == 0:
+            return self
+
+        log_chunk = np.log(chunk)
+        n = chunk.size
+        mean, mean_log = np.mean(chunk), np.mean(log_chunk)
+        m2, m2_log = np.sum((chunk - mean)**2), np.sum((log_chunk - mean_log)**2)
+
+        self._combine(n, mean, m2, mean_log, m2_log, chunk.min(), chunk.max())
+
+        return self
+
+    def merge(self, other):
+        """ Return a new accumulator combining this and other."""
+
+        merged = StreamingStats()
+        for stats in (self, other):
+            merged._combine(stats.n, stats.mean, stats.m2, stats.mean_log,
+                            stats.m2_log, stats.minimum, stats.maximum)
+
+        return merged
+
+    __add__ = merge
+
+    def _combine(self, n, mean, m2, mean_log, m2_log, minimum, maximum):
+        if n == 0:
+            return
+
+        total = self.n + n
+        delta, delta_log = mean - self.mean, mean_log - self.mean_log
+        self.mean += delta * n / total
+        self.mean_log += delta_log * n / total
+        self.m2 += m2 + delta**2 * self.n * n / total
+        self.m2_log += m2_log + delta_log**2 * self.n * n / total
+        self.n = total
+        self.minimum, self.maximum = min(self.minimum, minimum), max(self.maximum, maximum)
+
+    @property
+    def std(self):
+        """ Bessel corrected SD of the data"""
+        return np.sqrt(self.m2 / (self.n - 1))
+
+    @property
+    def std_log(self):
+        """ Bessel corrected SD of the log-transformed data"""
+        return np.sqrt(self.m2_log / (self.n - 1))
+
+    @property
+    def var_log(self):
+        """ Variance (n degrees of freedom) of the log-transformed data"""
+        return self.m2_log / self.n
+
+    def amean(self, ci=0.95, method='ASTM', runs=10000, seed=None):
+        """ Returns the arithmetic mean, the Bessel corrected SD,
+        the confidence interval and its length. Methods can be 'ASTM',
+        'GCI', or 'mCox' (see averages.amean). The runs and seed of the
+        GCI method are passed to GCI_ci."""
+
+        if method == 'ASTM':
+            conf_int, length = CLT_ci(self.mean, self.std, self.n, ci)
+
+        elif method == 'GCI':
+            conf_int, length = GCI_ci(self, ci, runs, seed)
+
+        elif method == 'mCox':
+            conf_int, length = mCox_equation(self.mean_log, self.std_log, self.n, ci)
+
+        else:
+            raise Exception("ci methods must be 'ASTM', 'GCI', or 'mCox'")
+
+        return self.mean, self.std, conf_int, length
+
+    def gmean(self, ci=0.95, method='CLT'):
+        """ Returns the geometric mean, the multiplicative SD (MSD), the
+        confidence interval and its length. Methods can be 'CLT' or 'bayes'
+        (see averages.gmean)."""
+
+        if method == 'CLT':
+            conf_int, length = CLT2_ci(self.mean_log, self.std_log, self.n, ci)
+
+        elif method == 'bayes':
+            conf_int, length = bayesian_equation(self.mean_log, self.var_log, self.n, ci)
+
+        else:
+            raise Exception("CI methods must be 'CLT' or 'bayes'")
+
+        return np.exp(self.mean_log), np.exp(self.std_log), conf_int, length
+
+
+class QuantileSketch:
+    """ Mergeable quantile sketch (KLL-type) with bounded memory for
+    populations too large to be loaded as a single array or split across
+    files/workers. The sketch keeps a hierarchy of compactors; each time a
+    level exceeds its capacity it is sorted and every other item is promoted
+    to the next level with a doubled weight. The memory is O(k log(n / k))
+    and the normalized rank error of the quantiles is about 2/k at most
+    and 1.3/k on average (i.e. about 1% and 0.65% for k=200). The sketch
+    can be used in place of the raw data in median, order_statistics and
+    plot.qq_plot.
+
+    Parameters
+    ----------
+    chunks : iterable of array-like or None, optional
+        the chunks of data to consume
+
+    k : integer, default=200
+        the capacity of the top compactor (accuracy parameter)
+
+    seed : int or None, optional
+        the seed of the random generator used by the compactors
+
+    Reference
+    ---------
+    Karnin, Lang and Liberty (2016) https://doi.org/10.1109/FOCS.2016.17
+
+    Examples
+    --------
+    >>> sketch = QuantileSketch(chunk['diameters'] for chunk in pd.read_csv(filepath, chunksize=100_000))
+    >>> sketch.quantile([0.25, 0.5, 0.75])
+    >>> median(sketch_file_1.merge(sketch_file_2))
+    """
+
+    __slots__ = ('k', 'n', 'levels', 'minimum', 'maximum', '_rng')
+
+    def __init__(self, chunks=None, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.minimum, self.maximum = np.inf, -np.inf
+        self._rng = np.random.default_rng(seed)
+
+        if chunks is not None:
+            for chunk in chunks:
+                self.update(chunk)
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return f'QuantileSketch(n={self.n}, k={self.k}, items={sum(len(level) for level in self.levels)})'
+
+    def update(self, chunk):
+        """ Consume a chunk of data (array-like) and return the
+        updated sketch."""
+
+        chunk = np.asarray(chunk, dtype=float).ravel()
+        if chunk.size == 0:
+            return self
+
+        self.n += chunk.size
+        self.minimum, self.maximum = min(self.minimum, chunk.min()), max(self.maximum, chunk.max())
+        self.levels[0] = np.concatenate((self.levels[0], chunk))
+        self._compress()
+
+        return self
+
+    def merge(self, other):
+        """ Return a new sketch combining this and other. The new sketch
+        gets its own random stream, seeded from this sketch's generator."""
+
+        merged = QuantileSketch(k=max(self.k, other.k), seed=self._rng.integers(2**63))
+        merged.n = self.n + other.n
+        merged.minimum, merged.maximum = min(self.minimum, other.minimum), max(self.maximum, other.maximum)
+        height = max(len(self.levels), len(other.levels))
+        merged.levels = [np.concatenate([sketch.levels[h] for sketch in (self, other) if h < len(sketch.levels)])
+                         for h in range(height)]
+        merged._compress()
+
+        return merged
+
+    __add__ = merge
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            height = len(self.levels)
+            capacity = max(2, int(np.ceil(self.k * (2 / 3)**(height - 1 - h))))
+            level = self.levels[h]
+
+            if len(level) > capacity:
+                level = np.sort(level)
+                # keep the last item of odd-length levels in place
+                keep, level = level[len(level) - len(level) % 2:], level[:len(level) - len(level) % 2]
+                promoted = level[self._rng.integers(2)::2]
+                if h + 1 == height:
+                    self.levels.append(np.empty(0))
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            h += 1
+
+    def items(self):
+        """ Returns the sorted items retained in the sketch and
+        their weights (number of values they represent)."""
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0**h) for h, level in enumerate(self.levels)])
+        order = np.argsort(values)
+
+        return values[order], weights[order]
+
+    def quantile(self, q):
+        """ Returns the approximate quantile(s) q (scalar or array
+        between 0 and 1) using linear interpolation between ranks as
+        np.quantile does. The values are exact if no compaction has
+        occurred yet."""
+
+        values, weights = self.items()
+        # the (zero-based) central rank of each item
+        ranks = np.cumsum(weights) - (weights + 1) / 2
+        ranks = np.concatenate(([0], ranks, [self.n - 1]))
+        values = np.concatenate(([self.minimum], values, [self.maximum]))
+
+        return np.interp(np.asarray(q) * (self.n - 1), ranks, values)
+
+    def sample(self, size, seed=None):
+        """ Returns an approximate random sample (with replacement) of
+        the population from the weighted items of the sketch."""
+
+        values, weights = self.items()
+        rng = np.random.default_rng(seed)
+
+        return rng.choice(values, size=size, p=weights / weights.sum())
+
+
+# ============================================================================ #
+# MONTE CARLO SIMULATIONS                                                      #
+# ============================================================================ #
+
+
+def ci_coverage(shapes, sizes, n_sims=1000, ci=0.95, scale=3.0,
+                methods=('ASTM', 'mCox', 'GCI', 'CLT', 'bayes', 'median'),
+                runs=10000, n_jobs=1, seed=None, checkpoint=None):
+    """ Estimate the empirical coverage and the length of the confidence
+    intervals of the different methods by Monte Carlo simulation of
+    lognormal populations. Useful to (re)validate the thresholds used by
+    summarize to choose the optimal method. The samples of each (shape, n)
+    scenario are generated as a 2D array and all the methods are evaluated
+    vectorized over the rows. Scenarios can be spread over a pool of
+    processes, each with an independent random stream, and the results can
+    be checkpointed to disk so that long sweeps can be resumed.
+
+    Parameters
+    ----------
+    shapes : scalar or array-like
+        the shape(s) of the lognormal populations, i.e. the SD of the
+        log-transformed values (MSD = exp(shape))
+
+    sizes : integer or array-like of integers
+        the sample size(s)
+
+    n_sims : integer, default=1000
+        the number of simulated samples per scenario
+
+    ci : float, scalar between 0 and 1
+        the confidence interval, default = 0.95
+
+    scale : scalar, default=3.0
+        the mean of the log-transformed values (gmean = exp(scale))
+
+    methods : tuple, optional
+        the methods to evaluate: 'ASTM', 'mCox' and 'GCI' for the arithmetic
+        mean, 'CLT' and 'bayes' for the geometric mean, and 'median'
+
+    runs : integer, default=10000
+        the number of Monte Carlo iterations of the GCI method
+
+    n_jobs : integer, default=1
+        the number of processes
+
+    seed : int or None, optional
+        the seed of the random generator. Each scenario gets its own stream
+        (SeedSequence.spawn), so results do not depend on n_jobs or on the
+        order in which the scenarios are completed
+
+    checkpoint : str or None, optional
+        the path of a csv file where the results of each scenario are
+        appended when completed, together with the settings of the sweep
+        (n_sims, ci, scale, methods, runs and seed). If the file exists,
+        the scenarios already stored are not simulated again and a
+        ValueError is raised if the settings do not match. If seed is None,
+        the seed stored in the checkpoint is reused
+
+    Call functions
+    --------------
+    - gen_lognorm_population
+    - CLT_ci, mCox_equation, GCI_equation, CLT2_ci, bayesian_equation
+    - median_ci_ranks
+
+    Examples
+    --------
+    >>> ci_coverage(shapes=(0.2, 0.5, 0.8), sizes=(30, 60, 100, 200), seed=42)
+    >>> ci_coverage(np.linspace(0.1, 1, 10), range(20, 301, 20), n_jobs=8, seed=42, checkpoint='sweep.csv')
+
+    Returns
+    -------
+    a pandas DataFrame with the shape, the sample size, the method, the
+    coverage (fraction of intervals containing the true value), and the
+    mean and median interval lengths
+    """
+
+    import os
+    from itertools import product
+    from pandas import DataFrame, read_csv, concat
+
+    scenarios = list(product(np.atleast_1d(shapes).tolist(), np.atleast_1d(sizes).astype(int).tolist()))
+    settings = {'n_sims': int(n_sims), 'ci': float(ci), 'scale': float(scale),
+                'methods': ' '.join(methods), 'runs': int(runs), 'seed': seed}
+
+    # recover the scenarios already completed
+    done = DataFrame()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        done = read_csv(checkpoint, dtype={'seed': str})
+        if seed is None and 'seed' in done:
+            settings['seed'] = int(done['seed'].iloc[0])
+        for key, value in settings.items():
+            if key not in done or set(done[key].astype(str)) != {str(value)}:
+                raise ValueError(f"the {key} of the checkpoint does not match the current settings, "
+                                 "use a new checkpoint file")
+        done = done.drop(columns=list(settings))
+        completed = set(zip(done['shape'], done['n']))
+        pending = [(i, sc) for i, sc in enumerate(scenarios) if sc not in completed]
     else:
-        upper_ci, lower_ci = pop[int(np.ceil(id_upper))], pop[int(np.floor(id_lower))]
-    interval = upper_ci - lower_ci
+        pending = list(enumerate(scenarios))
 
-    return (lower_ci, upper_ci), interval
+    # store the entropy of unseeded sweeps so that they can be resumed
+    seed_seq = np.random.SeedSequence(settings['seed'])
+    settings['seed'] = seed_seq.entropy
+    seeds = seed_seq.spawn(len(scenarios))
+
+    def store(rows):
+        if checkpoint is not None:
+            DataFrame(rows).assign(**settings).to_csv(checkpoint, mode='a', index=False,
+                                                      header=not os.path.exists(checkpoint))
+        return rows
+
+    results = []
+    args = [(scale, shape, n, n_sims, ci, methods, runs, seeds[i]) for i, (shape, n) in pending]
+
+    if n_jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_coverage_scenario, *arg) for arg in args]
+            for future in as_completed(futures):
+                results.extend(store(future.result()))
+    else:
+        for arg in args:
+            results.extend(store(_coverage_scenario(*arg)))
+
+    df = concat([done, DataFrame(results)], ignore_index=True)
+
+    return df.sort_values(['shape', 'n', 'method'], ignore_index=True)
+
+
+def _coverage_scenario(scale, shape, n, n_sims, ci, methods, runs, seed_seq):
+    """ Coverage and interval length of the CI methods for a single
+    (shape, n) scenario (see ci_coverage)."""
+
+    rng = np.random.default_rng(seed_seq)
+    samples = gen_lognorm_population(scale, shape, (n_sims, n), seed=rng)
+
+    # moments of each simulated sample (rows)
+    logs = np.log(samples)
+    mean, std = np.mean(samples, axis=1), np.std(samples, axis=1, ddof=1)
+    mean_log, std_log, var_log = np.mean(logs, axis=1), np.std(logs, axis=1, ddof=1), np.var(logs, axis=1)
+
+    true_amean, true_gmean = np.exp(scale + shape**2 / 2), np.exp(scale)
+    limits = {}
+
+    if 'ASTM' in methods:
+        limits['ASTM'] = CLT_ci(mean, std, n, ci)[0], true_amean
+    if 'mCox' in methods:
+        limits['mCox'] = mCox_equation(mean_log, std_log, n, ci)[0], true_amean
+    if 'GCI' in methods:
+        z_array, u_array = _draw_gci(n, runs, rng)
+        alpha = 1 - ci
+        lower, upper = np.empty(n_sims), np.empty(n_sims)
+        step = max(1, 2**22 // runs)  # bound the memory of the T values
+        for start in range(0, n_sims, step):
+            rows = slice(start, start + step)
+            T_array = GCI_equation(mean_log[rows, np.newaxis], var_log[rows, np.newaxis], z_array, u_array, n)
+            lower[rows], upper[rows] = np.quantile(T_array, [alpha / 2, 1 - (alpha / 2)], axis=1)
+        limits['GCI'] = (lower, upper), true_amean
+    if 'CLT' in methods:
+        limits['CLT'] = CLT2_ci(mean_log, std_log, n, ci)[0], true_gmean
+    if 'bayes' in methods:
+        limits['bayes'] = bayesian_equation(mean_log, var_log, n, ci)[0], true_gmean
+    if 'median' in methods:
+        id_lower, id_upper = median_ci_ranks(n, ci)
+        ordered = np.sort(samples, axis=1)
+        limits['median'] = (ordered[:, id_lower], ordered[:, id_upper]), true_gmean
+
+    rows = []
+    for method, ((lower, upper), true_value) in limits.items():
+        length = upper - lower
+        rows.append({'shape': shape,
+                     'n': n,
+                     'method': method,
+                     'coverage': np.mean((lower <= true_value) & (true_value <= upper)),
+                     'mean_length': np.mean(length),
+                     'median_length': np.median(length)})
+
+    return rows
+
+
+# ============================================================================ #
+# SYNTHETIC POPULATION CORPORA                                                 #
+# ============================================================================ #
+
+
+def gen_population_corpus(path, n_populations, sizes=(50, 1000), kind='lognormal',
+                          scale=(2.5, 4.0), shape=(0.2, 0.9), weight=(0.1, 0.5),
+                          shift=(0.5, 1.5), lower=(0.0, 0.3), chunk_size=2**22,
+                          dtype='float64', seed=None):
+    """ Generate a large corpus of synthetic grain size populations and
+    store it on disk, chunk by chunk, as memory-mapped arrays. The values
+    of all the populations are stored contiguously in a single flat
+    array (values.npy), the boundaries of each population in offsets.npy
+    and the parameters of each population in params.npz. Use
+    load_population_corpus to stream over the corpus without holding it
+    in memory.
+
+    Parameters
+    ----------
+    path : str
+        the folder where the corpus is stored (created if needed)
+
+    n_populations : integer
+        the number of populations
+
+    sizes : integer or tuple (min, max)
+        the sample size of the populations (at least 1), drawn uniformly
+        if a range
+
+    kind : string, default 'lognormal'
+        the type of the populations: 'lognormal', 'mixture' (two
+        lognormal components with the same shape) or 'truncated'
+        (lognormal populations without the smallest grains, e.g. below
+        the detection limit)
+
+    scale : scalar or tuple (min, max)
+        the mean of the log-transformed values (gmean = exp(scale))
+
+    shape : scalar or tuple (min, max)
+        the SD of the log-transformed values (MSD = exp(shape))
+
+    weight : scalar or tuple (min, max)
+        only for mixtures, the fraction of grains of the second component
+
+    shift : scalar or tuple (min, max)
+        only for mixtures, the scale of the second component minus the
+        scale of the first one
+
+    lower : scalar or tuple (min, max)
+        only for truncated populations, the fraction (quantile) of the
+        parent lognormal distribution removed from the lower tail
+
+    chunk_size : integer, default=2**22
+        the maximum number of values generated and written at once. The
+        chunks always contain whole populations (a single population if
+        larger than chunk_size)
+
+    dtype : str or numpy dtype, default 'float64'
+        the data type of the stored values
+
+    seed : int or None, optional
+        the seed of the random generator. Each chunk gets its own stream
+        (SeedSequence.spawn), so any chunk can be regenerated independently
+        (for the same chunk_size)
+
+    Examples
+    --------
+    >>> gen_population_corpus('corpus', n_populations=1_000_000, seed=42)
+    >>> gen_population_corpus('mixtures', 100_000, kind='mixture', shape=0.4, seed=42)
+
+    Returns
+    -------
+    the corpus as a PopulationCorpus object
+    """
+
+    import os
+
+    if kind not in ('lognormal', 'mixture', 'truncated'):
+        raise ValueError("kind must be 'lognormal', 'mixture' or 'truncated'")
+    if np.min(sizes) < 1:
+        raise ValueError("the sample sizes must be at least 1")
+
+    params_seq, chunks_seq = np.random.SeedSequence(seed).spawn(2)
+    rng = np.random.default_rng(params_seq)
+
+    # draw the parameters of all the populations
+    if np.ndim(sizes) == 0:
+        n = np.full(n_populations, sizes, dtype=np.int64)
+    else:
+        n = rng.integers(sizes[0], sizes[1] + 1, size=n_populations)
+    params = {'n': n,
+              'scale': _uniform(rng, scale, n_populations),
+              'shape': _uniform(rng, shape, n_populations)}
+    if kind == 'mixture':
+        params['weight'] = _uniform(rng, weight, n_populations)
+        params['shift'] = _uniform(rng, shift, n_populations)
+    elif kind == 'truncated':
+        params['lower'] = _uniform(rng, lower, n_populations)
+
+    offsets = np.zeros(n_populations + 1, dtype=np.int64)
+    np.cumsum(n, out=offsets[1:])
+
+    os.makedirs(path, exist_ok=True)
+    values = np.lib.format.open_memmap(os.path.join(path, 'values.npy'), mode='w+',
+                                       dtype=dtype, shape=(int(offsets[-1]),))
+
+    # generate and write the values chunk by chunk
+    bounds = _chunk_bounds(offsets, chunk_size)
+    for (start, stop), chunk_seq in zip(bounds, chunks_seq.spawn(len(bounds))):
+        chunk = {key: np.repeat(val[start:stop], n[start:stop]) for key, val in params.items() if key != 'n'}
+        values[offsets[start]:offsets[stop]] = _draw_populations(kind, chunk, np.random.default_rng(chunk_seq))
+    values.flush()
+    del values
+
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    np.savez(os.path.join(path, 'params.npz'), kind=kind, **params)
+
+    return load_population_corpus(path)
+
+
+def _chunk_bounds(offsets, max_values):
+    """ Returns the (start, stop) indices of consecutive groups of whole
+    populations with at most max_values values (or a single population
+    if larger)."""
+
+    bounds, start, num = [], 0, len(offsets) - 1
+    while start < num:
+        stop = np.searchsorted(offsets, offsets[start] + max_values, side='right') - 1
+        stop = min(max(int(stop), start + 1), num)
+        bounds.append((start, stop))
+        start = stop
+
+    return bounds
+
+
+def _uniform(rng, bounds, size):
+    """ Draw size values uniformly between the bounds (min, max) or
+    return a constant array if bounds is a scalar"""
+    if np.ndim(bounds) == 0:
+        return np.full(size, bounds, dtype=float)
+    return rng.uniform(bounds[0], bounds[1], size=size)
+
+
+def _draw_populations(kind, params, rng):
+    """ Draw the values of a chunk of populations. The parameters are
+    given per value, i.e. repeated n times for each population."""
+
+    if kind == 'truncated':
+        # inverse transform sampling of the upper part of the distribution
+        z = norm.ppf(params['lower'] + (1 - params['lower']) * rng.random(len(params['scale'])))
+    else:
+        z = rng.standard_normal(len(params['scale']))
+
+    loc = params['scale']
+    if kind == 'mixture':
+        loc = loc + params['shift'] * (rng.random(len(loc)) < params['weight'])
+
+    return np.exp(loc + params['shape'] * z)
+
+
+def load_population_corpus(path):
+    """ Load a corpus of populations created with gen_population_corpus.
+    The values are memory-mapped (read-only), so nothing is read from disk
+    until used.
+
+    Parameters
+    ----------
+    path : str
+        the folder of the corpus
+
+    Returns
+    -------
+    the corpus as a PopulationCorpus object
+    """
+
+    import os
+
+    with np.load(os.path.join(path, 'params.npz')) as stored:
+        params = {key: stored[key] for key in stored.files}
+
+    return PopulationCorpus(path,
+                            np.load(os.path.join(path, 'values.npy'), mmap_mode='r'),
+                            np.load(os.path.join(path, 'offsets.npy')),
+                            params)
+
+
+class PopulationCorpus:
+    """ A corpus of synthetic populations stored contiguously in a flat
+    (memory-mapped) array of values, the values of population i being
+    values[offsets[i]:offsets[i + 1]]. Iterating over the corpus yields
+    the populations one by one whereas chunks() yields groups of whole
+    populations ready for the grouped (segmented) estimators.
+
+    Examples
+    --------
+    >>> corpus = load_population_corpus('corpus')
+    >>> corpus[10]                   # the values of the 11th population
+    >>> corpus.params['shape'][10]   # and its shape
+    >>> for first, values, offsets in corpus.chunks():
+    ...     grouped_averages(values, offsets=offsets)
+    >>> corpus.averages(ci=0.95)
+    """
+
+    __slots__ = ('path', 'values', 'offsets', 'params')
+
+    def __init__(self, path, values, offsets, params):
+        self.path = path
+        self.values = values
+        self.offsets = offsets
+        self.params = params
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError("population index out of range")
+        i = i % len(self)
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __repr__(self):
+        return "PopulationCorpus('{}', kind={}, populations={}, values={})".format(
+            self.path, self.params['kind'], len(self), self.offsets[-1])
+
+    def chunks(self, max_values=2**22):
+        """ Yield the index of the first population, the values and the
+        (local) offsets of consecutive groups of whole populations with at
+        most max_values values (or a single population if larger)."""
+
+        for start, stop in _chunk_bounds(self.offsets, max_values):
+            yield start, self.values[self.offsets[start]:self.offsets[stop]], self.offsets[start:stop + 1] - self.offsets[start]
+
+    def averages(self, ci=0.95, max_values=2**22):
+        """ Returns the averages and confidence intervals of all the
+        populations (see grouped_averages) streaming over the corpus in
+        chunks of at most max_values values."""
+
+        from pandas import concat
+
+        results = []
+        for first, values, offsets in self.chunks(max_values):
+            df = grouped_averages(values, offsets=offsets, ci=ci)
+            df.index = df.index + first
+            results.append(df)
+
+        return concat(results)
 
 
 # ============================================================================ #
@@ -694,25 +2312,340 @@ def median_ci(pop, n, ci=0.95):
 
 
 def critical_t(confidence, sample_size):
-    """Returns the (two-tailed) critical value of t-distribution
+    """Returns the (two-tailed) critical value of t-distribution. The
+    values are taken from a memoized table of critical values computed
+    once per confidence level for 1 to 1000 degrees of freedom. For
+    larger degrees of freedom the values are interpolated linearly in
+    1/dof between the last tabulated value and the normal z-score
+    (relative error < 1e-5).
 
     Parameters
     ----------
-    confidence : float, scalar between 0 and 1
-        the level of confidence. E.g. 0.95 -> 95%
+    confidence : float between 0 and 1, or a sequence of them
+        the level(s) of confidence. E.g. 0.95 -> 95%
 
-    sample_size : scalar, int
-        the sample size
+    sample_size : scalar or array-like, int
+        the sample size(s)
 
     Assumptions
     -----------
     - the population is symmetric
+
+    Call
+    ----
+    critical_t_table
+
+    Returns
+    -------
+    the critical value(s), a float or an array. If several confidence
+    levels are given, the levels are placed along the first axis
+    """
+
+    if np.ndim(confidence) > 0:
+        return np.array([critical_t(float(level), sample_size) for level in np.ravel(confidence)])
+
+    table = critical_t_table(confidence)
+    max_dof = len(table) - 1
+
+    # fast path for the most common case, a single tabulated sample size
+    if isinstance(sample_size, (int, np.integer)) and 1 <= sample_size <= max_dof:
+        return float(table[sample_size])
+
+    dof = np.asarray(sample_size)
+
+    is_int = (dof == np.round(dof)) & (dof >= 1)
+    index = np.clip(np.where(is_int, dof, 1), 1, max_dof).astype(int)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.clip(max_dof / dof, 0, 1)
+    t_score = np.where(dof > max_dof,
+                       table[0] + weight * (table[max_dof] - table[0]),
+                       table[index])
+
+    # non-integer or non-positive degrees of freedom are not tabulated
+    if not np.all(is_int):
+        q = confidence + ((1 - confidence) / 2)
+        t_score = np.where(is_int, t_score, t.ppf(q, dof))
+
+    if t_score.ndim == 0:
+        return float(t_score)
+
+    return t_score
+
+
+@lru_cache(maxsize=32)
+def critical_t_table(confidence, max_dof=1000):
+    """ Returns a read-only table with the two-tailed critical values of the
+    t-distribution for a given confidence level. The item i of the table
+    is the critical value for i degrees of freedom and the item 0 is the
+    critical value of the normal distribution (infinite degrees of freedom).
+
+    Parameters
+    ----------
+    confidence : float, scalar between 0 and 1
+        the level of confidence. E.g. 0.95 -> 95%
+    max_dof : integer, default=1000
+        the maximum degrees of freedom tabulated
     """
 
     # recalculate confidence for the two-tailed t-distribution
-    confidence = confidence + ((1 - confidence) / 2)
+    q = confidence + ((1 - confidence) / 2)
+
+    table = np.empty(max_dof + 1)
+    table[0] = norm.ppf(q)
+    table[1:] = t.ppf(q, np.arange(1, max_dof + 1))
+    table.flags.writeable = False
+
+    return table
+
+
+def critical_z(confidence):
+    """Returns the (two-tailed) critical value of the normal distribution
+
+    Parameters
+    ----------
+    confidence : float between 0 and 1, or a sequence of them
+        the level(s) of confidence. E.g. 0.95 -> 95%
+    """
+
+    if np.ndim(confidence) > 0:
+        return np.array([_critical_z(float(level)) for level in np.ravel(confidence)])
+
+    return _critical_z(confidence)
+
+
+@lru_cache(maxsize=32)
+def _critical_z(confidence):
+    return float(norm.ppf(1 - (1 - confidence) / 2))
+
+
+def levels_first(values, n):
+    """ Reshape an array with one value per confidence level so that it
+    broadcasts against the sample size(s) n, i.e. with the levels along
+    the first axis."""
+
+    return np.reshape(values, np.shape(values) + (1,) * np.ndim(n))
+
+
+def quantile_limits(values, ci=0.95):
+    """ Returns the lower and upper limits of the central interval(s)
+    of the given confidence level(s) from a set of (Monte Carlo or
+    bootstrap) values in a single np.quantile call.
+
+    Parameters
+    ----------
+    values : array-like
+        the simulated values
+    ci : float between 0 and 1, or a sequence of them
+        the confidence level(s)
+
+    Returns
+    -------
+    the lower and upper limits (scalars or arrays, one per level)
+    """
+
+    alpha = 1 - np.ravel(ci)
+    limits = np.quantile(values, np.concatenate((alpha / 2, 1 - (alpha / 2))))
+    lower, upper = np.split(limits, 2)
+
+    if np.ndim(ci) == 0:
+        return lower[0], upper[0]
+
+    return lower, upper
+
+
+def group_codes(data, groups=None, offsets=None):
+    """ Returns a flat array of values, the integer group code of each
+    value (from 0 to number of groups - 1) and the group labels.
+
+    Parameters
+    ----------
+    data : array-like or pandas SeriesGroupBy
+        the values of all the groups or a pandas groupby object
+    groups : array-like or None
+        the group label of each value
+    offsets : array-like or None
+        the boundaries of contiguous groups, the values of group i are
+        data[offsets[i]:offsets[i + 1]]
+    """
+
+    if hasattr(data, 'ngroup'):  # pandas groupby object
+        if data.obj.ndim != 1:
+            raise ValueError("select a single column from the groupby object, e.g. df.groupby('sample')['diameters']")
+        codes = data.ngroup().to_numpy()
+        values = data.obj.to_numpy(dtype=float)
+        mask = codes >= 0  # drop values with missing group keys
+        return values[mask], codes[mask], data.size().index
+
+    values = np.asarray(data, dtype=float).ravel()
+
+    if groups is not None and offsets is None:
+        if len(groups) != len(values):
+            raise ValueError("data and groups must have the same length")
+        labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+        return values, codes.ravel(), labels
+
+    elif offsets is not None and groups is None:
+        offsets = np.asarray(offsets, dtype=int)
+        if offsets[0] != 0 or offsets[-1] != len(values) or np.any(np.diff(offsets) <= 0):
+            raise ValueError("offsets must be strictly increasing and span from 0 to len(data)")
+        labels = np.arange(len(offsets) - 1)
+        return values, np.repeat(labels, np.diff(offsets)), labels
+
+    else:
+        raise ValueError("either groups or offsets must be provided (but not both)")
+
+
+def kde_bandwidth(data, bandwidth='silverman'):
+    """ Returns the bandwidth of the Gaussian KDE (in data units) following
+    the Scipy's gaussian_kde conventions.
+
+    Parameters
+    ----------
+    data : array_like
+        the dataset
+    bandwidth : string {'silverman' or 'scott'} or positive scalar
+        the plug-in method to estimate the bandwidth or a scalar directly
+        defining the bandwidth
+    """
+
+    if isinstance(bandwidth, (int, float)):
+        return bandwidth
+
+    n = len(data)
+    if bandwidth == 'silverman':
+        factor = (n * 3 / 4) ** (-1 / 5)
+    elif bandwidth == 'scott':
+        factor = n ** (-1 / 5)
+    else:
+        raise ValueError("bandwidth must be integer, float, or plug-in methods 'silverman' or 'scott'")
+
+    std = data.std if isinstance(data, PreparedSample) else np.std(data, ddof=1)
+
+    return factor * std
+
+
+def fft_kde(data, xgrid, bandwidth='silverman'):
+    """ Returns the Gaussian kernel density estimate evaluated over an
+    evenly spaced grid using linear binning and FFT convolution. The cost
+    is O(n + m log m), where n is the sample size and m the number of grid
+    points, instead of the O(n x m) of the direct evaluation.
+
+    Parameters
+    ----------
+    data : array_like
+        the dataset
+    xgrid : array_like
+        an evenly spaced grid spanning (at least) the range of the data
+    bandwidth : string {'silverman' or 'scott'} or positive scalar
+        the plug-in method to estimate the bandwidth or a scalar directly
+        defining the bandwidth. Default 'silverman'
+
+    Call functions
+    --------------
+    - kde_bandwidth
+
+    Returns
+    -------
+    the densities at the grid points (numpy array)
+    """
+
+    data, xgrid = np.asarray(data, dtype=float), np.asarray(xgrid, dtype=float)
+    h = kde_bandwidth(data, bandwidth)
+    m = len(xgrid)
+    if m < 2:
+        raise ValueError("the grid must have at least two points")
+    delta = (xgrid[-1] - xgrid[0]) / (m - 1)
+    if data.min() < xgrid[0] - 1e-9 * delta or data.max() > xgrid[-1] + 1e-9 * delta:
+        raise ValueError("the grid must span the range of the data")
+
+    # linear binning: share each value between its two neighbouring grid points
+    position = np.clip((data - xgrid[0]) / delta, 0, m - 1)
+    left = np.minimum(np.floor(position).astype(int), m - 2)
+    frac = position - left
+    counts = (np.bincount(left, weights=1 - frac, minlength=m)
+              + np.bincount(left + 1, weights=frac, minlength=m))
+
+    # convolve the binned counts with the Gaussian kernel (zero padded)
+    lags = np.arange(-(m - 1), m) * delta
+    kernel = np.exp(-0.5 * (lags / h)**2) / (h * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(3 * m - 2)))
+    conv = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+
+    return np.clip(conv[m - 1:2 * m - 1] / len(data), 0, None)
+
+
+def _golden_section_max(func, lower, upper, tol):
+    """ Locate the maximum of a unimodal function within [lower, upper]
+    using golden-section search up to a tolerance tol."""
+
+    invphi = (np.sqrt(5) - 1) / 2
+    c, d = upper - invphi * (upper - lower), lower + invphi * (upper - lower)
+    fc, fd = func(c), func(d)
+
+    while (upper - lower) > tol:
+        if fc > fd:
+            upper, d, fd = d, c, fc
+            c = upper - invphi * (upper - lower)
+            fc = func(c)
+        else:
+            lower, c, fc = c, d, fd
+            d = lower + invphi * (upper - lower)
+            fd = func(d)
+
+    return (lower + upper) / 2
+
+
+def order_statistics(pop, quantiles=(), ranks=()):
+    """ Returns the quantiles (linear interpolation, as in np.quantile)
+    and the order statistics of given ranks using a single selection
+    (np.partition) of the population instead of a full sort, O(n) vs
+    O(n log n).
+
+    Parameters
+    ----------
+    pop : array-like, PreparedSample or QuantileSketch
+        the population or a quantile sketch of the population (in such
+        case the returned values are approximate)
+    quantiles : sequence of floats between 0 and 1
+        the quantiles to estimate
+    ranks : sequence of int
+        the (zero-based) ranks of the order statistics to return
+
+    Returns
+    -------
+    two numpy arrays, the quantiles and the order statistics
+    """
+
+    if isinstance(pop, QuantileSketch):
+        ranks = np.asarray(ranks, dtype=int)
+        return pop.quantile(np.asarray(quantiles, dtype=float)), pop.quantile(ranks / (pop.n - 1))
+
+    # prepared samples already sorted are indexed directly, otherwise a
+    # selection is cheaper than sorting
+    is_sorted = isinstance(pop, PreparedSample) and pop._sorted is not None
+    if is_sorted:
+        pop = pop.sorted
+    elif isinstance(pop, PreparedSample):
+        pop = pop.data
+    else:
+        pop = np.asarray(pop, dtype=float).ravel()
+    n = len(pop)
+
+    positions = np.asarray(quantiles, dtype=float) * (n - 1)
+    below = np.floor(positions).astype(int)
+    above = np.minimum(below + 1, n - 1)
+    ranks = np.asarray(ranks, dtype=int)
+
+    if is_sorted:
+        partitioned = pop
+    else:
+        kth = np.unique(np.concatenate((below, above, ranks.ravel())))
+        partitioned = np.partition(pop, kth)
+
+    frac = positions - below
+    quantile_values = partitioned[below] + frac * (partitioned[above] - partitioned[below])
 
-    return t.ppf(confidence, sample_size)
+    return quantile_values, partitioned[ranks]
 
 
 def gen_xgrid(start, stop, precision):
@@ -33,6 +33,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.stats import norm, gaussian_kde, shapiro, iqr
+from averages import fft_kde, kde_bandwidth, QuantileSketch, PreparedSample, prepare_sample
 
 
 # plotting funtions
@@ -42,6 +43,7 @@ def distribution(
     avg=("amean", "gmean", "median", "mode"),
     bins="auto",
     bandwidth="silverman",
+    kde_method="direct",
     **fig_kw,
 ):
     """ Return a plot with the ditribution of (apparent or actual) grain sizes
@@ -49,7 +51,7 @@ def distribution(
 
     Parameters
     ----------
-    data : array_like
+    data : array_like or PreparedSample
         the size of the grains
 
     plot : string, tuple or list; optional
@@ -81,6 +83,10 @@ def distribution(
         the method to estimate the bandwidth or a scalar directly defining the
         bandwidth. It uses the Silverman plug-in method by default.
 
+    kde_method : string {'direct' or 'fft'}; optional
+        'direct' evaluates the Scipy's gaussian_kde, 'fft' uses the binned
+        FFT-based KDE (much faster for large datasets). Default 'direct'.
+
     **fig_kw :
         additional keyword arguments to control the size (figsize) and
         resolution (dpi) of the plot. Default figsize is (6.4, 4.8).
@@ -89,18 +95,22 @@ def distribution(
     Call functions
     --------------
     - gaussian_kde (from Scipy stats)
+    - fft_kde (from averages)
 
     Returns
     -------
     figure and axes object
     """
 
+    sample = prepare_sample(data)
+    data = sample.data
+
     fig, ax = plt.subplots(**fig_kw)
 
     if 'hist' in plot:
         y_values, bin_edges, __ = ax.hist(data,
                                           bins=bins,
-                                          range=(data.min(), data.max()),
+                                          range=(sample.min, sample.max),
                                           density=True,
                                           color='#80419d',
                                           edgecolor='#C59fd7',
@@ -112,18 +122,8 @@ def distribution(
         print('=======================================')
 
     if 'kde' in plot:
-        # estimate kde first
-        if isinstance(bandwidth, (int, float)):
-            fixed_bw = bandwidth / np.std(data, ddof=1)
-            kde = gaussian_kde(data, bw_method=fixed_bw)
-        elif isinstance(bandwidth, str):
-            kde = gaussian_kde(data, bw_method=bandwidth)
-            bandwidth = round(kde.covariance_factor() * data.std(ddof=1), 2)
-        else:
-            raise ValueError("bandwidth must be integer, float, or plug-in methods 'silverman' or 'scott'")
-
-        x_values = np.linspace(data.min(), data.max(), num=1000)
-        y_values = kde(x_values)
+        x_values = np.linspace(sample.min, sample.max, num=1000)
+        y_values, bandwidth = _estimate_kde(sample, x_values, bandwidth, kde_method)
 
         print('=======================================')
         print('Kernel density estimate (KDE) features:')
@@ -142,7 +142,7 @@ def distribution(
 
     # plot the location of the averages
     if 'amean' in avg:
-        amean = np.mean(data)
+        amean = sample.mean
         ax.vlines(amean, 0, np.max(y_values),
                   linestyle='solid',
                   color='#2F4858',
@@ -150,14 +150,14 @@ def distribution(
                   linewidth=2.5)
 
     if 'gmean' in avg:
-        gmean = np.exp(np.mean(np.log(data)))
+        gmean = np.exp(sample.mean_log)
         ax.vlines(gmean, 0, np.max(y_values),
                   linestyle='solid',
                   color='#fec44f',
                   label='geo. mean')
 
     if 'median' in avg:
-        median = np.median(data)
+        median = np.median(sample.data)
         ax.vlines(median, 0, np.max(y_values),
                   linestyle='dashed',
                   color='#2F4858',
@@ -188,7 +188,7 @@ def area_weighted(diameters, areas, bins='auto', **fig_kw):
 
     Parameters
     ----------
-    diameters : array_like
+    diameters : array_like or PreparedSample
         the size of the grains
 
     areas : array_like
@@ -222,6 +222,8 @@ def area_weighted(diameters, areas, bins='auto', **fig_kw):
     >>> area_weighted(data['diameters'], data['Areas'], bins='doane', dpi=300)
     """
 
+    diameters, areas = np.asarray(diameters), np.asarray(areas)
+
     # estimate weighted mean
     area_total = np.sum(areas)
     weighted_areas = areas / area_total
@@ -280,14 +282,14 @@ def area_weighted(diameters, areas, bins='auto', **fig_kw):
     return fig, ax
 
 
-def normalized(data, avg='amean', bandwidth='silverman', **fig_kw):
+def normalized(data, avg='amean', bandwidth='silverman', kde_method='direct', **fig_kw):
     """Return a log-transformed normalized ditribution of the grain
     population. This is useful to compare grain size distributions
     beween samples with different average values.
 
     Parameters
     ----------
-    data : array-like
+    data : array-like or PreparedSample
         the dataset
 
     avg : str, optional
@@ -297,14 +299,19 @@ def normalized(data, avg='amean', bandwidth='silverman', **fig_kw):
     bandwidth : str or scalar, optional
         the bandwidth of the KDE, by default 'silverman'
 
+    kde_method : str, optional
+        either 'direct' (Scipy's gaussian_kde) or 'fft' (binned FFT-based
+        KDE), by default 'direct'
+
     **fig_kw :
         additional keyword arguments to control the size (figsize) and
         resolution (dpi) of the plot. Default figsize is (6.4, 4.8).
         Default resolution is 100 dpi.
     """
 
-    data = np.log(data)
-    amean = np.mean(data)
+    sample = prepare_sample(data)
+    data = sample.log
+    amean = sample.mean_log
     median = np.median(data)
 
     # normalize the data
@@ -318,17 +325,8 @@ def normalized(data, avg='amean', bandwidth='silverman', **fig_kw):
         raise ValueError("Normalization factor has to be defined as 'amean' or 'median'")
 
     # estimate KDE
-    if isinstance(bandwidth, (int, float)):
-        fixed_bw = bandwidth / np.std(norm_data, ddof=1)
-        kde = gaussian_kde(norm_data, bw_method=fixed_bw)
-    elif isinstance(bandwidth, str):
-        kde = gaussian_kde(norm_data, bw_method=bandwidth)
-        bandwidth = round(kde.covariance_factor() * norm_data.std(ddof=1), 2)
-    else:
-        raise ValueError("bandwidth must be integer, float, or plug-in methods 'silverman' or 'scott'")
-
     x_values = np.linspace(norm_data.min(), norm_data.max(), num=1000)
-    y_values = kde(x_values)
+    y_values, bandwidth = _estimate_kde(norm_data, x_values, bandwidth, kde_method)
 
     # Provide details
     print('=======================================')
@@ -377,8 +375,10 @@ def qq_plot(data, percent=2, **fig_kw):
 
     Parameters
     ----------
-    data : array-like
-        the apparent diameters or any other type of data
+    data : array-like, PreparedSample or QuantileSketch
+        the apparent diameters or any other type of data, or a quantile
+        sketch of them (for streaming/chunked data). The Shapiro-Wilk
+        test is skipped for quantile sketches
 
     percent : scalar between 0 and 100
         the percentil interval to estimate, default is 2 %
@@ -388,14 +388,25 @@ def qq_plot(data, percent=2, **fig_kw):
     shapiro from scipy's stats
     """
 
-    data = np.sort(np.log(data))
-
-    # estimate percentiles in the actual data
     percentil = np.arange(1, 100, percent)
-    actual_data = np.percentile(data, percentil)
+
+    if isinstance(data, QuantileSketch):
+        # the log is monotonic, so the quantiles of the log-transformed
+        # data are the log of the quantiles
+        actual_data = np.log(data.quantile(percentil / 100))
+        values, weights = data.items()
+        values = np.log(values)
+        mean = np.average(values, weights=weights)
+        std = np.sqrt(np.average((values - mean)**2, weights=weights))
+        data = None
+    else:
+        # estimate percentiles in the actual data
+        sample = prepare_sample(data)
+        data = sample.log
+        actual_data = np.percentile(data, percentil)
+        mean, std = sample.mean_log, np.sqrt(sample.var_log)
 
     # estimate percentiles for theoretical data
-    mean, std = np.mean(data), np.std(data)
     theoretical_data = norm.ppf(percentil / 100, loc=mean, scale=std)
 
     min_val, max_val = theoretical_data.min(), theoretical_data.max()
@@ -420,7 +431,15 @@ def qq_plot(data, percent=2, **fig_kw):
 
     fig.tight_layout()
 
-    # Shapiro-Wilk test
+    # Shapiro-Wilk test (not possible without the raw values, a weighted
+    # resample of the sketch items has ties that invalidate the p-value)
+    if data is None:
+        print('=======================================')
+        print('Shapiro-Wilk test skipped: a quantile sketch')
+        print('does not retain the raw values')
+        print('=======================================')
+        return fig, ax
+
     if len(data) > 250:
         W, p_value = shapiro(np.random.choice(data, size=250))
     else:
@@ -439,6 +458,32 @@ def qq_plot(data, percent=2, **fig_kw):
     return fig, ax
 
 
+def _estimate_kde(data, x_values, bandwidth, kde_method):
+    """ Estimate the Gaussian KDE over x_values using either the Scipy's
+    gaussian_kde ('direct') or the binned FFT-based KDE ('fft'). Returns
+    the densities and the bandwidth (rounded if estimated by a plug-in
+    method)."""
+
+    if not isinstance(bandwidth, (int, float, str)):
+        raise ValueError("bandwidth must be integer, float, or plug-in methods 'silverman' or 'scott'")
+
+    if kde_method == 'direct':
+        if isinstance(data, PreparedSample):
+            y_values = data.kde(bandwidth)(x_values)
+        else:
+            bw_method = bandwidth if isinstance(bandwidth, str) else bandwidth / np.std(data, ddof=1)
+            y_values = gaussian_kde(data, bw_method=bw_method)(x_values)
+    elif kde_method == 'fft':
+        y_values = fft_kde(np.asarray(data), x_values, bandwidth)
+    else:
+        raise ValueError("kde_method must be 'direct' or 'fft'")
+
+    if isinstance(bandwidth, str):
+        bandwidth = round(kde_bandwidth(data, bandwidth), 2)
+
+    return y_values, bandwidth
+
+
 if __name__ == '__main__':
     pass
 else:
@@ -23,9 +23,12 @@
 #                                                                              #
 # ============================================================================ #
 
+from functools import lru_cache
+from types import SimpleNamespace
+
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
+from scipy.linalg import solve_triangular
+from scipy.optimize import curve_fit, nnls
 from scipy.stats import lognorm
 
 
@@ -34,7 +37,9 @@ def Saltykov(diameters,
              calc_vol=None,
              text_file=None,
              return_data=False,
-             left_edge=0):
+             left_edge=0,
+             return_result=False,
+             unfold='subtraction'):
     """ Estimate the actual (3D) distribution of grain size from the population
     of apparent diameters measured in a thin section using a Saltykov-type
     algorithm (Saltykov 1967; Sahagian and Proussevitch 1998).
@@ -67,9 +72,20 @@ def Saltykov(diameters,
     left_edge : positive scalar or 'min', optional
         set the left edge of the histogram. Default is zero.
 
+    return_result : bool, optional
+        if True the function will return a SaltykovResult object without
+        printing, plotting or writing anything (takes precedence over
+        return_data, calc_vol and text_file are then ignored; use the
+        volume_fraction method of the result instead).
+
+    unfold : string, optional
+        the unfolding algorithm: 'subtraction' (default, the classic
+        Saltykov method), 'em' (expectation-maximization), 'tikhonov' or
+        'nnls' (regularized least squares, strength selected by GCV)
+
     Call functions
     --------------
-    - unfold_population
+    - unfold_population_matrix (or _em, _regularized)
     - Saltykov_plot
 
     Examples
@@ -78,6 +94,9 @@ def Saltykov(diameters,
     >>> Saltykov(diameters, numbins=16, calc_vol=40)
     >>> Saltykov(diameters, text_file='foo.csv')
     >>> mid_points, frequencies = Saltykov(diameters, return_data=True)
+    >>> result = Saltykov(diameters, return_result=True)
+    >>> result.volume_fraction([20, 40, 60])
+    >>> Saltykov(diameters, numbins=20, unfold='em')
 
     References
     ----------
@@ -86,7 +105,8 @@ def Saltykov(diameters,
 
     Return
     ------
-    Statistical descriptors, a plot, and/or a file with the data (optional)
+    Statistical descriptors, a plot, and/or a file with the data (optional),
+    or a SaltykovResult object if return_result is True
     """
 
     if isinstance(numbins, int) is False:
@@ -113,14 +133,25 @@ def Saltykov(diameters,
     bin_midpoints = (bin_edges[:-1] + bin_edges[1:]) / 2
 
     # Unfold the population of apparent diameters using the Saltykov method
-    freq3D = unfold_population(freq, bin_edges, binsize, bin_midpoints)
+    if unfold == 'subtraction':
+        freq3D = unfold_population_matrix(freq, bin_edges, binsize, bin_midpoints)
+    elif unfold == 'em':
+        freq3D = unfold_population_em(freq, bin_edges, binsize, bin_midpoints)
+    elif unfold in ('tikhonov', 'nnls'):
+        freq3D = unfold_population_regularized(freq, bin_edges, binsize, bin_midpoints, method=unfold)
+    else:
+        raise ValueError("unfold must be 'subtraction', 'em', 'tikhonov' or 'nnls'")
 
     # Calculate the volume-weighted cumulative frequency distribution
     cdf_norm = volume_weighted_cdf(freq3D, bin_midpoints)
 
+    # headless result, nothing is printed, plotted or stored
+    if return_result is True:
+        return SaltykovResult(bin_edges, freq3D, cdf_norm)
+
     # Estimate the volume of a particular grain size fraction (if apply)
     if calc_vol is not None:
-        calc_volume_fraction_hist(calc_vol, bin_midpoints, cdf_norm)
+        calc_volume_fraction_hist(calc_vol, bin_midpoints, cdf_norm, bin_edges[0])
 
     # Create a text file with the midpoints, class frequencies, and
     # cumulative volumes (if apply)
@@ -139,7 +170,271 @@ def Saltykov(diameters,
         raise TypeError("return_data must be set as True or False")
 
 
-def two_step(diameters, class_range=(10, 20)):
+def Saltykov_batch(samples, numbins=10, left_edge=0):
+    """ Apply the Saltykov method to many samples at once. The histograms
+    of all the samples are computed in a single pass over the concatenated
+    diameters, stacked into a 2D array (one sample per row) and unfolded
+    simultaneously. No figures are created.
+
+    Parameters
+    ----------
+    samples : sequence of array_like
+        the apparent diameters of each sample (can have different lengths)
+
+    numbins : positive integer or array_like of integers, optional
+        the number of classes, either shared by all the samples or one per
+        sample. Default is 10.
+
+    left_edge : positive scalar or 'min', optional
+        set the left edge of the histograms. Default is zero.
+
+    Call functions
+    --------------
+    - saltykov_kernel
+    - unfold_rows
+    - volume_weighted_cdf
+
+    Examples
+    --------
+    >>> mid_points, frequencies, cdfs = Saltykov_batch([diameters1, diameters2, diameters3])
+    >>> mid_points, frequencies, cdfs = Saltykov_batch(samples, numbins=[12, 15, 10], left_edge='min')
+
+    Returns
+    -------
+    three 2D arrays (samples x classes) with the midpoints of the classes,
+    the normalized frequencies of the unfolded populations and the
+    volume-weighted cumulative frequencies (in percentage). When the number
+    of classes differs between samples, the rows are padded with NaN.
+    """
+
+    samples = [np.asarray(sample, dtype=float).ravel() for sample in samples]
+    num_samples = len(samples)
+    numbins = np.broadcast_to(np.asarray(numbins), (num_samples,))
+
+    if not np.issubdtype(numbins.dtype, np.integer) or np.any(numbins <= 0):
+        raise ValueError("Numbins must be a positive integer")
+    if isinstance(left_edge, (int, float)) and left_edge < 0:
+        raise ValueError("left_edge must be a positive scalar or 'min'")
+
+    # histogram ranges and bin layouts
+    maximos = np.array([sample.max() for sample in samples])
+    if left_edge == "min":
+        minimos = np.array([sample.min() for sample in samples])
+    else:
+        minimos = np.full(num_samples, float(left_edge))
+    binsizes = (maximos - minimos) / numbins
+    max_bins = numbins.max()
+    classes = np.arange(max_bins + 1)
+    bin_edges = minimos[:, np.newaxis] + classes * binsizes[:, np.newaxis]
+    bin_edges[np.arange(num_samples), numbins] = maximos
+    mid_points = (bin_edges[:, :-1] + bin_edges[:, 1:]) / 2
+
+    # single pass histogram: the class of each value as in np.histogram,
+    # including the right edge in the last class
+    lengths = np.array([len(sample) for sample in samples])
+    sample_ids = np.repeat(np.arange(num_samples), lengths)
+    values = np.concatenate(samples)
+    lower, upper = minimos[sample_ids], maximos[sample_ids]
+    inside = (values >= lower) & (values <= upper)
+    values, sample_ids, lower = values[inside], sample_ids[inside], lower[inside]
+    index = np.floor((values - lower) / binsizes[sample_ids]).astype(int)
+    index = np.minimum(index, numbins[sample_ids] - 1)
+    index -= values < bin_edges[sample_ids, index]  # correct round-off errors
+    index += (values >= bin_edges[sample_ids, index + 1]) & (index != numbins[sample_ids] - 1)
+    counts = np.bincount(sample_ids * max_bins + index, minlength=num_samples * max_bins)
+    counts = counts.reshape(num_samples, max_bins)
+    freqs = counts / (counts.sum(axis=1, keepdims=True) * binsizes[:, np.newaxis])
+
+    # stack the kernels (one per unique bin layout) and unfold all the
+    # samples at once, skipping the classes with zero or negative frequencies
+    layouts = list(zip(numbins.tolist(), (minimos / binsizes).tolist()))
+    unique_layouts = list(dict.fromkeys(layouts))
+    kernels = np.zeros((len(unique_layouts), max_bins, max_bins))
+    for k, (bins, offset) in enumerate(unique_layouts):
+        kernels[k, :bins, :bins] = saltykov_kernel(bins, offset)
+    kernels = kernels[[unique_layouts.index(layout) for layout in layouts]]
+
+    freqs = unfold_rows(freqs, kernels, binsizes[:, np.newaxis])
+    cdfs = volume_weighted_cdf(freqs, mid_points)
+
+    # pad the samples with fewer classes
+    padding = classes[np.newaxis, :-1] >= numbins[:, np.newaxis]
+    for array in (mid_points, freqs, cdfs):
+        array[padding] = np.nan
+
+    return mid_points, freqs, cdfs
+
+
+def Saltykov_bootstrap(diameters, numbins=10, left_edge=0, ci=0.95, n_resamples=1000,
+                       fit=True, n_jobs=1, seed=None, class_range=(10, 20)):
+    """ Estimate the uncertainty of the Saltykov method (and of the
+    two-step lognormal fit) by bootstrapping the apparent diameters. The
+    histograms of all the resamples are drawn at once keeping the bin
+    edges of the original sample (the counts of a resample with
+    replacement follow a multinomial distribution with the observed class
+    proportions), unfolded together through the kernel of the bin layout
+    and, if requested, fitted to a lognormal distribution warm-starting
+    from the fit of the original sample.
+
+    Note that with a fixed number of classes the bands do not include the
+    uncertainty of choosing the number of classes. With numbins='auto' the
+    number of classes of every resample is selected by the two-step method
+    (see two_step) and the bands of the MSD and geometric mean include it;
+    the bands of the frequencies are then those of the number of classes
+    selected for the original sample.
+
+    Parameters
+    ----------
+    diameters : array_like
+        the apparent diameters of the grains
+
+    numbins : positive integer or 'auto', optional
+        the number of classes or 'auto' to select it within class_range
+        as in the two-step method. Default is 10.
+
+    left_edge : positive scalar or 'min', optional
+        set the left edge of the histogram. Default is zero.
+
+    ci : float between 0 and 1, optional
+        the confidence level of the percentile bands, default = 0.95
+
+    n_resamples : positive integer, optional
+        the number of bootstrap resamples, default = 1000
+
+    fit : bool, optional
+        if True (default) fit a lognormal to every resample (two-step
+        method) and estimate the bands of MSD and geometric mean
+
+    n_jobs : integer, optional
+        the number of processes used for the lognormal fits, default 1
+
+    seed : int or None, optional
+        the seed of the random generator
+
+    class_range : tuple or list with two values, optional
+        the range of number of classes tested when numbins='auto'.
+        Default=(10, 20)
+
+    Call functions
+    --------------
+    - saltykov_kernel
+    - unfold_rows
+    - volume_weighted_cdf
+    - fit_log
+    - _two_step_fits (if numbins='auto')
+
+    Examples
+    --------
+    >>> boot = Saltykov_bootstrap(diameters, numbins=12, seed=42)
+    >>> boot.frequencies_band   # lower and upper limits of each class
+    >>> boot.msd, boot.msd_band
+    >>> boot = Saltykov_bootstrap(diameters, numbins=12, fit=False, n_resamples=5000)
+    >>> boot = Saltykov_bootstrap(diameters, numbins='auto', n_jobs=4, seed=42)
+
+    Returns
+    -------
+    a SaltykovBootstrapResult object
+    """
+
+    diameters = np.asarray(diameters, dtype=float).ravel()
+    rng = np.random.default_rng(seed)
+
+    auto = isinstance(numbins, str)
+    if auto:
+        if numbins != 'auto':
+            raise ValueError("numbins must be a positive integer or 'auto'")
+        if left_edge != 0:
+            raise ValueError("numbins='auto' requires left_edge=0 as in the two-step method")
+        class_list, _, _, _, params, errors = _two_step_fits(diameters, class_range)
+        numbins = class_list[np.argmin(errors[:, 0])]
+
+    minimo = diameters.min() if left_edge == "min" else left_edge
+    counts, bin_edges = np.histogram(diameters, bins=numbins, range=(minimo, diameters.max()))
+    binsize = bin_edges[1] - bin_edges[0]
+    mid_points = (bin_edges[:-1] + bin_edges[1:]) / 2
+    n = counts.sum()
+
+    # all the resampled histograms at once (first row, the original sample)
+    resampled = np.vstack([counts, rng.multinomial(n, counts / n, size=n_resamples)])
+
+    kernel = saltykov_kernel(numbins, bin_edges[0] / binsize)
+    freqs = unfold_rows(resampled / (n * binsize), kernel, binsize)
+    cdfs = volume_weighted_cdf(freqs, mid_points)
+
+    alpha = 1 - ci
+    percentiles = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    results = SaltykovBootstrapResult(bin_edges, freqs[0], np.percentile(freqs[1:], percentiles, axis=0),
+                                      cdfs[0], np.percentile(cdfs[1:], percentiles, axis=0), n_resamples)
+
+    if fit is True:
+        if auto:
+            # two-step class selection and fit of every resample, in
+            # blocks of resamples with independent random streams
+            params = params[np.argmin(errors[:, 0])]
+            shares = [min(50, n_resamples - start) for start in range(0, n_resamples, 50)]
+            worker, args = _two_step_rows, ([diameters] * len(shares), [class_range] * len(shares),
+                                            shares, np.random.SeedSequence(seed).spawn(len(shares)))
+        else:
+            guess = (np.exp(np.std(np.log(diameters), ddof=1)), np.median(diameters))
+            params = _fit_rows(mid_points, freqs[:1], guess)[0]
+            chunks = np.array_split(freqs[1:], max(1, n_jobs))
+            worker, args = _fit_rows, ([mid_points] * len(chunks), chunks, [params] * len(chunks))
+
+        if n_jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                boot_params = list(executor.map(worker, *args))
+        else:
+            boot_params = [worker(*arg) for arg in zip(*args)]
+        boot_params = np.vstack(boot_params)
+
+        results.msd, results.gmean = params
+        results.msd_band, results.gmean_band = np.nanpercentile(boot_params[:, :2], percentiles, axis=0).T
+        results.failed_fits = int(np.sum(np.isnan(boot_params[:, 0])))
+        if auto:
+            results.resampled_numbins = boot_params[:, 2]
+
+    return results
+
+
+def _fit_rows(mid_points, freqs, guess):
+    """ Fit a lognormal to each row of frequencies warm-starting from
+    guess. Fits that do not converge are set to NaN."""
+
+    params = np.full((len(freqs), 2), np.nan)
+
+    for index, row in enumerate(freqs):
+        try:
+            params[index] = fit_log(mid_points, row, initial_guess=guess)[0]
+        except (RuntimeError, ValueError):
+            continue
+
+    return params
+
+
+def _two_step_rows(diameters, class_range, n_resamples, seed_seq):
+    """ Select the number of classes and fit a lognormal (two-step
+    method) to n_resamples bootstrap resamples of the diameters. Returns
+    the MSD, the geometric mean and the number of classes of each
+    resample as rows (NaN if the fits do not converge)."""
+
+    rng = np.random.default_rng(seed_seq)
+    rows = np.full((n_resamples, 3), np.nan)
+
+    for index in range(n_resamples):
+        resample = diameters[rng.integers(len(diameters), size=len(diameters))]
+        try:
+            class_list, _, _, _, params, errors = _two_step_fits(resample, class_range)
+        except (RuntimeError, ValueError):
+            continue
+        best = np.argmin(errors[:, 0])
+        rows[index] = params[best, 0], params[best, 1], class_list[best]
+
+    return rows
+
+
+def two_step(diameters, class_range=(10, 20), return_result=False):
     """ Calculate the optimal lognormal distribution of an unfolded grain size
     population from apparent diameters measured in a thin section by applying
     the two-step method (Lopez-Sanchez and Llana-Funez, 2016).  The method only
@@ -152,156 +447,1032 @@ def two_step(diameters, class_range=(10, 20)):
     diameters : array_like
         the apparent diameters of the grains
 
-    class_range : tupe or list with two values, optional
-        the range of classes considered. The algorithm will estimate the optimal
-        number of classes within the defined range. Default=(10, 20)
+    class_range : tupe or list with two values, optional
+        the range of classes considered. The algorithm will estimate the optimal
+        number of classes within the defined range. Default=(10, 20)
+
+    return_result : bool, optional
+        if True the function will return a TwoStepResult object without
+        printing or plotting anything. Default False
+
+    Call functions
+    --------------
+    - Saltykov_batch (via _two_step_fits),
+    - fit_log,
+    - log_function
+    - gen_xgrid
+    - twostep_plot
+
+    Examples
+    --------
+    >>> stereology.two_step(diameters)
+    >>> stereology.two_step(diameters, class_range=(12, 18))
+    >>> result = stereology.two_step(diameters, return_result=True)
+
+    References
+    ----------
+    Saltykov SA (1967) http://doi.org/10.1007/978-3-642-88260-9_31
+    Sahagian and Proussevitch (1998) https://doi.org/10.1016/S0377-0273(98)00043-2
+    Lopez-Sanchez and Llana-Funez (2016) https://doi.org/10.1016/j.jsg.2016.10.008
+
+    Returns
+    -------
+    A plot with an estimate of the actual (3D) grains size distribution and
+    several statistical parameters, or a TwoStepResult object if return_result
+    is True
+    """
+
+    # estimate the optimal number of classes within the range defined
+    # and reuse the fit of the winning candidate
+    class_list, mid_points, frequencies, cdfs, params, errors = _two_step_fits(diameters, class_range)
+    best = np.argmin(errors[:, 0])
+    optimal_num_classes = class_list[best]
+    mid_points = mid_points[best, :optimal_num_classes]
+    binsize = mid_points[1] - mid_points[0]
+    bin_edges = np.append(mid_points - binsize / 2, mid_points[-1] + binsize / 2)
+    result = TwoStepResult(bin_edges,
+                           frequencies[best, :optimal_num_classes],
+                           cdfs[best, :optimal_num_classes],
+                           params[best], errors[best], np.max(diameters))
+
+    if return_result is True:
+        return result
+
+    print("=======================================")
+    print("PREDICTED OPTIMAL VALUES")
+    print(f"Number of classes: {optimal_num_classes}")
+    print(f"MSD (lognormal shape) = {result.msd:0.2f} ± {3 * result.msd_err:0.2f}")
+    print(
+        f"Geometric mean (scale) = {result.gmean:0.2f} ± {3 * result.gmean_err:0.2f}"
+    )
+    print("=======================================")
+    # print(' Covariance matrix:\n', covm)
+
+    return result.plot()
+
+
+def two_step_search(diameters, class_range=(10, 20)):
+    """ Returns the lognormal fits of all the candidate number of classes
+    tested by the two-step method (see two_step), so it is possible to
+    see why a particular number of classes was chosen. The optimal one
+    is that which minimizes the error of the MSD.
+
+    Parameters
+    ----------
+    diameters : array_like
+        the apparent diameters of the grains
+
+    class_range : tupe or list with two values, optional
+        the range of classes considered. Default=(10, 20)
+
+    Examples
+    --------
+    >>> stereology.two_step_search(diameters)
+    >>> stereology.two_step_search(diameters, class_range=(12, 18))
+
+    Returns
+    -------
+    a pandas DataFrame with one row per number of classes and the best
+    fitting MSD and geometric mean, their errors (one sigma) and whether
+    the candidate is the optimal one
+    """
+
+    from pandas import DataFrame
+
+    class_list, _, _, _, params, errors = _two_step_fits(diameters, class_range)
+
+    df = DataFrame({'numbins': class_list,
+                    'MSD': params[:, 0],
+                    'MSD_err': errors[:, 0],
+                    'gmean': params[:, 1],
+                    'gmean_err': errors[:, 1],
+                    'optimal': np.arange(len(class_list)) == np.argmin(errors[:, 0])})
+
+    return df.set_index('numbins')
+
+
+def _two_step_fits(diameters, class_range):
+    """ Unfold the population for all the number of classes within the
+    range at once (Saltykov_batch) and fit a lognormal distribution to
+    each of them. Each fit is warm-started from the solution of the
+    previous number of classes, the first one from the shape and scale
+    of the apparent distribution."""
+
+    diameters = np.asarray(diameters, dtype=float)
+    class_list = np.arange(class_range[0], class_range[1] + 1)
+    mid_points, frequencies, cdfs = Saltykov_batch([diameters] * len(class_list), numbins=class_list)
+
+    params = np.empty((len(class_list), 2))
+    errors = np.empty((len(class_list), 2))
+    guess = (np.exp(np.std(np.log(diameters), ddof=1)), np.median(diameters))
+
+    for index, item in enumerate(class_list):
+        params[index], errors[index] = fit_log(mid_points[index, :item],
+                                               frequencies[index, :item],
+                                               initial_guess=guess)
+        guess = params[index]
+
+    return class_list.tolist(), mid_points, frequencies, cdfs, params, errors
+
+
+def lognormal_mle(diameters, ci=0.95, nodes=64, table=None):
+    """ Estimate the lognormal distribution of the actual (3D) grain sizes
+    by maximizing the likelihood of the apparent diameters directly, with
+    no histogram involved. For spheres whose diameters D follow a
+    lognormal distribution f(D) with parameters mu and sigma, the
+    probability density of the apparent (sectional) diameters d is
+    (Wicksell, 1925):
+
+    g(d) = d / E[D] * integral from d to inf of f(D) / sqrt(D**2 - d**2) dD
+
+    The log-likelihood and its gradient are interpolated from a precomputed
+    Wicksell table (see build_wicksell_table) and maximized with L-BFGS-B.
+    Where the table does not apply (shapes outside its range or diameters
+    beyond its upper limit) the integral is evaluated for all the
+    diameters at once by Gauss-Legendre quadrature after a change of
+    variables that removes the singularity. Confidence intervals are
+    estimated from the profile likelihood.
+
+    Parameters
+    ----------
+    diameters : array_like
+        the apparent diameters of the grains
+
+    ci : float between 0 and 1 or None, optional
+        the confidence level of the profile-likelihood intervals,
+        default = 0.95. If None, the intervals are not estimated (faster)
+
+    nodes : positive integer, optional
+        the number of quadrature nodes, default 64
+
+    table : WicksellTable, None or False, optional
+        the lookup table used to evaluate the likelihood. If None, the
+        default table is built once (in memory) and reused. If False, the
+        likelihood is always integrated numerically
+
+    Call functions
+    --------------
+    - _wicksell_table_nll
+    - _wicksell_lognormal_nll
+    - minimize, brentq (from Scipy)
+
+    Examples
+    --------
+    >>> fit = stereology.lognormal_mle(diameters)
+    >>> fit.msd, fit.msd_ci
+    >>> fit.gmean, fit.gmean_ci
+
+    References
+    ----------
+    Wicksell (1925) doi:10.2307/2332027
+    Lopez-Sanchez and Llana-Funez (2016) https://doi.org/10.1016/j.jsg.2016.10.008
+
+    Returns
+    -------
+    a SimpleNamespace with the MSD (lognormal shape) and the geometric mean
+    (scale) of the actual grain size population and their confidence
+    intervals, the mean (mu) and SD (sigma) of the log-transformed grain
+    sizes, the maximum log-likelihood and the sample size. A confidence
+    limit is NaN if the profile likelihood does not reach the threshold
+    within a reasonable distance (e.g. unbounded intervals of tiny samples)
+    """
+
+    from scipy.optimize import brentq, minimize
+    from scipy.stats import chi2
+
+    diameters = np.asarray(diameters, dtype=float).ravel()
+    if np.any(diameters <= 0):
+        raise ValueError("diameters must be positive")
+    log_d = np.log(diameters)
+    n = len(log_d)
+    if table is None:
+        table = _default_wicksell_table()
+
+    def nll(params):
+        if table is not False:
+            result = _wicksell_table_nll(params[0], params[1], log_d, table)
+            if result is not None:
+                return result
+        return _wicksell_lognormal_nll(params[0], params[1], log_d, nodes)
+
+    # starting guess from the first two moments of the apparent diameters:
+    # E[d] = pi/4 exp(mu + 3/2 s^2) and E[d^2] = 2/3 exp(2 mu + 4 s^2)
+    m1, m2 = np.mean(diameters), np.mean(diameters**2)
+    var_log = max(np.log(m2 / m1**2 * 3 * np.pi**2 / 32), 0.01)
+    guess = np.array([np.log(4 * m1 / np.pi) - 1.5 * var_log, 0.5 * np.log(var_log)])
+
+    best = minimize(nll, guess, jac=True, method='L-BFGS-B')
+    mu, log_sigma = best.x
+    max_loglik = -best.fun
+
+    if ci is None:
+        return SimpleNamespace(msd=np.exp(np.exp(log_sigma)), msd_ci=None,
+                               gmean=np.exp(mu), gmean_ci=None,
+                               mu=mu, sigma=np.exp(log_sigma),
+                               loglik=max_loglik, n=n)
+
+    # profile-likelihood intervals: the values where the deviance reaches
+    # the chi-square quantile with one degree of freedom
+    threshold = chi2.ppf(ci, df=1) / 2
+
+    # initial brackets from the quadratic (Wald) approximation of the
+    # log-likelihood, using a finite-difference Hessian of the (quadrature)
+    # gradient, which is smoother than the interpolated one
+    eps = 1e-4
+    jac = _wicksell_lognormal_nll(*best.x, log_d, nodes)[1]
+    hessian = np.array([(_wicksell_lognormal_nll(*(best.x + eps * e), log_d, nodes)[1] - jac) / eps
+                        for e in np.eye(2)])
+    std_errors = np.sqrt(np.abs(np.diag(np.linalg.inv((hessian + hessian.T) / 2))))
+
+    def profile(value, index):
+        # start from the conditional maximum of the quadratic approximation
+        other = 1 - index
+        slope = -hessian[other, index] / hessian[other, other]
+        start = best.x[other:other + 1] + slope * (value - best.x[index])
+
+        def partial(x):
+            params = np.empty(2)
+            params[index], params[other] = value, x[0]
+            f, grad = nll(params)
+            return f, grad[other:other + 1]
+
+        return -minimize(partial, start, jac=True, method='L-BFGS-B').fun
+
+    def limit(index, direction):
+        def deviance(value):
+            return max_loglik - profile(value, index) - threshold
+
+        # expand the bracket (at most 1000 standard errors away), the
+        # likelihood may be degenerate far from the estimate
+        step = 1.5 * np.sqrt(2 * threshold) * std_errors[index]
+        for _ in range(10):
+            far = best.x[index] + direction * step
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                reached = deviance(far) >= 0
+            if reached:
+                return brentq(deviance, best.x[index], far, xtol=1e-5)
+            step *= 2
+
+        return np.nan
+
+    mu_ci = limit(0, -1), limit(0, 1)
+    log_sigma_ci = limit(1, -1), limit(1, 1)
+    sigma, sigma_ci = np.exp(log_sigma), np.exp(log_sigma_ci)
+
+    return SimpleNamespace(msd=np.exp(sigma),
+                           msd_ci=(np.exp(sigma_ci[0]), np.exp(sigma_ci[1])),
+                           gmean=np.exp(mu),
+                           gmean_ci=(np.exp(mu_ci[0]), np.exp(mu_ci[1])),
+                           mu=mu,
+                           sigma=sigma,
+                           loglik=max_loglik,
+                           n=n)
+
+
+def _wicksell_table_nll(mu, log_sigma, log_d, table):
+    """ Returns the negative log-likelihood of the apparent diameters
+    (log-transformed) for a lognormal population of spheres and its
+    gradient with respect to mu and log(sigma) interpolated from a
+    Wicksell table (see build_wicksell_table), or None if sigma or any
+    diameter is beyond the range of the table."""
+
+    sigma = np.exp(log_sigma)
+    t = (log_d - mu) / sigma
+    if not table.sigmas[0] <= sigma <= table.sigmas[-1] or t.max() > table.t[-1]:
+        return None
+
+    log_integral, d_t, d_sigma = table._log_integral_derivatives(t, sigma)
+    loglik = -mu - sigma**2 / 2 + log_integral
+
+    # derivatives of the log-density, with t = (ln d - mu) / sigma
+    d_mu = -1 - d_t / sigma
+    d_log_sigma = -sigma**2 + sigma * d_sigma - t * d_t
+
+    return -np.sum(loglik), -np.array([np.sum(d_mu), np.sum(d_log_sigma)])
+
+
+def _wicksell_lognormal_nll(mu, log_sigma, log_d, nodes=64):
+    """ Returns the negative log-likelihood of the apparent diameters
+    (log-transformed) for a lognormal population of spheres and its
+    gradient with respect to mu and log(sigma).
+
+    Writing D = d exp(w**2) the density of the apparent diameters becomes
+
+    g(d) = exp(-mu - sigma**2 / 2) * integral from 0 to inf of
+           h(w) phi((ln d + w**2 - mu) / sigma) / sigma dw
+
+    where phi is the standard normal density and
+    h(w) = 2w / sqrt(exp(2 w**2) - 1), a smooth function that tends to
+    sqrt(2) at w = 0. The integrand vanishes for w**2 well beyond
+    mu - ln d (or beyond a few sigma**2 / (ln d - mu) for the largest
+    diameters), so each diameter is integrated up to
+    w**2 = max(-c, 0) + sqrt(max(c, 0)**2 + 100 sigma**2) - max(c, 0),
+    with c = ln d - mu.
+    """
+
+    sigma = np.exp(log_sigma)
+    terms, z = _wicksell_terms(log_d - mu, sigma, nodes)
+
+    integral = terms.sum(axis=1)
+    loglik = -mu - sigma**2 / 2 + np.log(integral)
+
+    # analytic derivatives of the log-density
+    d_mu = -1 + (terms * z).sum(axis=1) / (sigma * integral)
+    d_log_sigma = -sigma**2 + (terms * (z**2 - 1)).sum(axis=1) / integral
+
+    return -np.sum(loglik), -np.array([np.sum(d_mu), np.sum(d_log_sigma)])
+
+
+def _wicksell_terms(c, sigma, nodes=64):
+    """ Returns the quadrature terms (diameters x nodes) of the Wicksell
+    integral of a lognormal population (see _wicksell_lognormal_nll),
+    whose sum over the nodes is the integral, and the standardized log
+    sizes z at the nodes. c is ln d - mu."""
+
+    x, weights = _gauss_legendre(nodes)
+
+    # quadrature nodes for every diameter (diameters x nodes)
+    c_plus = np.maximum(c, 0.0)
+    upper = np.sqrt(np.maximum(-c, 0.0) + np.sqrt(c_plus**2 + 100 * sigma**2) - c_plus)
+    w = upper[:, np.newaxis] * x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        h = np.where(w > 0, 2 * w / np.sqrt(np.expm1(2 * w**2)), np.sqrt(2))
+    z = (c[:, np.newaxis] + w**2) / sigma
+    terms = (upper[:, np.newaxis] * weights * h) * np.exp(-0.5 * z**2) / (sigma * np.sqrt(2 * np.pi))
+
+    return terms, z
+
+
+@lru_cache(maxsize=16)
+def _gauss_legendre(nodes):
+    """ Returns the (cached) Gauss-Legendre nodes and weights on [0, 1]"""
+
+    x, weights = np.polynomial.legendre.leggauss(nodes)
+    x, weights = (x + 1) / 2, weights / 2
+    x.flags.writeable = False
+    weights.flags.writeable = False
+
+    return x, weights
+
+
+def unfold_population(freq, bin_edges, binsize, mid_points, normalize=True):
+    """ Applies the Saltykov algorithm to unfold the population of apparent
+    (2D) diameters into the actual (3D) population of grain sizes. Following the
+    reasoning of Higgins (2000), R (or D) is placed at the center of the classes
+    (i.e. the midpoints).
+
+    Reference
+    ----------
+    Higgins (2000) http://doi.org/10.2138/am-2000-8-901
+    Saltykov SA (1967) http://doi.org/10.1007/978-3-642-88260-9_31
+    Sahagian and Proussevitch (1998) https://doi.org/10.1016/S0377-0273(98)00043-2
+
+    Parameters
+    ----------
+    freq : array_like
+        frequency values of the different classes
+
+    bin_edges : array_like
+        the edges of the classes
+
+    mid_points : array_like
+        the midpoints of the classes
+
+    normalize : boolean, optional
+        when True negative frequency values are set to zero and the
+        distribution normalized. True by default.
+
+    Call function
+    -------------
+    - wicksell_eq
+
+    Returns
+    -------
+    The normalized frequencies of the unfolded population such that the integral
+    over the range is one. If normalize is False the raw frequencies of the
+    unfolded population.
+    """
+
+    d_values = np.copy(bin_edges)
+    midpoints = np.copy(mid_points)
+    i = len(midpoints) - 1
+
+    while i > 0:
+        j = i
+        D = d_values[-1]
+        Pi = wicksell_solution(D, d_values[i], d_values[i + 1])
+
+        if freq[i] > 0:
+            while j > 0:
+                D = midpoints[-1]
+                Pj = wicksell_solution(D, d_values[j - 1], d_values[j])
+                P_norm = (Pj * freq[i]) / Pi
+                np.put(freq, j - 1, freq[j - 1] - P_norm)  # replace specified elements of an array
+                j -= 1
+
+            i -= 1
+            d_values = np.delete(d_values, -1)
+            midpoints = np.delete(midpoints, -1)
+
+        else:  # if the value of the current class is zero or negative move to the next class
+            i -= 1
+            d_values = np.delete(d_values, -1)
+            midpoints = np.delete(midpoints, -1)
+
+    if normalize is True:
+        freq = np.clip(freq, a_min=0.0, a_max=None)  # replacing negative values with zero
+        freq_norm = freq / np.sum(freq)              # normalize to one
+        freq_norm = freq_norm / binsize              # normalize such that the integral over the range is one
+        return freq_norm
+
+    else:
+        return freq
+
+
+def unfold_population_matrix(freq, bin_edges, binsize, mid_points, normalize=True):
+    """ Applies the Saltykov algorithm to unfold the population of apparent
+    (2D) diameters into the actual (3D) population of grain sizes. Same
+    results as unfold_population but instead of subtracting the classes
+    one by one it takes the full Wicksell probability matrix of the bin
+    layout (cached, see saltykov_kernel) and solves the resulting upper
+    triangular system of equations:
+
+    (I + U) x = freq
+
+    where x are the unfolded frequencies. To preserve the semantics of the
+    sequential algorithm, the classes whose unfolded frequency is zero or
+    negative do not subtract anything from the smaller classes. Since the
+    classes only depend on the larger ones, the highest non-positive class
+    is found, its column removed from U and the system solved again until
+    no new non-positive class appears.
+
+    Reference
+    ----------
+    Higgins (2000) http://doi.org/10.2138/am-2000-8-901
+    Saltykov SA (1967) http://doi.org/10.1007/978-3-642-88260-9_31
+    Sahagian and Proussevitch (1998) https://doi.org/10.1016/S0377-0273(98)00043-2
+
+    Parameters
+    ----------
+    freq : array_like
+        frequency values of the different classes
+
+    bin_edges : array_like
+        the (equally spaced) edges of the classes
+
+    binsize : positive scalar
+        the width of the classes
+
+    mid_points : array_like
+        the midpoints of the classes
+
+    normalize : boolean, optional
+        when True negative frequency values are set to zero and the
+        distribution normalized. True by default.
+
+    Call function
+    -------------
+    - saltykov_kernel
+    - unfold_with_kernel
+
+    Returns
+    -------
+    The normalized frequencies of the unfolded population such that the integral
+    over the range is one. If normalize is False the raw frequencies of the
+    unfolded population.
+    """
+
+    freq = np.asarray(freq, dtype=float)
+    kernel = saltykov_kernel(len(freq), bin_edges[0] / binsize)
+    unfolded = unfold_with_kernel(freq, kernel)
+
+    if normalize is True:
+        unfolded = np.clip(unfolded, a_min=0.0, a_max=None)  # replacing negative values with zero
+        unfolded = unfolded / np.sum(unfolded)                # normalize to one
+        return unfolded / binsize                            # normalize such that the integral over the range is one
+
+    else:
+        return unfolded
+
+
+def unfold_with_kernel(freq, kernel):
+    """ Solves (I + U) x = freq for the unfolded frequencies x given the
+    Saltykov kernel I + U (see saltykov_kernel) skipping the contribution
+    of the classes with zero or negative unfolded frequencies.
+
+    Parameters
+    ----------
+    freq : array_like
+        frequency values of the different classes
+
+    kernel : array_like
+        the upper triangular kernel matrix
+    """
+
+    unfolded = solve_triangular(kernel, freq, unit_diagonal=True)
+    skipped = np.zeros(len(freq), dtype=bool)
+
+    while True:
+        new = (unfolded[1:] <= 0) & ~skipped[1:]  # the first class never subtracts
+        if not np.any(new):
+            return unfolded
+        if not np.any(skipped):
+            kernel = np.array(kernel)  # do not modify the cached kernel
+        highest = np.flatnonzero(new)[-1] + 1
+        skipped[highest] = True
+        kernel[:highest, highest] = 0.0
+        unfolded = solve_triangular(kernel, freq, unit_diagonal=True)
+
+
+def saltykov_kernel(numbins, offset=0.0):
+    """ Returns the (read-only) Saltykov kernel matrix I + U for a histogram
+    of numbins equal-width classes. Since the Wicksell probabilities are
+    scale-free, the kernel only depends on the number of classes and the
+    position of the left edge in bin widths (offset = left_edge / binsize),
+    which is zero for histograms starting at zero. The kernels of the
+    histograms starting at zero are cached so they are computed only once
+    per number of classes and shared across samples. Other offsets (e.g.
+    left_edge='min') are almost never repeated, so they are computed on
+    demand without filling the cache.
+
+    Parameters
+    ----------
+    numbins : positive integer
+        the number of classes
+
+    offset : positive scalar, optional
+        the left edge of the histogram divided by the bin size, default 0
+
+    Call function
+    -------------
+    - wicksell_matrix
+    """
+
+    if offset == 0:
+        return _cached_saltykov_kernel(int(numbins))
+
+    return _saltykov_kernel(numbins, offset)
+
+
+@lru_cache(maxsize=128)
+def _cached_saltykov_kernel(numbins):
+    return _saltykov_kernel(numbins, 0.0)
+
+
+def _saltykov_kernel(numbins, offset):
+    bin_edges = offset + np.arange(numbins + 1, dtype=float)
+    kernel = np.eye(numbins) + wicksell_matrix(bin_edges, bin_edges[:-1] + 0.5)
+    kernel.flags.writeable = False
+
+    return kernel
+
+
+def wicksell_matrix(bin_edges, mid_points):
+    """ Returns the strictly upper triangular matrix U of the Saltykov
+    algorithm, where U[j, i] is the fraction of sections of the spheres
+    of class i (placed at the midpoint) that fall in the smaller class j,
+    relative to the sections falling in the class i itself (for a sphere
+    at the upper edge of the class, as in unfold_population).
+
+    Parameters
+    ----------
+    bin_edges : array_like
+        the edges of the classes
+
+    mid_points : array_like
+        the midpoints of the classes
+
+    Call function
+    -------------
+    - wicksell_solution
+    """
+
+    bin_edges = np.asarray(bin_edges, dtype=float)
+    mid_points = np.asarray(mid_points, dtype=float)
+    upper = np.triu(np.ones((len(mid_points), len(mid_points)), dtype=bool), k=1)
+
+    # probabilities of the classes (rows) for spheres of all classes (columns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        P_classes = wicksell_solution(mid_points[np.newaxis, :],
+                                      bin_edges[:-1, np.newaxis],
+                                      bin_edges[1:, np.newaxis])
+        P_self = wicksell_solution(bin_edges[1:], bin_edges[:-1], bin_edges[1:])
+
+        return np.where(upper, P_classes / P_self, 0.0)
+
+
+def unfold_rows(freqs, kernels, binsizes):
+    """ Unfold many histograms (rows) at once sweeping the classes from
+    the largest to the smallest, i.e. the Saltykov algorithm vectorized
+    over samples. As in unfold_population, the classes with zero or
+    negative frequencies do not subtract anything. Negative values are
+    then set to zero and the distributions normalized.
+
+    Parameters
+    ----------
+    freqs : 2D array
+        the frequencies of the apparent diameters, one sample per row
+
+    kernels : 2D or 3D array
+        a shared kernel or one kernel per sample (see saltykov_kernel)
+
+    binsizes : scalar or array_like
+        the width of the classes, shared or one per row (column vector)
+    """
+
+    freqs = np.array(freqs, dtype=float)
+
+    for i in range(freqs.shape[1] - 1, 0, -1):
+        current = np.where(freqs[:, i] > 0, freqs[:, i], 0.0)
+        freqs[:, :i] -= current[:, np.newaxis] * kernels[..., :i, i]
+
+    freqs = np.clip(freqs, a_min=0.0, a_max=None)
+
+    return freqs / (freqs.sum(axis=1, keepdims=True) * binsizes)
+
+
+def unfold_population_em(freq, bin_edges, binsize, mid_points, tol=1e-6, max_iter=1000):
+    """ Unfolds the population of apparent diameters into the actual
+    population of grain sizes using an expectation-maximization
+    (Richardson-Lucy) algorithm instead of the sequential subtraction of
+    the Saltykov method. The unfolded frequencies are never negative, so
+    no clipping is required. Same kernel and inputs as unfold_population.
+
+    Reference
+    ----------
+    Richardson (1972) https://doi.org/10.1364/JOSA.62.000055
+    Lucy (1974) https://doi.org/10.1086/111605
+
+    Parameters
+    ----------
+    freq : array_like
+        frequency values of the different classes
+
+    bin_edges : array_like
+        the (equally spaced) edges of the classes
+
+    binsize : positive scalar
+        the width of the classes
+
+    mid_points : array_like
+        the midpoints of the classes
+
+    tol : positive scalar, optional
+        the convergence tolerance, default 1e-6
+
+    max_iter : positive integer, optional
+        the maximum number of iterations, default 1000
+
+    Call function
+    -------------
+    - saltykov_kernel
+    - unfold_em
+
+    Returns
+    -------
+    The normalized frequencies of the unfolded population such that the integral
+    over the range is one.
+    """
+
+    kernel = saltykov_kernel(len(freq), bin_edges[0] / binsize)
+
+    return unfold_em(np.atleast_2d(freq), kernel, binsize, tol, max_iter)[0]
+
+
+def unfold_em(freqs, kernels, binsizes, tol=1e-6, max_iter=1000):
+    """ Unfold many histograms (rows) at once using the expectation-
+    maximization (Richardson-Lucy) algorithm. The Saltykov kernel
+    A = I + U is the forward model of the apparent frequencies (f = A x)
+    and the unfolded frequencies are updated as:
+
+    x <- x * A.T (f / A x) / A.T 1
+
+    starting from a flat distribution, which keeps them non-negative. The
+    iterations stop when the relative change of every sample (the sum of
+    the absolute changes divided by the sum of the frequencies) is below
+    tol or after max_iter iterations. Samples without any counts (all-zero
+    rows) are returned as zeros.
+
+    Parameters
+    ----------
+    freqs : 2D array
+        the frequencies of the apparent diameters, one sample per row
+
+    kernels : 2D or 3D array
+        a shared kernel or one kernel per sample (see saltykov_kernel)
+
+    binsizes : scalar or array_like
+        the width of the classes, shared or one per row (column vector)
+
+    tol : positive scalar, optional
+        the convergence tolerance, default 1e-6
+
+    max_iter : positive integer, optional
+        the maximum number of iterations, default 1000
+
+    Returns
+    -------
+    The normalized frequencies of the unfolded populations such that the
+    integral over the range is one
+    """
+
+    freqs = np.clip(np.asarray(freqs, dtype=float), a_min=0.0, a_max=None)
+
+    # forward (A x) and adjoint (A.T y) products for all the rows at once
+    if kernels.ndim == 2:
+        def forward(x):
+            return x @ kernels.T
+
+        def adjoint(y):
+            return y @ kernels
+    else:
+        def forward(x):
+            return np.einsum('sij,sj->si', kernels, x)
+
+        def adjoint(y):
+            return np.einsum('sij,si->sj', kernels, y)
+
+    # flat starting guess, all-zero rows (and padded classes) stay at zero
+    sensitivity = adjoint(np.ones_like(freqs))
+    unfolded = np.where(freqs.sum(axis=1, keepdims=True) > 0, freqs.mean(axis=1, keepdims=True), 0.0)
+    unfolded = np.where(sensitivity > 0, unfolded, 0.0)
+
+    for _ in range(max_iter):
+        predicted = forward(unfolded)
+        ratio = np.divide(freqs, predicted, out=np.zeros_like(freqs), where=predicted > 0)
+        updated = np.divide(unfolded * adjoint(ratio), sensitivity, out=np.zeros_like(freqs), where=sensitivity > 0)
+        total = updated.sum(axis=1)
+        change = np.divide(np.abs(updated - unfolded).sum(axis=1), total, out=np.zeros_like(total), where=total > 0)
+        unfolded = updated
+        if np.all(change < tol):
+            break
+
+    total = unfolded.sum(axis=1, keepdims=True)
+
+    return np.divide(unfolded, total * binsizes, out=np.zeros_like(unfolded), where=total > 0)
+
+
+def unfold_population_regularized(freq, bin_edges, binsize, mid_points, method='tikhonov', lam='gcv'):
+    """ Unfolds the population of apparent diameters into the actual
+    population of grain sizes solving the Saltykov system of equations
+    (I + U) x = freq in the (regularized) least-squares sense instead of
+    by sequential subtraction and clipping. Same inputs as
+    unfold_population.
+
+    Parameters
+    ----------
+    freq : array_like
+        frequency values of the different classes
+
+    bin_edges : array_like
+        the (equally spaced) edges of the classes
+
+    binsize : positive scalar
+        the width of the classes
+
+    mid_points : array_like
+        the midpoints of the classes
+
+    method : string, optional
+        'tikhonov' (default) for the Tikhonov-regularized solution or
+        'nnls' for the non-negative (regularized) least-squares solution
+
+    lam : positive scalar, 'gcv' or 'lcurve', optional
+        the regularization strength or the criterion used to select it
+        (generalized cross-validation or the corner of the L-curve). For
+        the 'nnls' method the strength is selected on the Tikhonov
+        solutions. Default 'gcv'
+
+    Call function
+    -------------
+    - unfold_tikhonov
+    - unfold_nnls
+
+    Returns
+    -------
+    The normalized frequencies of the unfolded population such that the integral
+    over the range is one.
+    """
+
+    freqs, offset = np.atleast_2d(freq), bin_edges[0] / binsize
+
+    if method == 'tikhonov':
+        return unfold_tikhonov(freqs, offset, binsize, lam)[0][0]
+    elif method == 'nnls':
+        if isinstance(lam, str):
+            lam = unfold_tikhonov(freqs, offset, binsize, lam)[1]
+        return unfold_nnls(freqs, saltykov_kernel(freqs.shape[1], offset), binsize, lam)[0]
+    else:
+        raise ValueError("method must be 'tikhonov' or 'nnls'")
+
+
+def unfold_tikhonov(freqs, offset, binsizes, lam='gcv', lambdas=None):
+    """ Unfold many histograms (rows) with the same bin layout at once
+    using Tikhonov regularization:
+
+    x = argmin ||A x - f||^2 + lam^2 ||x||^2
+
+    where A is the Saltykov kernel. The solutions are computed from the
+    singular value decomposition of A (see kernel_svd), so each sample only costs
+    a few matrix products. Negative frequencies, if any, are set to zero
+    before normalizing.
+
+    Parameters
+    ----------
+    freqs : 2D array
+        the frequencies of the apparent diameters, one sample per row
+
+    offset : positive scalar
+        the left edge of the histograms divided by the bin size
+
+    binsizes : scalar or array_like
+        the width of the classes, shared or one per row (column vector)
+
+    lam : positive scalar, 'gcv' or 'lcurve', optional
+        the regularization strength or the criterion used to select it
+        for each sample. Default 'gcv'
+
+    lambdas : array_like or None, optional
+        the candidate regularization strengths (see regularization_curves)
+
+    Call functions
+    --------------
+    - kernel_svd
+    - regularization_curves
+
+    Returns
+    -------
+    the normalized frequencies of the unfolded populations such that the
+    integral over the range is one, and the regularization strength of
+    each sample
+    """
+
+    freqs = np.asarray(freqs, dtype=float)
+    U, s, Vt = kernel_svd(freqs.shape[1], offset)
+    beta = freqs @ U
+
+    if isinstance(lam, str):
+        lambdas, residual, solution, gcv = regularization_curves(freqs, offset, lambdas)
+        if lam == 'gcv':
+            best = np.argmin(gcv, axis=1)
+        elif lam == 'lcurve':
+            best = _lcurve_corner(residual, solution, fallback=np.argmin(gcv, axis=1))
+        else:
+            raise ValueError("lam must be a positive scalar, 'gcv' or 'lcurve'")
+        lam = lambdas[best]
+    else:
+        lam = np.full(len(freqs), float(lam))
+
+    # filtered solutions x = V diag(s / (s^2 + lam^2)) U.T f
+    unfolded = (beta * s / (s**2 + lam[:, np.newaxis]**2)) @ Vt
+    unfolded = np.clip(unfolded, a_min=0.0, a_max=None)
+    total = unfolded.sum(axis=1, keepdims=True)
+
+    return np.divide(unfolded, total * binsizes, out=np.zeros_like(unfolded), where=total > 0), lam
+
+
+def unfold_nnls(freqs, kernel, binsizes, lam=0.0):
+    """ Unfold many histograms (rows) solving the non-negative least-squares
+    problem:
+
+    x = argmin ||A x - f||^2 + lam^2 ||x||^2 subject to x >= 0
+
+    where A is the Saltykov kernel (see saltykov_kernel). The unconstrained
+    (Tikhonov) solutions of all the samples are first obtained at once from
+    the singular value decomposition of A; those with no negative
+    frequencies are already the NNLS solutions. Only the remaining samples
+    are solved one by one with the active-set method of Scipy, so the cost
+    grows with the number of samples that hit the constraint.
+
+    Parameters
+    ----------
+    freqs : 2D array
+        the frequencies of the apparent diameters, one sample per row
+
+    kernel : 2D array
+        the Saltykov kernel
+
+    binsizes : scalar or array_like
+        the width of the classes, shared or one per row (column vector)
 
+    lam : positive scalar or array_like, optional
+        the regularization strength, shared or one per row. Default 0
 
     Call functions
     --------------
-    - Saltykov,
-    - fit_log,
-    - log_function
-    - gen_xgrid
-    - twostep_plot
-
-    Examples
-    --------
-    >>> stereology.two_step(diameters)
-    >>> stereology.two_step(diameters, class_range=(12, 18))
-
-    References
-    ----------
-    Saltykov SA (1967) http://doi.org/10.1007/978-3-642-88260-9_31
-    Sahagian and Proussevitch (1998) https://doi.org/10.1016/S0377-0273(98)00043-2
-    Lopez-Sanchez and Llana-Funez (2016) https://doi.org/10.1016/j.jsg.2016.10.008
+    - svd (from Numpy)
+    - nnls (from Scipy)
 
     Returns
     -------
-    A plot with an estimate of the actual (3D) grains size distribution and
-    several statistical parameters
+    the normalized frequencies of the unfolded populations such that the
+    integral over the range is one
     """
 
-    # estimate the prior shape and scale based on the apparent distribution
-    shape = np.exp(np.std(np.log(diameters), ddof=1))
-    scale = np.median(diameters)
+    freqs = np.asarray(freqs, dtype=float)
+    numbins = freqs.shape[1]
+    lam = np.broadcast_to(np.asarray(lam, dtype=float), (len(freqs),))
 
-    # estimate the number of classes that produces the best fit within the range defined
-    class_list = list(range(class_range[0], class_range[1] + 1))
-    stds = np.zeros(len(class_list))
+    # unconstrained solutions x = V diag(s / (s^2 + lam^2)) U.T f, which
+    # solve the NNLS problem whenever they are feasible
+    U, s, Vt = np.linalg.svd(kernel)
+    unfolded = ((freqs @ U) * s / (s**2 + lam[:, np.newaxis]**2)) @ Vt
 
-    for index, item in enumerate(class_list):
-        mid_points, frequencies = Saltykov(diameters, numbins=item, return_data=True)
-        optimal_params, sigma_error = fit_log(
-            mid_points, frequencies, initial_guess=(shape, scale)
-        )
-        stds[index] = sigma_error[0]
-
-    # get the optimal number of clases and estimate the best fit parameters
-    optimal_num_classes = class_list[np.argmin(stds)]
-    mid_points, frequencies = Saltykov(
-        diameters, numbins=optimal_num_classes, return_data=True
-    )
-    optimal_params, sigma_err = fit_log(mid_points, frequencies, (shape, scale))
+    zeros = np.zeros(numbins)
+    for index in np.flatnonzero(np.any(unfolded < 0, axis=1)):
+        augmented = np.vstack([kernel, lam[index] * np.eye(numbins)])
+        unfolded[index] = nnls(augmented, np.concatenate([freqs[index], zeros]))[0]
+    total = unfolded.sum(axis=1, keepdims=True)
 
-    print("=======================================")
-    print("PREDICTED OPTIMAL VALUES")
-    print(f"Number of classes: {optimal_num_classes}")
-    print(f"MSD (lognormal shape) = {optimal_params[0]:0.2f} ± {3 * sigma_err[0]:0.2f}")
-    print(
-        f"Geometric mean (scale) = {optimal_params[1]:0.2f} ± {3 * sigma_err[1]:0.2f}"
-    )
-    print("=======================================")
-    # print(' Covariance matrix:\n', covm)
+    return np.divide(unfolded, total * binsizes, out=np.zeros_like(unfolded), where=total > 0)
 
-    # prepare data for the plot
-    xgrid = np.linspace(0.1, diameters.max(), 1000)
-    best_fit = log_function(xgrid, optimal_params[0], optimal_params[1])
 
-    # Estimate all the combinatorial posibilities for fit curves taking into account the uncertainties
-    values = np.array([log_function(xgrid, optimal_params[0] + sigma_err[0], optimal_params[1] + sigma_err[1]),
-                       log_function(xgrid, optimal_params[0] - sigma_err[0], optimal_params[1] - sigma_err[1]),
-                       log_function(xgrid, optimal_params[0] + sigma_err[0], optimal_params[1] - sigma_err[1]),
-                       log_function(xgrid, optimal_params[0] - sigma_err[0], optimal_params[1] + sigma_err[1])])
+def regularization_curves(freqs, offset, lambdas=None):
+    """ Returns the residual and solution norms of the Tikhonov solutions
+    and the generalized cross-validation (GCV) function for all the
+    samples (rows) and candidate regularization strengths at once, from a
+    single (cached) singular value decomposition of the Saltykov kernel.
 
-    # Estimate the standard deviation of the all values obtained
-    fit_error = np.std(values, axis=0)
+    Parameters
+    ----------
+    freqs : 2D array
+        the frequencies of the apparent diameters, one sample per row
 
-    return twostep_plot(xgrid, mid_points, frequencies, best_fit, fit_error)
+    offset : positive scalar
+        the left edge of the histograms divided by the bin size
 
+    lambdas : array_like or None, optional
+        the candidate regularization strengths. If None, 60 values
+        logarithmically spaced between 1e-4 times the smallest and the
+        largest singular values of the kernel
 
-def unfold_population(freq, bin_edges, binsize, mid_points, normalize=True):
-    """ Applies the Saltykov algorithm to unfold the population of apparent
-    (2D) diameters into the actual (3D) population of grain sizes. Following the
-    reasoning of Higgins (2000), R (or D) is placed at the center of the classes
-    (i.e. the midpoints).
+    Call functions
+    --------------
+    - kernel_svd
 
-    Reference
-    ----------
-    Higgins (2000) http://doi.org/10.2138/am-2000-8-901
-    Saltykov SA (1967) http://doi.org/10.1007/978-3-642-88260-9_31
-    Sahagian and Proussevitch (1998) https://doi.org/10.1016/S0377-0273(98)00043-2
+    Returns
+    -------
+    the candidate lambdas and three 2D arrays (samples x lambdas) with the
+    residual norms, the solution norms and the GCV values
+    """
 
-    Parameters
-    ----------
-    freq : array_like
-        frequency values of the different classes
+    freqs = np.atleast_2d(np.asarray(freqs, dtype=float))
+    U, s, Vt = kernel_svd(freqs.shape[1], offset)
+    if lambdas is None:
+        lambdas = np.geomspace(1e-4 * s[-1], s[0], 60)
+    lambdas = np.asarray(lambdas, dtype=float)
 
-    bin_edges : array_like
-        the edges of the classes
+    # filter factors (lambdas x classes) and coefficients (samples x classes)
+    filters = s**2 / (s**2 + lambdas[:, np.newaxis]**2)
+    beta = freqs @ U
 
-    mid_points : array_like
-        the midpoints of the classes
+    residual = np.sqrt(np.sum(((1 - filters[np.newaxis]) * beta[:, np.newaxis])**2, axis=2))
+    solution = np.sqrt(np.sum((filters[np.newaxis] * beta[:, np.newaxis] / s)**2, axis=2))
+    gcv = residual**2 / (freqs.shape[1] - filters.sum(axis=1))**2
 
-    normalize : boolean, optional
-        when True negative frequency values are set to zero and the
-        distribution normalized. True by default.
+    return lambdas, residual, solution, gcv
 
-    Call function
-    -------------
-    - wicksell_eq
 
-    Returns
-    -------
-    The normalized frequencies of the unfolded population such that the integral
-    over the range is one. If normalize is False the raw frequencies of the
-    unfolded population.
-    """
+def _lcurve_corner(residual, solution, fallback):
+    """ Returns the index of the point of maximum curvature of the
+    L-curves (log residual norm vs log solution norm), one per row. Rows
+    whose curvature is undefined everywhere (e.g. all-zero histograms)
+    get the fallback index (e.g. the GCV choice)."""
 
-    d_values = np.copy(bin_edges)
-    midpoints = np.copy(mid_points)
-    i = len(midpoints) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x, y = np.log(residual), np.log(solution)
+        dx, dy = np.gradient(x, axis=1), np.gradient(y, axis=1)
+        ddx, ddy = np.gradient(dx, axis=1), np.gradient(dy, axis=1)
+        curvature = (dx * ddy - ddx * dy) / (dx**2 + dy**2)**1.5
 
-    while i > 0:
-        j = i
-        D = d_values[-1]
-        Pi = wicksell_solution(D, d_values[i], d_values[i + 1])
+    curvature = np.where(np.isfinite(curvature), curvature, -np.inf)
+    defined = np.any(np.isfinite(curvature), axis=1)
 
-        if freq[i] > 0:
-            while j > 0:
-                D = midpoints[-1]
-                Pj = wicksell_solution(D, d_values[j - 1], d_values[j])
-                P_norm = (Pj * freq[i]) / Pi
-                np.put(freq, j - 1, freq[j - 1] - P_norm)  # replace specified elements of an array
-                j -= 1
+    return np.where(defined, np.argmax(curvature, axis=1), fallback)
 
-            i -= 1
-            d_values = np.delete(d_values, -1)
-            midpoints = np.delete(midpoints, -1)
 
-        else:  # if the value of the current class is zero or negative move to the next class
-            i -= 1
-            d_values = np.delete(d_values, -1)
-            midpoints = np.delete(midpoints, -1)
+def kernel_svd(numbins, offset=0.0):
+    """ Returns the (read-only) singular value decomposition U, s, Vt of
+    the Saltykov kernel for a given bin layout. As for saltykov_kernel,
+    only the decompositions of histograms starting at zero are cached."""
 
-    if normalize is True:
-        freq = np.clip(freq, a_min=0.0, a_max=None)  # replacing negative values with zero
-        freq_norm = freq / np.sum(freq)              # normalize to one
-        freq_norm = freq_norm / binsize              # normalize such that the integral over the range is one
-        return freq_norm
+    if offset == 0:
+        return _cached_kernel_svd(int(numbins))
+
+    return _kernel_svd(numbins, offset)
+
+
+@lru_cache(maxsize=128)
+def _cached_kernel_svd(numbins):
+    return _kernel_svd(numbins, 0.0)
 
-    else:
-        return freq
+
+def _kernel_svd(numbins, offset):
+    U, s, Vt = np.linalg.svd(saltykov_kernel(numbins, offset))
+    for array in (U, s, Vt):
+        array.flags.writeable = False
+
+    return U, s, Vt
 
 
 def unfold_population2(freq, bin_centers, bin_width, normalize=True):
@@ -413,7 +1584,8 @@ def volume_weighted_cdf(freqs, bin_midpoints):
     Parameters
     ----------
     freqs : array type
-        The histogram frequencies/counts.
+        The histogram frequencies/counts. If 2D, one histogram
+        per row.
     bin_midpoints : array type
         the midpoints of the bins
     """
@@ -426,10 +1598,10 @@ def volume_weighted_cdf(freqs, bin_midpoints):
     vol_weighted_freqs = freqs * grain_volumes
 
     # Compute the cumulative sum of the volume-weighted counts
-    cumulative_volume = np.cumsum(vol_weighted_freqs)
+    cumulative_volume = np.cumsum(vol_weighted_freqs, axis=-1)
 
     # Normalize the cumulative sum to get the cumulative frequency distribution
-    vol_cfd = cumulative_volume / cumulative_volume[-1]
+    vol_cfd = cumulative_volume / cumulative_volume[..., -1:]
 
     return 100 * vol_cfd
 
@@ -484,7 +1656,7 @@ def calc_volume_fraction(lognorm_params,
     return volume_fraction
 
 
-def calc_volume_fraction_hist(size, bin_midpoints, cdf_norm):
+def calc_volume_fraction_hist(size, bin_midpoints, cdf_norm, left_edge=None):
     """Calculates and print the volume fraction of a
     occuppied up to a grain size specified by the user
     using the cumulative distribution function and interpolating
@@ -492,18 +1664,21 @@ def calc_volume_fraction_hist(size, bin_midpoints, cdf_norm):
 
     Parameters
     ----------
+    size : positive scalar
+        the grain size
     bin_midpoints : array type
         the midpoints of the bins
     cdf_norm : array type
         normalized volume-weighted cumulative frequency
+    left_edge : scalar or None, optional
+        the left edge of the histogram (see interp_volume_fraction)
+
+    Returns
+    -------
+    the volume fraction in percentage
     """
 
-    index = np.argmax(bin_midpoints > size)
-    angle = np.arctan(
-        (cdf_norm[index] - cdf_norm[index - 1])
-        / (bin_midpoints[index] - bin_midpoints[index - 1])
-    )
-    volume = cdf_norm[index - 1] + np.tan(angle) * (size - bin_midpoints[index - 1])
+    volume = interp_volume_fraction(size, bin_midpoints, cdf_norm, left_edge)
 
     if volume < 100.0:
         print("=================================================")
@@ -514,7 +1689,494 @@ def calc_volume_fraction_hist(size, bin_midpoints, cdf_norm):
         print(f"volume fraction (up to {size} microns) = 100 %")
         print("=================================================")
 
-    return None
+    return volume
+
+
+def interp_volume_fraction(sizes, bin_midpoints, cdf_norm, left_edge=None):
+    """ Returns the volume fraction (in percentage) occupied by the
+    grains up to the given size(s) interpolating linearly the
+    volume-weighted cumulative frequency between bin midpoints. The
+    volume fraction is zero at (and below) the left edge of the
+    histogram and 100 % beyond the last midpoint.
+
+    Parameters
+    ----------
+    sizes : scalar or array-like
+        the grain size(s)
+    bin_midpoints : array type
+        the midpoints of the bins
+    cdf_norm : array type
+        normalized volume-weighted cumulative frequency
+    left_edge : scalar or None, optional
+        the left edge of the histogram. If None, it is half a bin
+        below the first midpoint (equal-width classes)
+    """
+
+    bin_midpoints = np.asarray(bin_midpoints, dtype=float)
+    if left_edge is None:
+        half_bin = (bin_midpoints[1] - bin_midpoints[0]) / 2 if len(bin_midpoints) > 1 else bin_midpoints[0]
+        left_edge = bin_midpoints[0] - half_bin
+
+    return np.interp(sizes,
+                     np.append(left_edge, bin_midpoints),
+                     np.append(0.0, cdf_norm),
+                     left=0.0, right=100.0)
+
+
+# ============================================================================ #
+# WICKSELL TRANSFORM LOOKUP TABLES                                             #
+# ============================================================================ #
+
+
+def build_wicksell_table(path=None, sigmas=(0.05, 1.5, 256), t=(-12, 8, 1024), nodes=128):
+    """ Tabulate the Wicksell transform of lognormal populations of
+    spheres, i.e. the expected distribution of apparent (sectional)
+    diameters. Since the scale (geometric mean) only stretches the size
+    axis, the transform only depends on the shape: the log-density of the
+    apparent diameters is
+
+    log g(d) = -mu - sigma**2 / 2 + log I(t, sigma), with t = (ln d - mu) / sigma
+
+    so the table stores log I and the cumulative distribution over a
+    regular grid of sigma (the SD of the log sizes, MSD = exp(sigma)) and
+    t. Once built, the expected apparent distribution of any lognormal
+    population is obtained by interpolation instead of numerical
+    integration (see apparent_lognormal_pdf and apparent_lognormal_cdf).
+
+    Parameters
+    ----------
+    path : str or None, optional
+        the folder where the table is stored as .npy files (created if
+        needed). If None, the table is only kept in memory
+
+    sigmas : tuple (start, stop, num), optional
+        the regular grid of shapes (SD of the log sizes),
+        default (0.05, 1.5, 256), i.e. MSD from 1.05 to 4.48
+
+    t : tuple (start, stop, num), optional
+        the regular grid of standardized log sizes, default (-12, 8, 1024)
+
+    nodes : positive integer, optional
+        the number of quadrature nodes, default 128
+
+    Call functions
+    --------------
+    - _wicksell_terms
+
+    Examples
+    --------
+    >>> build_wicksell_table('wicksell_table')
+    >>> table = load_wicksell_table('wicksell_table')
+    >>> apparent_lognormal_pdf(diameters, msd=1.6, gmean=35, table=table)
+
+    Returns
+    -------
+    the table as a WicksellTable object
+    """
+
+    import os
+
+    sigma_grid = np.linspace(*sigmas)
+    t_grid = np.linspace(*t)
+    log_integral = np.empty((len(sigma_grid), len(t_grid)))
+    cdf = np.empty_like(log_integral)
+
+    for index, sigma in enumerate(sigma_grid):
+        log_integral[index] = np.log(_wicksell_terms(sigma * t_grid, sigma, nodes)[0].sum(axis=1))
+
+        # density of t (mu = 0): g(d) d dln(d) / dt, integrated with the
+        # trapezoidal rule plus the mass of the lower tail, where I grows
+        # as exp(sigma * t) and thus the density as exp(2 sigma * t)
+        density = np.exp(log_integral[index] - sigma**2 / 2 + sigma * t_grid) * sigma
+        steps = np.diff(t_grid) * (density[1:] + density[:-1]) / 2
+        cumulative = density[0] / (2 * sigma) + np.concatenate([[0.0], np.cumsum(steps)])
+        cdf[index] = cumulative / cumulative[-1]
+
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'sigmas.npy'), sigma_grid)
+        np.save(os.path.join(path, 't.npy'), t_grid)
+        np.save(os.path.join(path, 'log_integral.npy'), log_integral)
+        np.save(os.path.join(path, 'cdf.npy'), cdf)
+        return load_wicksell_table(path)
+
+    return WicksellTable(sigma_grid, t_grid, log_integral, cdf)
+
+
+def load_wicksell_table(path):
+    """ Load a table created with build_wicksell_table. The tables are
+    memory-mapped (read-only), so only the rows used are read from disk.
+
+    Parameters
+    ----------
+    path : str
+        the folder of the table
+
+    Returns
+    -------
+    the table as a WicksellTable object
+    """
+
+    import os
+
+    return WicksellTable(np.load(os.path.join(path, 'sigmas.npy')),
+                         np.load(os.path.join(path, 't.npy')),
+                         np.load(os.path.join(path, 'log_integral.npy'), mmap_mode='r'),
+                         np.load(os.path.join(path, 'cdf.npy'), mmap_mode='r'))
+
+
+@lru_cache(maxsize=1)
+def _default_wicksell_table():
+    """ Returns the (cached) in-memory Wicksell table with the default grids"""
+    return build_wicksell_table()
+
+
+def apparent_lognormal_pdf(d, msd, gmean, table=None):
+    """ Returns the probability density of the apparent (sectional)
+    diameters d of a lognormal population of spheres with the given MSD
+    (shape) and geometric mean (scale), interpolating the precomputed
+    Wicksell transform.
+
+    Parameters
+    ----------
+    d : scalar or array-like
+        the apparent diameters
+
+    msd : scalar
+        the multiplicative standard deviation (shape) of the 3D population
+
+    gmean : scalar
+        the geometric mean (scale) of the 3D population
+
+    table : WicksellTable or None, optional
+        the lookup table. If None, a default table is built once (in
+        memory) and reused
+
+    Examples
+    --------
+    >>> apparent_lognormal_pdf(np.linspace(1, 100, 500), msd=1.6, gmean=35)
+    """
+
+    table = _default_wicksell_table() if table is None else table
+    return table.pdf(d, msd, gmean)
+
+
+def apparent_lognormal_cdf(d, msd, gmean, table=None):
+    """ Returns the cumulative distribution function of the apparent
+    (sectional) diameters d of a lognormal population of spheres with the
+    given MSD (shape) and geometric mean (scale), interpolating the
+    precomputed Wicksell transform. Useful for goodness-of-fit tests,
+    e.g. scipy.stats.kstest(diameters, lambda d: apparent_lognormal_cdf(d, msd, gmean)).
+
+    Parameters
+    ----------
+    d : scalar or array-like
+        the apparent diameters
+
+    msd : scalar
+        the multiplicative standard deviation (shape) of the 3D population
+
+    gmean : scalar
+        the geometric mean (scale) of the 3D population
+
+    table : WicksellTable or None, optional
+        the lookup table. If None, a default table is built once (in
+        memory) and reused
+    """
+
+    table = _default_wicksell_table() if table is None else table
+    return table.cdf(d, msd, gmean)
+
+
+class WicksellTable:
+    """ A lookup table of the Wicksell transform of lognormal populations
+    over a regular grid of shapes (sigmas) and standardized log sizes (t),
+    see build_wicksell_table. Values are interpolated bilinearly; below
+    the t grid the asymptotic behaviour of small sections (density
+    proportional to d) is used and above it the density is zero.
+    """
+
+    __slots__ = ('sigmas', 't', 'log_integral', 'cdf_table')
+
+    def __init__(self, sigmas, t, log_integral, cdf_table):
+        self.sigmas = sigmas
+        self.t = t
+        self.log_integral = log_integral
+        self.cdf_table = cdf_table
+
+    def __repr__(self):
+        return "WicksellTable(MSD from {:0.2f} to {:0.2f}, shape={})".format(
+            np.exp(self.sigmas[0]), np.exp(self.sigmas[-1]), self.log_integral.shape)
+
+    def _positions(self, d, msd, gmean):
+        """ fractional grid positions of sigma and of the standardized log sizes"""
+
+        sigma = np.log(msd)
+        if not self.sigmas[0] <= sigma <= self.sigmas[-1]:
+            raise ValueError("msd must be within the range of the table ({:0.2f}-{:0.2f})".format(
+                np.exp(self.sigmas[0]), np.exp(self.sigmas[-1])))
+        # sizes <= 0 are mapped to t = -inf, where both the density and the
+        # cdf vanish, and the grid positions are clipped before indexing
+        d = np.asarray(d, dtype=float)
+        positive = d > 0
+        t = np.where(positive, (np.log(np.where(positive, d, 1.0)) - np.log(gmean)) / sigma, -np.inf)
+        s_pos = (sigma - self.sigmas[0]) / (self.sigmas[1] - self.sigmas[0])
+        t_pos = (np.clip(t, self.t[0], self.t[-1]) - self.t[0]) / (self.t[1] - self.t[0])
+
+        return sigma, t, s_pos, t_pos
+
+    def _interp(self, table, s_pos, t_pos):
+        """ bilinear interpolation (t positions within the grid)"""
+
+        i = min(int(s_pos), len(self.sigmas) - 2)
+        j = np.clip(np.floor(t_pos).astype(int), 0, len(self.t) - 2)
+        ds, dt = s_pos - i, np.clip(t_pos - j, 0.0, 1.0)
+        rows = np.asarray(table[i:i + 2])
+        lower = rows[0, j] * (1 - dt) + rows[0, j + 1] * dt
+        upper = rows[1, j] * (1 - dt) + rows[1, j + 1] * dt
+
+        return lower * (1 - ds) + upper * ds
+
+    def _log_integral_derivatives(self, t, sigma):
+        """ Returns log I(t, sigma) (see build_wicksell_table) and its
+        partial derivatives with respect to t and sigma using bicubic
+        (Catmull-Rom) interpolation, which has a continuous gradient. t
+        values below the grid follow the asymptotic behaviour of small
+        sections, t values above it are not allowed."""
+
+        def weights(u):
+            u2, u3 = u * u, u * u * u
+            values = np.stack([(-u3 + 2 * u2 - u) / 2, (3 * u3 - 5 * u2 + 2) / 2,
+                               (-3 * u3 + 4 * u2 + u) / 2, (u3 - u2) / 2], axis=-1)
+            slopes = np.stack([(-3 * u2 + 4 * u - 1) / 2, (9 * u2 - 10 * u) / 2,
+                               (-9 * u2 + 8 * u + 1) / 2, (3 * u2 - 2 * u) / 2], axis=-1)
+            return values, slopes
+
+        s_step, t_step = self.sigmas[1] - self.sigmas[0], self.t[1] - self.t[0]
+        s_pos = (sigma - self.sigmas[0]) / s_step
+        i = min(int(s_pos), len(self.sigmas) - 2)
+        s_weights, s_slopes = weights(np.asarray(s_pos - i))
+
+        below = t < self.t[0]
+        t_pos = (np.where(below, self.t[0], t) - self.t[0]) / t_step
+        j = np.minimum(np.floor(t_pos).astype(int), len(self.t) - 2)
+        t_weights, t_slopes = weights(t_pos - j)
+
+        # the 4 x 4 neighbouring nodes (indices clamped to the grid)
+        rows = np.asarray(self.log_integral[np.clip(np.arange(i - 1, i + 3), 0, len(self.sigmas) - 1)])
+        block = rows[:, np.clip(j[:, np.newaxis] + np.arange(-1, 3), 0, len(self.t) - 1)]
+
+        log_integral = np.einsum('a,anb,nb->n', s_weights, block, t_weights)
+        d_t = np.einsum('a,anb,nb->n', s_weights, block, t_slopes) / t_step
+        d_sigma = np.einsum('a,anb,nb->n', s_slopes, block, t_weights) / s_step
+
+        # lower tail: I grows as exp(sigma * t)
+        offset = np.where(below, t - self.t[0], 0.0)
+        log_integral = log_integral + sigma * offset
+        d_t = np.where(below, sigma, d_t)
+        d_sigma = d_sigma + offset
+
+        return log_integral, d_t, d_sigma
+
+    def log_pdf(self, d, msd, gmean):
+        """ Returns the log-density of the apparent diameters d"""
+
+        sigma, t, s_pos, t_pos = self._positions(d, msd, gmean)
+        mu = np.log(gmean)
+        log_integral = self._interp(self.log_integral, s_pos, t_pos)
+
+        # lower tail: I grows as exp(sigma * t); upper tail: zero density
+        below = t < self.t[0]
+        log_integral = np.where(below, log_integral + sigma * (t - self.t[0]), log_integral)
+        log_integral = np.where(t > self.t[-1], -np.inf, log_integral)
+
+        return -mu - sigma**2 / 2 + log_integral
+
+    def pdf(self, d, msd, gmean):
+        """ Returns the density of the apparent diameters d"""
+        return np.exp(self.log_pdf(d, msd, gmean))
+
+    def cdf(self, d, msd, gmean):
+        """ Returns the cumulative distribution function of the apparent
+        diameters d"""
+
+        sigma, t, s_pos, t_pos = self._positions(d, msd, gmean)
+        cdf = self._interp(self.cdf_table, s_pos, t_pos)
+
+        # lower tail: the cdf decreases as exp(2 sigma * t)
+        with np.errstate(over='ignore'):
+            cdf = np.where(t < self.t[0], cdf * np.exp(2 * sigma * (t - self.t[0])), cdf)
+
+        return np.where(t > self.t[-1], 1.0, cdf)
+
+
+# ============================================================================ #
+# RESULT OBJECTS                                                               #
+# ============================================================================ #
+
+
+class SaltykovResult:
+    """ The outcome of the Saltykov method (see Saltykov). It holds the
+    classes, the unfolded frequencies and the volume-weighted cumulative
+    frequencies, and creates the plot only when requested.
+
+    Examples
+    --------
+    >>> result = Saltykov(diameters, numbins=12, return_result=True)
+    >>> result.frequencies
+    >>> result.volume_fraction([20, 40, 60])
+    >>> fig, (ax1, ax2) = result.plot()
+    """
+
+    __slots__ = ('bin_edges', 'frequencies', 'cdf')
+
+    def __init__(self, bin_edges, frequencies, cdf):
+        self.bin_edges = bin_edges
+        self.frequencies = frequencies
+        self.cdf = cdf
+
+    @property
+    def binsize(self):
+        return self.bin_edges[1] - self.bin_edges[0]
+
+    @property
+    def mid_points(self):
+        return (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+
+    def __repr__(self):
+        return "SaltykovResult(numbins={}, binsize={:0.2f})".format(len(self.frequencies), self.binsize)
+
+    def volume_fraction(self, sizes):
+        """ Returns the volume fraction (%) occupied by the grains up to
+        the given size(s) (see interp_volume_fraction)"""
+        return interp_volume_fraction(sizes, self.mid_points, self.cdf, self.bin_edges[0])
+
+    def plot(self):
+        """ Returns the figure of the Saltykov method (see Saltykov_plot)"""
+        return Saltykov_plot(self.bin_edges[:-1], self.frequencies, self.binsize, self.mid_points, self.cdf)
+
+
+class TwoStepResult:
+    """ The outcome of the two-step method (see two_step). It holds the
+    Saltykov classes, frequencies and volume-weighted cumulative
+    frequencies of the optimal number of classes, the best fitting
+    lognormal parameters (MSD and geometric mean) and their errors (one
+    sigma), and creates the plot only when requested.
+
+    Examples
+    --------
+    >>> result = two_step(diameters, return_result=True)
+    >>> result.msd, result.gmean
+    >>> result.volume_fraction([20, 40, 60])
+    >>> fig, ax = result.plot()
+    """
+
+    __slots__ = ('bin_edges', 'frequencies', 'cdf', 'msd', 'gmean', 'msd_err', 'gmean_err', 'max_diameter')
+
+    def __init__(self, bin_edges, frequencies, cdf, params, errors, max_diameter):
+        self.bin_edges = bin_edges
+        self.frequencies = frequencies
+        self.cdf = cdf
+        self.msd, self.gmean = params
+        self.msd_err, self.gmean_err = errors
+        self.max_diameter = max_diameter
+
+    @property
+    def numbins(self):
+        return len(self.frequencies)
+
+    @property
+    def binsize(self):
+        return self.bin_edges[1] - self.bin_edges[0]
+
+    @property
+    def mid_points(self):
+        return (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+
+    def __repr__(self):
+        return "TwoStepResult(numbins={}, MSD={:0.2f} ± {:0.2f}, gmean={:0.2f} ± {:0.2f})".format(
+            self.numbins, self.msd, self.msd_err, self.gmean, self.gmean_err)
+
+    def pdf(self, x):
+        """ Returns the best fitting lognormal density at x"""
+        return log_function(x, self.msd, self.gmean)
+
+    def volume_fraction(self, sizes):
+        """ Returns the volume fraction (%) occupied by the grains up to
+        the given size(s) according to the best fitting lognormal. The
+        volume-weighted distribution of a lognormal is also lognormal with
+        the same shape and its log mean shifted by 3 * sigma**2."""
+
+        from scipy.stats import norm
+
+        sigma, mu = np.log(self.msd), np.log(self.gmean)
+        with np.errstate(divide='ignore'):
+            return 100 * norm.cdf((np.log(sizes) - mu - 3 * sigma**2) / sigma)
+
+    def plot(self):
+        """ Returns the figure of the two-step method (see twostep_plot)"""
+
+        xgrid = np.linspace(0.1, self.max_diameter, 1000)
+        best_fit = log_function(xgrid, self.msd, self.gmean)
+
+        # Estimate all the combinatorial posibilities for fit curves taking into account the uncertainties
+        values = np.array([log_function(xgrid, self.msd + self.msd_err, self.gmean + self.gmean_err),
+                           log_function(xgrid, self.msd - self.msd_err, self.gmean - self.gmean_err),
+                           log_function(xgrid, self.msd + self.msd_err, self.gmean - self.gmean_err),
+                           log_function(xgrid, self.msd - self.msd_err, self.gmean + self.gmean_err)])
+
+        # Estimate the standard deviation of the all values obtained
+        fit_error = np.std(values, axis=0)
+
+        return twostep_plot(xgrid, self.mid_points, self.frequencies, best_fit, fit_error)
+
+
+class SaltykovBootstrapResult:
+    """ The outcome of the bootstrap of the Saltykov method (see
+    Saltykov_bootstrap). It holds the classes, the unfolded frequencies
+    and the volume-weighted cumulative frequencies of the original sample
+    along with their percentile bands (lower and upper limits as rows),
+    and, if the lognormal was fitted, the MSD and geometric mean with
+    their bands, the number of resamples where the fit failed and (for
+    numbins='auto') the number of classes selected for each resample.
+
+    Examples
+    --------
+    >>> boot = Saltykov_bootstrap(diameters, numbins=12, seed=42)
+    >>> boot.frequencies_band
+    >>> boot.msd, boot.msd_band
+    """
+
+    __slots__ = ('bin_edges', 'frequencies', 'frequencies_band', 'cdf', 'cdf_band', 'n_resamples',
+                 'msd', 'gmean', 'msd_band', 'gmean_band', 'failed_fits', 'resampled_numbins')
+
+    def __init__(self, bin_edges, frequencies, frequencies_band, cdf, cdf_band, n_resamples):
+        self.bin_edges = bin_edges
+        self.frequencies = frequencies
+        self.frequencies_band = frequencies_band
+        self.cdf = cdf
+        self.cdf_band = cdf_band
+        self.n_resamples = n_resamples
+        self.msd = self.gmean = self.msd_band = self.gmean_band = None
+        self.failed_fits = self.resampled_numbins = None
+
+    @property
+    def numbins(self):
+        return len(self.frequencies)
+
+    @property
+    def binsize(self):
+        return self.bin_edges[1] - self.bin_edges[0]
+
+    @property
+    def mid_points(self):
+        return (self.bin_edges[:-1] + self.bin_edges[1:]) / 2
+
+    def __repr__(self):
+        if self.msd is None:
+            return "SaltykovBootstrapResult(numbins={}, n_resamples={})".format(self.numbins, self.n_resamples)
+        return "SaltykovBootstrapResult(numbins={}, n_resamples={}, MSD={:0.2f} [{:0.2f}, {:0.2f}])".format(
+            self.numbins, self.n_resamples, self.msd, *self.msd_band)
 
 
 # ============================================================================ #
@@ -624,6 +2286,8 @@ def Saltykov_plot(left_edges, freq3D, binsize, mid_points, cdf_norm):
     ii) a volume-weighted cumulative frequency plot (ax2)
     """
 
+    import matplotlib.pyplot as plt
+
     fig, (ax1, ax2) = plt.subplots(nrows=1, ncols=2, figsize=(10, 4))
 
     # frequency vs grain size plot
@@ -667,6 +2331,8 @@ def Saltykov_plot(left_edges, freq3D, binsize, mid_points, cdf_norm):
 def twostep_plot(xgrid, mid_points, frequencies, best_fit, fit_error):
     """ Generate a plot with the best fitting lognormal distribution (two-step method)"""
 
+    import matplotlib.pyplot as plt
+
     # matplotlib stuff
     fig, ax = plt.subplots()
 
@@ -0,0 +1,481 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import averages  # noqa: E402
+
+DATA = Path(__file__).resolve().parents[1] / 'DATA' / 'data_set.txt'
+
+
+@pytest.fixture(scope='module')
+def diameters():
+    areas = np.genfromtxt(DATA, delimiter='\t', names=True)['Area']
+    return 2 * np.sqrt(areas / np.pi)
+
+
+@pytest.fixture(scope='module')
+def samples():
+    rng = np.random.default_rng(42)
+    return [rng.lognormal(3.0, 0.5, size=n) for n in (15, 40, 101, 250)]
+
+
+@pytest.mark.parametrize('ci', [0.95, (0.9, 0.99)])
+def test_grouped_averages_matches_per_group_calls(samples, ci):
+    offsets = np.cumsum([0] + [len(sample) for sample in samples])
+    df = averages.grouped_averages(np.concatenate(samples), offsets=offsets, ci=ci)
+
+    for i, sample in enumerate(samples):
+        row = df.iloc[i]
+        mean, std, (astm_low, astm_high), _ = averages.amean(sample, ci, method='ASTM')
+        _, _, (cox_low, cox_high), _ = averages.amean(sample, ci, method='mCox')
+        gmean, msd, (clt_low, clt_high), _ = averages.gmean(sample, ci, method='CLT')
+        _, _, (bayes_low, bayes_high), _ = averages.gmean(sample, ci, method='bayes')
+        med, iqr, (med_low, med_high), _ = averages.median(sample, ci)
+
+        np.testing.assert_allclose([row['n'], row['amean'], row['SD'], row['gmean'], row['MSD'],
+                                    row['median'], row['IQR']],
+                                   [len(sample), mean, std, gmean, msd, med, iqr])
+
+        expected = {'ASTM': (astm_low, astm_high), 'mCox': (cox_low, cox_high), 'CLT': (clt_low, clt_high),
+                    'bayes': (bayes_low, bayes_high), 'median': (med_low, med_high)}
+        levels = [ci] if np.ndim(ci) == 0 else ci
+        for name, (low, high) in expected.items():
+            for level, low_value, high_value in zip(levels, np.atleast_1d(low), np.atleast_1d(high)):
+                suffix = '' if np.ndim(ci) == 0 else f'_{100 * level:g}'
+                np.testing.assert_allclose(row[f'{name}_lower{suffix}'], low_value)
+                np.testing.assert_allclose(row[f'{name}_upper{suffix}'], high_value)
+
+
+def test_grouped_averages_labels_match_offsets(samples):
+    values = np.concatenate(samples)
+    labels = np.repeat(['a', 'b', 'c', 'd'], [len(sample) for sample in samples])
+    by_label = averages.grouped_averages(values, groups=labels)
+    by_offsets = averages.grouped_averages(values, offsets=np.cumsum([0] + [len(s) for s in samples]))
+
+    assert list(by_label.index) == ['a', 'b', 'c', 'd']
+    np.testing.assert_allclose(by_label.to_numpy(), by_offsets.to_numpy())
+
+
+@pytest.mark.parametrize('confidence', [0.8, 0.95, 0.99])
+def test_critical_t_matches_scipy(confidence):
+    from scipy.stats import t
+
+    q = confidence + (1 - confidence) / 2
+    sizes = np.array([1, 2, 5, 30, 999, 1000])
+
+    assert averages.critical_t(confidence, 30) == pytest.approx(t.ppf(q, 30), rel=1e-12)
+    np.testing.assert_allclose(averages.critical_t(confidence, sizes), t.ppf(q, sizes), rtol=1e-12)
+    np.testing.assert_allclose(averages.critical_t(confidence, [1500, 10**5]), t.ppf(q, [1500, 10**5]), rtol=1e-5)
+    np.testing.assert_allclose(averages.critical_t(confidence, 7.5), t.ppf(q, 7.5), rtol=1e-12)
+
+
+@pytest.mark.parametrize('bandwidth', ['silverman', 'scott', 2.5])
+def test_fft_kde_matches_gaussian_kde(diameters, bandwidth):
+    xgrid = averages.gen_xgrid(diameters.min(), diameters.max(), 0.5)
+    from scipy.stats import gaussian_kde
+
+    bw_method = bandwidth / np.std(diameters, ddof=1) if isinstance(bandwidth, float) else bandwidth
+    expected = gaussian_kde(diameters, bw_method=bw_method)(xgrid)
+    result = averages.fft_kde(diameters, xgrid, bandwidth)
+
+    np.testing.assert_allclose(result, expected, atol=1e-3 * expected.max())
+
+
+def test_fft_kde_rejects_short_grid(diameters):
+    with pytest.raises(ValueError):
+        averages.fft_kde(diameters, np.linspace(diameters.min() + 1, diameters.max(), 100))
+
+
+def test_freq_peak_fft_matches_direct(diameters):
+    _, peak_direct, y_direct, bw = averages.freq_peak(diameters)
+    _, peak_fft, y_fft, bw_fft = averages.freq_peak(diameters, kde_method='fft')
+
+    assert bw == bw_fft
+    assert peak_fft == pytest.approx(peak_direct, abs=0.1)
+    assert y_fft == pytest.approx(y_direct, rel=1e-3)
+
+
+def test_kde_peaks_refine_matches_dense_grid(diameters):
+    _, peak_grid, y_grid, _ = averages.freq_peak(diameters, max_precision=0.01)
+    _, peak_refine, y_refine, _ = averages.freq_peak(diameters, max_precision=0.01, search='refine')
+
+    assert peak_refine == pytest.approx(peak_grid, abs=0.02)
+    assert y_refine >= y_grid - 1e-9
+
+
+def test_kde_peaks_finds_both_modes():
+    rng = np.random.default_rng(1)
+    bimodal = np.concatenate((rng.normal(20, 2, 2000), rng.normal(50, 3, 1000)))
+    _, peaks, y_peaks = averages.kde_peaks(bimodal, max_precision=0.01, all_peaks=True)
+
+    assert len(peaks) == 2
+    assert np.all(np.diff(y_peaks) <= 0)
+    np.testing.assert_allclose(peaks, [20, 50], atol=1.0)
+
+
+@pytest.mark.parametrize('size', [5, 10, 11, 250])
+def test_order_statistics_matches_sort(size):
+    pop = np.random.default_rng(size).lognormal(2, 0.6, size)
+    quantiles, ranks = (0.1, 0.25, 0.5, 0.75, 1.0), (0, 2, size - 1)
+    values, order_values = averages.order_statistics(pop, quantiles, ranks)
+
+    np.testing.assert_allclose(values, np.quantile(pop, quantiles))
+    np.testing.assert_array_equal(order_values, np.sort(pop)[list(ranks)])
+
+
+def test_median_matches_numpy(diameters):
+    med, iqr, (lower, upper), length = averages.median(diameters)
+    id_lower, id_upper = averages.median_ci_ranks(len(diameters))
+    ordered = np.sort(diameters)
+
+    assert med == np.median(diameters)
+    assert iqr == pytest.approx(np.subtract(*np.percentile(diameters, [75, 25])))
+    assert (lower, upper) == (ordered[id_lower], ordered[id_upper])
+    assert length == upper - lower
+
+
+def test_grouped_weighted_mean_matches_per_group_calls():
+    rng = np.random.default_rng(5)
+    values, errors = rng.normal(100, 10, 30), rng.uniform(1, 5, 30)
+    groups = np.repeat(['x', 'y', 'z'], [5, 10, 15])
+    df = averages.grouped_weighted_mean(values, errors, groups)
+    df_var = averages.grouped_weighted_mean(values, errors**2, groups, error_type='variance')
+
+    for label in ('x', 'y', 'z'):
+        mask = groups == label
+        mean, se = averages.weighted_mean_and_se(values[mask], errors[mask])
+        mean_var, se_var = averages.weighted_mean_with_error(values[mask], errors[mask]**2, verbose=False)
+        np.testing.assert_allclose(df.loc[label, ['weighted_mean', 'SE']], [mean, se])
+        np.testing.assert_allclose([mean_var, se_var], [mean, se])
+        np.testing.assert_allclose(df_var.loc[label].to_numpy(), df.loc[label].to_numpy())
+        assert 0 <= df.loc[label, 'I2'] <= 100
+
+
+def test_grouped_weighted_mean_prints_nothing(capsys):
+    averages.grouped_weighted_mean([1.0, 2.0], [0.1, 0.2], ['a', 'a'])
+
+    assert capsys.readouterr().out == ''
+
+
+def test_weighted_mean_with_error_is_silent_by_default(capsys):
+    averages.weighted_mean_with_error([1.0, 2.0], [0.1, 0.2])
+    assert capsys.readouterr().out == ''
+
+    averages.weighted_mean_with_error([1.0, 2.0], [0.1, 0.2], verbose=True)
+    assert 'Weighted Mean' in capsys.readouterr().out
+
+
+def test_critical_values_several_levels():
+    from scipy.stats import norm
+
+    levels = (0.9, 0.95)
+    np.testing.assert_allclose(averages.critical_z(levels), norm.ppf([0.95, 0.975]))
+    np.testing.assert_allclose(averages.critical_t(levels, 20),
+                               [averages.critical_t(0.9, 20), averages.critical_t(0.95, 20)])
+    assert not averages.critical_t_table(0.95).flags.writeable
+
+
+@pytest.mark.parametrize('function, method', [(averages.amean, 'ASTM'), (averages.amean, 'mCox'),
+                                              (averages.gmean, 'CLT'), (averages.gmean, 'bayes')])
+def test_several_levels_match_single_calls(diameters, function, method):
+    levels = (0.9, 0.95, 0.99)
+    *_, (lower, upper), length = function(diameters, levels, method=method)
+
+    for i, level in enumerate(levels):
+        *_, (single_lower, single_upper), single_length = function(diameters, level, method=method)
+        np.testing.assert_allclose([lower[i], upper[i], length[i]], [single_lower, single_upper, single_length])
+
+
+def test_several_levels_gci_and_median(diameters):
+    levels = (0.9, 0.99)
+    (lower, upper), _ = averages.GCI_ci(diameters, levels, seed=8)
+    _, _, (med_lower, med_upper), _ = averages.median(diameters, levels)
+
+    for i, level in enumerate(levels):
+        np.testing.assert_allclose([lower[i], upper[i]], averages.GCI_ci(diameters, level, seed=8)[0])
+        np.testing.assert_allclose([med_lower[i], med_upper[i]], averages.median(diameters, level)[2])
+
+
+def test_gci_draws_cache_hit_matches_fresh_draw():
+    cached = averages.GCI_draws(57, 5000, seed=7)
+    fresh = averages._draw_gci(57, 5000, np.random.default_rng(7))
+
+    assert averages.GCI_draws(57, 5000, seed=7)[0] is cached[0]
+    assert not cached[0].flags.writeable and not cached[1].flags.writeable
+    np.testing.assert_array_equal(cached[0], fresh[0])
+    np.testing.assert_array_equal(cached[1], fresh[1])
+
+
+def test_gci_draws_unseeded_are_fresh(diameters):
+    z_array, u_array = averages.GCI_draws(33, 2000)
+
+    assert len(z_array) == len(u_array) == 2000
+    assert not np.array_equal(averages.GCI_draws(33, 2000)[0], z_array)
+    assert averages.GCI_ci(diameters) != averages.GCI_ci(diameters)
+
+
+@pytest.mark.parametrize('make_seed', [np.random.default_rng, np.random.SeedSequence])
+def test_gci_ci_accepts_generators(diameters, make_seed):
+    expected = averages._draw_gci(len(diameters), 3000, np.random.default_rng(make_seed(3)))
+    np.testing.assert_array_equal(averages.GCI_draws(len(diameters), 3000, make_seed(3))[0], expected[0])
+    assert averages.GCI_ci(diameters, seed=make_seed(3)) == averages.GCI_ci(diameters, seed=make_seed(3))
+
+
+def test_gci_ci_seeded_is_reproducible(diameters):
+    first = averages.GCI_ci(diameters, seed=1)
+    second = averages.GCI_ci(averages.PreparedSample(diameters), seed=1)
+
+    assert first == second
+    assert first[0][0] < np.mean(diameters) < first[0][1]
+
+
+def test_gci_qmc_ci_matches_gci_ci(diameters):
+    (qmc_lower, qmc_upper), _, runs = averages.GCI_qmc_ci(diameters, seed=3)
+    (mc_lower, mc_upper), _ = averages.GCI_ci(diameters, runs=200000, seed=3)
+
+    assert runs <= 65536
+    np.testing.assert_allclose([qmc_lower, qmc_upper], [mc_lower, mc_upper], rtol=2e-3)
+
+
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('max_runs', [128, 1024, 4096])
+def test_gci_qmc_ci_never_exceeds_max_runs(samples, max_runs):
+    *_, runs = averages.GCI_qmc_ci(samples[1], tol=1e-12, max_runs=max_runs, seed=0)
+
+    assert runs == max_runs
+
+
+def test_gci_qmc_ci_small_sample_matches_gci_ci(samples):
+    (qmc_lower, qmc_upper), _, runs = averages.GCI_qmc_ci(samples[1], seed=3)
+    (mc_lower, mc_upper), _ = averages.GCI_ci(samples[1], runs=200000, seed=3)
+
+    np.testing.assert_allclose([qmc_lower, qmc_upper], [mc_lower, mc_upper], rtol=5e-3)
+
+
+def test_gci_qmc_ci_rejects_invalid_max_runs(samples):
+    with pytest.raises(ValueError):
+        averages.GCI_qmc_ci(samples[0], max_runs=0)
+    with pytest.raises(ValueError):
+        averages.GCI_qmc_ci(samples[0], max_runs=3000)
+
+
+def test_streaming_stats_merge_matches_single_pass(diameters):
+    chunks = np.array_split(diameters, 7)
+    single = averages.StreamingStats([diameters])
+    merged = averages.StreamingStats(chunks[:3]).merge(averages.StreamingStats(chunks[3:]))
+
+    for stats in (single, merged):
+        assert stats.n == len(diameters)
+        assert stats.mean == pytest.approx(np.mean(diameters), rel=1e-12)
+        assert stats.std == pytest.approx(np.std(diameters, ddof=1), rel=1e-12)
+        assert stats.std_log == pytest.approx(np.std(np.log(diameters), ddof=1), rel=1e-12)
+        assert (stats.minimum, stats.maximum) == (diameters.min(), diameters.max())
+
+
+@pytest.mark.parametrize('method', ['ASTM', 'mCox', 'GCI'])
+def test_streaming_stats_amean_matches_amean(diameters, method):
+    stats = averages.StreamingStats(np.array_split(diameters, 5))
+    if method == 'GCI':
+        expected = averages.amean(diameters, method='GCI')[:2] + averages.GCI_ci(diameters, seed=5)
+        result = stats.amean(method='GCI', seed=5)
+    else:
+        expected = averages.amean(diameters, method=method)
+        result = stats.amean(method=method)
+
+    np.testing.assert_allclose(result[:2], expected[:2], rtol=1e-12)
+    np.testing.assert_allclose(result[2], expected[2], rtol=1e-10)
+
+
+@pytest.mark.parametrize('method', ['CLT', 'bayes'])
+def test_streaming_stats_gmean_matches_gmean(diameters, method):
+    result = averages.StreamingStats(np.array_split(diameters, 3)).gmean(method=method)
+    expected = averages.gmean(diameters, method=method)
+
+    np.testing.assert_allclose(result[:2], expected[:2], rtol=1e-12)
+    np.testing.assert_allclose(result[2], expected[2], rtol=1e-10)
+
+
+@pytest.mark.parametrize('k', [100, 200])
+def test_quantile_sketch_rank_error(k):
+    rng = np.random.default_rng(k)
+    pop = rng.lognormal(3, 0.5, 100000)
+    ordered = np.sort(pop)
+    left = averages.QuantileSketch(np.array_split(pop[:60000], 12), k=k, seed=1)
+    sketch = left.merge(averages.QuantileSketch(np.array_split(pop[60000:], 8), k=k, seed=2))
+    quantiles = np.linspace(0.01, 0.99, 99)
+    ranks = np.searchsorted(ordered, sketch.quantile(quantiles)) / len(pop)
+
+    assert sketch.n == len(pop)
+    assert sketch.items()[1].sum() == len(pop)
+    assert np.max(np.abs(ranks - quantiles)) < 2.5 / k
+
+
+def test_quantile_sketch_merge_has_its_own_stream():
+    rng = np.random.default_rng(3)
+    chunks = [rng.lognormal(3, 0.5, 5000) for _ in range(4)]
+
+    def merged_after(parent_updates):
+        left = averages.QuantileSketch(chunks[:2], k=50, seed=1)
+        merged = left.merge(averages.QuantileSketch([chunks[2]], k=50, seed=2))
+        for _ in range(parent_updates):
+            left.update(chunks[3])
+        return merged.update(chunks[3]).quantile(np.linspace(0, 1, 21))
+
+    np.testing.assert_array_equal(merged_after(0), merged_after(3))
+
+
+def test_quantile_sketch_is_exact_before_compaction(samples):
+    sketch = averages.QuantileSketch([samples[1]], k=200)
+
+    np.testing.assert_allclose(sketch.quantile([0, 0.25, 0.5, 1]), np.quantile(samples[1], [0, 0.25, 0.5, 1]))
+    assert averages.median(sketch)[0] == pytest.approx(np.median(samples[1]))
+
+
+def test_kde_mode_matches_freq_peak(diameters):
+    _, peak, _, _ = averages.freq_peak(diameters, search='refine')
+
+    assert averages.kde_mode(diameters) == peak
+
+
+def row_mean(x):
+    return np.mean(x, axis=-1)
+
+
+def test_bootstrap_ci_percentile_matches_manual_resampling(samples):
+    pop = samples[1]
+    (lower, upper), length = averages.bootstrap_ci(pop, row_mean, method='percentile', n_resamples=2000,
+                                                   vectorized=True, seed=4)
+    rng = np.random.default_rng(np.random.SeedSequence(4))
+    estimates = np.mean(pop[rng.integers(len(pop), size=(2000, len(pop)))], axis=1)
+
+    np.testing.assert_allclose([lower, upper], np.quantile(estimates, [0.025, 0.975]))
+    assert length == pytest.approx(upper - lower)
+
+
+def test_bootstrap_ci_bca_matches_scipy(samples):
+    from scipy.stats import bootstrap
+
+    pop = samples[2]
+    (lower, upper), _ = averages.bootstrap_ci(pop, row_mean, n_resamples=20000, vectorized=True, seed=0)
+    expected = bootstrap((pop,), np.mean, n_resamples=20000, method='BCa', random_state=0).confidence_interval
+
+    np.testing.assert_allclose([lower, upper], [expected.low, expected.high], rtol=5e-3)
+
+
+def test_bootstrap_ci_does_not_depend_on_n_jobs(samples):
+    kwargs = dict(n_resamples=300, seed=11)
+    serial = averages.bootstrap_ci(samples[0], averages.kde_mode, **kwargs)
+    parallel = averages.bootstrap_ci(samples[0], averages.kde_mode, n_jobs=2, **kwargs)
+
+    np.testing.assert_allclose(parallel[0], serial[0])
+
+
+def test_bootstrap_ci_bca_falls_back_to_percentile():
+    pop = np.array([1.0] * 20 + [2.0])
+
+    with pytest.warns(RuntimeWarning):
+        (lower, upper), _ = averages.bootstrap_ci(pop, np.median, n_resamples=500, seed=0)
+    assert lower == upper == 1.0
+
+
+def test_prepared_sample_matches_raw_arrays(diameters):
+    sample = averages.PreparedSample(diameters)
+
+    for method in ('ASTM', 'mCox'):
+        mean, std, conf_int, _ = averages.amean(sample, method=method)
+        np.testing.assert_allclose([mean, std, *conf_int], np.hstack(averages.amean(diameters, method=method)[:3]))
+    for method in ('CLT', 'bayes'):
+        gmean, msd, conf_int, _ = averages.gmean(sample, method=method)
+        np.testing.assert_allclose([gmean, msd, *conf_int], np.hstack(averages.gmean(diameters, method=method)[:3]))
+    assert averages.median(sample) == averages.median(diameters)
+    assert averages.freq_peak(sample)[1:] == averages.freq_peak(diameters)[1:]
+    assert averages.GCI_ci(sample, seed=2) == averages.GCI_ci(diameters, seed=2)
+
+
+def test_prepared_sample_copies_and_freezes_data():
+    pop = np.array([3.0, 1.0, 2.0])
+    sample = averages.PreparedSample(pop)
+    pop[0] = 100.0
+
+    assert (sample.min, sample.max, sample.mean) == (1.0, 3.0, 2.0)
+    with pytest.raises(ValueError):
+        sample.data[0] = 5.0
+
+
+def test_median_of_prepared_sample_does_not_sort(diameters):
+    sample = averages.PreparedSample(diameters)
+    expected = averages.median(diameters)
+
+    assert averages.median(sample) == expected
+    assert sample._sorted is None
+    sample.sorted  # once sorted, the cached view is used
+    assert averages.median(sample) == expected
+
+
+def test_ci_coverage_of_exact_methods():
+    df = averages.ci_coverage(0.5, 100, n_sims=2000, methods=('ASTM', 'mCox', 'CLT', 'median'), seed=1)
+
+    assert list(df['method']) == ['ASTM', 'CLT', 'mCox', 'median']
+    np.testing.assert_allclose(df.loc[df['method'].isin(['CLT', 'mCox']), 'coverage'], 0.95, atol=0.015)
+    assert df.loc[df['method'] == 'median', 'coverage'].item() >= 0.94
+    assert np.all(df['mean_length'] > 0)
+
+
+def test_ci_coverage_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / 'sweep.csv')
+    kwargs = dict(n_sims=50, methods=('ASTM', 'GCI'), runs=500)
+    full = averages.ci_coverage((0.3, 0.6), (20, 40), seed=3, **kwargs)
+    averages.ci_coverage(0.3, (20, 40), seed=3, checkpoint=checkpoint, **kwargs)
+    resumed = averages.ci_coverage((0.3, 0.6), (20, 40), seed=3, checkpoint=checkpoint, **kwargs)
+
+    assert list(resumed.columns) == list(full.columns)
+    np.testing.assert_allclose(resumed[['coverage', 'mean_length']], full[['coverage', 'mean_length']])
+
+
+def test_ci_coverage_unseeded_checkpoint_reuses_seed(tmp_path):
+    checkpoint = str(tmp_path / 'sweep.csv')
+    kwargs = dict(n_sims=50, methods=('ASTM',), checkpoint=checkpoint)
+    averages.ci_coverage(0.3, 20, **kwargs)
+    averages.ci_coverage(0.3, (20, 40), **kwargs)
+
+    with pytest.raises(ValueError):
+        averages.ci_coverage(0.3, 60, seed=1, **kwargs)
+    with pytest.raises(ValueError):
+        averages.ci_coverage(0.3, 60, n_sims=100, methods=('ASTM',), checkpoint=checkpoint)
+
+
+@pytest.mark.parametrize('kind', ['lognormal', 'mixture', 'truncated'])
+def test_population_corpus_roundtrip(tmp_path, kind):
+    corpus = averages.gen_population_corpus(str(tmp_path), 60, sizes=(1, 80), kind=kind, chunk_size=500, seed=9)
+    loaded = averages.load_population_corpus(str(tmp_path))
+
+    assert len(loaded) == 60
+    np.testing.assert_array_equal(np.diff(loaded.offsets), loaded.params['n'])
+    np.testing.assert_array_equal(loaded[-1], corpus.values[corpus.offsets[-2]:])
+    assert np.all(loaded.values[:] > 0)
+
+    # chunks hold whole populations and reproduce the per-population estimates
+    for first, values, offsets in loaded.chunks(max_values=300):
+        assert len(values) <= 300 or len(offsets) == 2
+    df = loaded.averages(max_values=300)
+    assert list(df.index) == list(range(60))
+    assert df.loc[7, 'amean'] == pytest.approx(np.mean(loaded[7]))
+    assert df.loc[59, 'median'] == pytest.approx(np.median(loaded[59]))
+
+
+def test_population_corpus_chunks_by_values(tmp_path):
+    small = averages.gen_population_corpus(str(tmp_path / 'a'), 40, sizes=(5, 50), chunk_size=100, seed=1)
+    large = averages.gen_population_corpus(str(tmp_path / 'b'), 40, sizes=(5, 50), chunk_size=10**6, seed=1)
+
+    np.testing.assert_array_equal(small.offsets, large.offsets)
+    for key in ('scale', 'shape'):
+        np.testing.assert_array_equal(small.params[key], large.params[key])
+    assert len(averages._chunk_bounds(small.offsets, 100)) > 1
+
+
+def test_population_corpus_rejects_empty_populations(tmp_path):
+    with pytest.raises(ValueError):
+        averages.gen_population_corpus(str(tmp_path), 10, sizes=(0, 10))
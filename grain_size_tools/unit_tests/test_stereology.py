@@ -0,0 +1,381 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import stereology  # noqa: E402
+
+DATA = Path(__file__).resolve().parents[1] / 'DATA' / 'data_set.txt'
+
+
+@pytest.fixture(scope='module')
+def diameters():
+    areas = np.genfromtxt(DATA, delimiter='\t', names=True)['Area']
+    return 2 * np.sqrt(areas / np.pi)
+
+
+@pytest.mark.parametrize('normalize', [True, False])
+@pytest.mark.parametrize('left_edge', [0, 'min'])
+@pytest.mark.parametrize('numbins', [5, 10, 15, 20, 30])
+def test_unfold_population_matrix_matches_loop(diameters, numbins, left_edge, normalize):
+    minimo = diameters.min() if left_edge == 'min' else left_edge
+    freq, bin_edges = np.histogram(diameters, bins=numbins, range=(minimo, diameters.max()), density=True)
+    binsize = bin_edges[1] - bin_edges[0]
+    mid_points = (bin_edges[:-1] + bin_edges[1:]) / 2
+
+    expected = stereology.unfold_population(freq.copy(), bin_edges, binsize, mid_points, normalize)
+    result = stereology.unfold_population_matrix(freq, bin_edges, binsize, mid_points, normalize)
+
+    np.testing.assert_allclose(result, expected, rtol=1e-10, atol=1e-14)
+
+
+@pytest.mark.parametrize('left_edge', [0, 'min'])
+def test_saltykov_batch_matches_saltykov(diameters, left_edge):
+    rng = np.random.default_rng(0)
+    samples = [diameters, rng.choice(diameters, 500), rng.choice(diameters, 120)]
+    numbins = [10, 14, 7]
+    mid_points, freqs, cdfs = stereology.Saltykov_batch(samples, numbins=numbins, left_edge=left_edge)
+
+    for i, (sample, bins) in enumerate(zip(samples, numbins)):
+        expected_mid, expected_freq = stereology.Saltykov(sample, numbins=bins, left_edge=left_edge,
+                                                          return_data=True)
+        expected_cdf = stereology.volume_weighted_cdf(expected_freq, expected_mid)
+        np.testing.assert_allclose(mid_points[i, :bins], expected_mid, rtol=1e-12)
+        np.testing.assert_allclose(freqs[i, :bins], expected_freq, rtol=1e-10, atol=1e-14)
+        np.testing.assert_allclose(cdfs[i, :bins], expected_cdf, rtol=1e-10, atol=1e-12)
+        assert np.all(np.isnan(freqs[i, bins:]))
+
+
+def test_saltykov_batch_rejects_invalid_numbins(diameters):
+    with pytest.raises(ValueError):
+        stereology.Saltykov_batch([diameters], numbins=0)
+    with pytest.raises(ValueError):
+        stereology.Saltykov_batch([diameters], numbins=2.5)
+
+
+def test_two_step_search_matches_cold_start_fits(diameters):
+    df = stereology.two_step_search(diameters, class_range=(10, 15))
+    guess = (np.exp(np.std(np.log(diameters), ddof=1)), np.median(diameters))
+
+    for numbins, row in df.iterrows():
+        mid_points, frequencies = stereology.Saltykov(diameters, numbins=numbins, return_data=True)
+        params, errors = stereology.fit_log(mid_points, frequencies, initial_guess=guess)
+        np.testing.assert_allclose(row[['MSD', 'gmean']].to_numpy(float), params, rtol=1e-5)
+        np.testing.assert_allclose(row[['MSD_err', 'gmean_err']].to_numpy(float), errors, rtol=1e-3)
+
+    assert df['optimal'].sum() == 1
+    assert df['MSD_err'].idxmin() == df.index[df['optimal']][0]
+
+
+def test_two_step_result_matches_search(diameters):
+    result = stereology.two_step(diameters, class_range=(10, 15), return_result=True)
+    best = stereology.two_step_search(diameters, class_range=(10, 15)).query('optimal').iloc[0]
+
+    assert result.numbins == best.name
+    np.testing.assert_allclose([result.msd, result.gmean], [best['MSD'], best['gmean']])
+
+
+def test_saltykov_kernel_cache_only_holds_zero_offsets(diameters):
+    kernel = stereology.saltykov_kernel(12)
+    assert stereology.saltykov_kernel(12, 0.0) is kernel
+    assert not kernel.flags.writeable
+
+    currsize = stereology._cached_saltykov_kernel.cache_info().currsize
+    for numbins in (8, 9, 10):
+        stereology.Saltykov(diameters, numbins=numbins, left_edge='min', return_result=True)
+    assert stereology._cached_saltykov_kernel.cache_info().currsize == currsize
+
+
+@pytest.mark.parametrize('offset', [0.0, 0.37, 3.2])
+def test_saltykov_kernel_matches_wicksell_matrix(offset):
+    bin_edges = offset + np.arange(11, dtype=float)
+    expected = np.eye(10) + stereology.wicksell_matrix(bin_edges, bin_edges[:-1] + 0.5)
+
+    np.testing.assert_allclose(stereology.saltykov_kernel(10, offset), expected)
+    U, s, Vt = stereology.kernel_svd(10, offset)
+    np.testing.assert_allclose((U * s) @ Vt, expected, atol=1e-12)
+
+
+@pytest.mark.parametrize('left_edge', [0, 'min'])
+def test_saltykov_kernel_is_scale_free(diameters, left_edge):
+    result = stereology.Saltykov(diameters, numbins=14, left_edge=left_edge, return_result=True)
+    scaled = stereology.Saltykov(7.5 * diameters, numbins=14, left_edge=left_edge, return_result=True)
+
+    np.testing.assert_allclose(scaled.frequencies * 7.5, result.frequencies, rtol=1e-10)
+    np.testing.assert_allclose(scaled.cdf, result.cdf, rtol=1e-10)
+
+
+def test_saltykov_result_matches_return_data(diameters):
+    result = stereology.Saltykov(diameters, numbins=12, return_result=True)
+    mid_points, frequencies = stereology.Saltykov(diameters, numbins=12, return_data=True)
+
+    np.testing.assert_allclose(result.mid_points, mid_points)
+    np.testing.assert_allclose(result.frequencies, frequencies)
+    np.testing.assert_allclose(result.cdf, stereology.volume_weighted_cdf(frequencies, mid_points))
+    assert result.cdf[-1] == pytest.approx(100)
+
+
+@pytest.mark.parametrize('left_edge', [0, 'min'])
+def test_saltykov_result_volume_fraction(diameters, left_edge):
+    result = stereology.Saltykov(diameters, numbins=12, left_edge=left_edge, return_result=True)
+    below, first = result.bin_edges[0] - 1, result.mid_points[0]
+    fractions = result.volume_fraction([below, result.bin_edges[0], first, result.mid_points[-1] + 1])
+
+    np.testing.assert_allclose(fractions, [0, 0, result.cdf[0], 100])
+    assert np.all(np.diff(result.volume_fraction(np.linspace(0, 5, 6))) >= 0)
+    assert result.volume_fraction(2.5) == pytest.approx(
+        stereology.interp_volume_fraction(2.5, result.mid_points, result.cdf))
+
+
+def test_saltykov_result_has_no_side_effects(diameters, tmp_path, capsys, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stereology.Saltykov(diameters, calc_vol=40, text_file='saltykov.csv', return_result=True)
+    stereology.two_step(diameters, return_result=True)
+
+    assert capsys.readouterr().out == ''
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_two_step_result_holds_the_histogram(diameters):
+    result = stereology.two_step(diameters, return_result=True)
+    expected = stereology.Saltykov(diameters, numbins=result.numbins, return_result=True)
+
+    np.testing.assert_allclose(result.bin_edges, expected.bin_edges, rtol=1e-12)
+    np.testing.assert_allclose(result.frequencies, expected.frequencies, rtol=1e-10)
+    np.testing.assert_allclose(result.cdf, expected.cdf, rtol=1e-10)
+    assert result.volume_fraction(result.gmean) < 50
+
+
+def test_saltykov_bootstrap_bands(diameters):
+    boot = stereology.Saltykov_bootstrap(diameters, numbins=12, n_resamples=300, seed=1)
+    expected = stereology.Saltykov(diameters, numbins=12, return_result=True)
+
+    assert isinstance(boot, stereology.SaltykovBootstrapResult)
+    np.testing.assert_allclose(boot.mid_points, expected.mid_points)
+    np.testing.assert_allclose(boot.frequencies, expected.frequencies, rtol=1e-10)
+    np.testing.assert_allclose(boot.cdf, expected.cdf, rtol=1e-10)
+    assert boot.frequencies_band.shape == (2, 12)
+    assert np.all(boot.frequencies_band[0] <= boot.frequencies_band[1])
+    assert boot.msd_band[0] < boot.msd < boot.msd_band[1]
+    assert boot.gmean_band[0] < boot.gmean < boot.gmean_band[1]
+    assert boot.failed_fits == 0 and boot.resampled_numbins is None
+
+
+def test_saltykov_bootstrap_auto_numbins(diameters):
+    boot = stereology.Saltykov_bootstrap(diameters, numbins='auto', n_resamples=20, class_range=(10, 14), seed=2)
+    best = stereology.two_step(diameters, class_range=(10, 14), return_result=True)
+
+    assert boot.numbins == best.numbins
+    np.testing.assert_allclose([boot.msd, boot.gmean], [best.msd, best.gmean])
+    assert boot.msd_band[0] < boot.msd < boot.msd_band[1]
+    assert np.all((boot.resampled_numbins >= 10) & (boot.resampled_numbins <= 14))
+
+    with pytest.raises(ValueError):
+        stereology.Saltykov_bootstrap(diameters, numbins='auto', left_edge='min')
+
+
+def test_unfold_em_recovers_forward_model():
+    kernel = stereology.saltykov_kernel(12)
+    actual = np.exp(-0.5 * ((np.arange(12) - 5) / 2)**2)
+    actual /= actual.sum()
+    apparent = actual @ kernel.T
+
+    unfolded = stereology.unfold_em(apparent[np.newaxis, :], kernel, 1.0, tol=1e-12, max_iter=20000)[0]
+
+    np.testing.assert_allclose(unfolded, actual, atol=1e-6)
+
+
+def test_unfold_em_matches_subtraction_on_data(diameters):
+    em = stereology.Saltykov(diameters, numbins=10, unfold='em', return_result=True)
+    subtraction = stereology.Saltykov(diameters, numbins=10, return_result=True)
+
+    assert np.all(em.frequencies >= 0)
+    assert np.sum(em.frequencies) * em.binsize == pytest.approx(1)
+    np.testing.assert_allclose(em.frequencies, subtraction.frequencies, atol=0.2 * subtraction.frequencies.max())
+
+
+def test_unfold_em_handles_zero_rows_and_stacked_kernels():
+    kernels = np.zeros((2, 8, 8))
+    kernels[0] = stereology.saltykov_kernel(8)
+    kernels[1, :6, :6] = stereology.saltykov_kernel(6, 0.5)
+    freqs = np.zeros((3, 8))
+    freqs[1, :6] = [0.1, 0.2, 0.4, 0.2, 0.1, 0.05]
+
+    with np.errstate(all='raise'):
+        unfolded = stereology.unfold_em(freqs[:2], kernels, 1.0)
+        shared = stereology.unfold_em(freqs, kernels[0], 1.0)
+
+    np.testing.assert_array_equal(unfolded[0], 0)
+    np.testing.assert_array_equal(unfolded[1, 6:], 0)
+    assert unfolded[1].sum() == pytest.approx(1)
+    np.testing.assert_array_equal(shared[[0, 2]], 0)
+
+
+@pytest.mark.parametrize('offset', [0.0, 0.8])
+def test_unfold_tikhonov_matches_normal_equations(offset):
+    kernel = stereology.saltykov_kernel(10, offset)
+    freqs = np.random.default_rng(0).uniform(0.5, 1.0, (3, 10))
+    lam = 0.05
+
+    unfolded, lams = stereology.unfold_tikhonov(freqs, offset, 1.0, lam=lam)
+    expected = np.linalg.solve(kernel.T @ kernel + lam**2 * np.eye(10), kernel.T @ freqs.T).T
+    expected = np.clip(expected, 0, None)
+    expected /= expected.sum(axis=1, keepdims=True)
+
+    np.testing.assert_allclose(unfolded, expected, rtol=1e-10, atol=1e-14)
+    np.testing.assert_array_equal(lams, lam)
+
+
+def test_unfold_nnls_recovers_forward_model():
+    kernel = stereology.saltykov_kernel(12)
+    actual = np.exp(-0.5 * ((np.arange(12) - 4) / 2)**2)
+    actual /= actual.sum()
+
+    unfolded = stereology.unfold_nnls((actual @ kernel.T)[np.newaxis, :], kernel, 1.0)[0]
+
+    np.testing.assert_allclose(unfolded, actual, atol=1e-10)
+
+
+def test_unfold_nnls_matches_per_row_nnls():
+    from scipy.optimize import nnls
+
+    rng = np.random.default_rng(4)
+    kernel = stereology.saltykov_kernel(10)
+    actual = np.exp(-0.5 * ((np.arange(10) - 4) / 2)**2)
+    freqs = (actual @ kernel.T) * rng.lognormal(0, 0.2, size=(40, 10))
+    lam = np.repeat([0.0, 0.05], 20)
+
+    unfolded = stereology.unfold_nnls(freqs, kernel, 1.0, lam=lam)
+
+    for row, strength, result in zip(freqs, lam, unfolded):
+        augmented = np.vstack([kernel, strength * np.eye(10)])
+        expected = nnls(augmented, np.concatenate([row, np.zeros(10)]))[0]
+        np.testing.assert_allclose(result, expected / expected.sum(), atol=1e-10)
+    assert np.all(unfolded >= 0)
+
+
+@pytest.mark.parametrize('lam', ['gcv', 'lcurve'])
+def test_regularized_selection_on_noisy_forward_model(lam):
+    rng = np.random.default_rng(1)
+    kernel = stereology.saltykov_kernel(15)
+    actual = np.exp(-0.5 * ((np.arange(15) - 6) / 2.5)**2)
+    actual /= actual.sum()
+    freqs = actual @ kernel.T + rng.normal(0, 0.002, (4, 15))
+    freqs = np.vstack([freqs, np.zeros(15)])
+
+    with np.errstate(all='raise'):
+        unfolded, lams = stereology.unfold_tikhonov(freqs, 0.0, 1.0, lam=lam)
+
+    assert np.all(lams > 0)
+    np.testing.assert_array_equal(unfolded[-1], 0)
+    np.testing.assert_allclose(unfolded[:-1], np.broadcast_to(actual, (4, 15)), atol=0.03)
+
+
+def test_lcurve_corner_falls_back_for_undefined_rows():
+    residual = np.vstack([np.geomspace(1e-3, 1, 20), np.zeros(20)])
+    solution = np.vstack([np.geomspace(1, 1e-3, 20)**2, np.zeros(20)])
+
+    corner = stereology._lcurve_corner(residual, solution, fallback=np.array([3, 7]))
+
+    assert corner[1] == 7
+
+
+def random_sections(n, msd, gmean, seed=0):
+    """ Apparent diameters of random plane sections through lognormal
+    spheres (larger spheres are cut proportionally more often)."""
+    rng = np.random.default_rng(seed)
+    spheres = rng.lognormal(np.log(gmean), np.log(msd), size=20 * n)
+    spheres = rng.choice(spheres, size=n, p=spheres / spheres.sum())
+    heights = rng.uniform(0, spheres / 2)
+    return 2 * np.sqrt((spheres / 2)**2 - heights**2)
+
+
+def test_lognormal_mle_recovers_population():
+    fit = stereology.lognormal_mle(random_sections(3000, msd=1.5, gmean=40))
+    assert fit.msd == pytest.approx(1.5, abs=0.05)
+    assert fit.gmean == pytest.approx(40, rel=0.05)
+    assert fit.msd_ci[0] < fit.msd < fit.msd_ci[1]
+    assert fit.gmean_ci[0] < fit.gmean < fit.gmean_ci[1]
+
+
+def test_lognormal_mle_table_matches_quadrature(diameters):
+    tabulated = stereology.lognormal_mle(diameters)
+    integrated = stereology.lognormal_mle(diameters, table=False)
+    assert tabulated.msd == pytest.approx(integrated.msd, rel=1e-4)
+    assert tabulated.gmean == pytest.approx(integrated.gmean, rel=1e-4)
+    assert tabulated.loglik == pytest.approx(integrated.loglik, abs=1e-2)
+    np.testing.assert_allclose(tabulated.msd_ci, integrated.msd_ci, rtol=1e-4)
+    np.testing.assert_allclose(tabulated.gmean_ci, integrated.gmean_ci, rtol=1e-4)
+
+
+def test_lognormal_mle_table_gradient(diameters):
+    table = stereology._default_wicksell_table()
+    log_d = np.log(diameters)
+    value, gradient = stereology._wicksell_table_nll(3.3, np.log(0.45), log_d, table)
+    expected = stereology._wicksell_lognormal_nll(3.3, np.log(0.45), log_d)
+    assert value == pytest.approx(expected[0], rel=1e-6)
+    np.testing.assert_allclose(gradient, expected[1], rtol=1e-3)
+    # diameters beyond the table fall back to quadrature
+    assert stereology._wicksell_table_nll(3.3, np.log(0.06), log_d, table) is None
+
+
+def test_lognormal_mle_unbounded_limits_are_nan():
+    # three sections cannot bound the shape of the population
+    with np.errstate(all='ignore'):
+        fit = stereology.lognormal_mle(random_sections(3, msd=1.5, gmean=40))
+    assert np.isfinite(fit.msd)
+    assert np.isnan(fit.msd_ci[0]) and np.isnan(fit.gmean_ci[0])
+    assert fit.msd_ci[1] > fit.msd
+
+
+def wicksell_quad(d, msd, gmean):
+    """ density of the apparent diameters by direct integration, with
+    D = d cosh(u) to remove the singularity"""
+    from scipy.integrate import quad
+    from scipy.stats import lognorm
+    population = lognorm(s=np.log(msd), scale=gmean)
+    return d / population.mean() * quad(lambda u: population.pdf(d * np.cosh(u)), 0, 40, limit=200)[0]
+
+
+@pytest.mark.parametrize('msd', [1.2, 1.6, 2.5])
+def test_apparent_lognormal_pdf_matches_quad(msd):
+    d = np.array([5, 20, 35, 60, 120])
+    expected = [wicksell_quad(x, msd, 35) for x in d]
+    np.testing.assert_allclose(stereology.apparent_lognormal_pdf(d, msd, 35), expected, rtol=1e-3, atol=1e-9)
+    # below the grid the density is extrapolated (proportional to d)
+    tail = stereology.apparent_lognormal_pdf(0.5, msd, 35)
+    assert tail == pytest.approx(wicksell_quad(0.5, msd, 35), rel=1e-2)
+
+
+def test_apparent_lognormal_cdf_integrates_pdf():
+    x = np.linspace(0, 80, 8001)
+    pdf = stereology.apparent_lognormal_pdf(x, 1.6, 35)
+    expected = np.concatenate([[0], np.cumsum(np.diff(x) * (pdf[1:] + pdf[:-1]) / 2)])
+    np.testing.assert_allclose(stereology.apparent_lognormal_cdf(x, 1.6, 35), expected, atol=1e-3)
+
+
+@pytest.mark.filterwarnings('error')
+def test_apparent_lognormal_non_positive_sizes():
+    d = np.array([-5, 0, 1e-12, 1, 10, 35, 100, 1e6])
+    with np.errstate(all='raise'):
+        pdf = stereology.apparent_lognormal_pdf(d, 1.6, 35)
+        cdf = stereology.apparent_lognormal_cdf(d, 1.6, 35)
+    assert np.all(pdf[:2] == 0) and np.all(cdf[:2] == 0)
+    assert np.all(pdf >= 0) and np.all(np.diff(cdf) >= 0)
+    assert cdf[-1] == 1
+
+
+def test_wicksell_table_roundtrip(tmp_path):
+    grids = dict(sigmas=(0.3, 0.6, 16), t=(-10, 6, 256), nodes=64)
+    in_memory = stereology.build_wicksell_table(**grids)
+    stored = stereology.build_wicksell_table(str(tmp_path), **grids)
+    loaded = stereology.load_wicksell_table(str(tmp_path))
+    d = np.linspace(1, 100, 50)
+    np.testing.assert_allclose(stored.pdf(d, 1.5, 35), in_memory.pdf(d, 1.5, 35))
+    np.testing.assert_allclose(loaded.cdf(d, 1.5, 35), in_memory.cdf(d, 1.5, 35))
+    expected = [wicksell_quad(x, 1.5, 35) for x in d]
+    np.testing.assert_allclose(loaded.pdf(d, 1.5, 35), expected, rtol=1e-2, atol=1e-9)
+    with pytest.raises(ValueError):
+        loaded.pdf(d, 2.5, 35)